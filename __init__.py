@@ -1,16 +1,58 @@
+import time
+_import_start = time.perf_counter()  # 插件加载耗时统计 (含依赖导入)
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import server
 from aiohttp import web
 from .core.scanner import ModelScanner
 from .core.matcher import ModelMatcher
 from .core.searcher import ModelSearcher
+from .core.watcher import IndexWatcher
+from .core.jobs import ScanJobManager
+from .core.utils import AdvancedTokenizer
 
 __version__ = "1.4.0" # GGUF Deep Support & Strict Matching v2
 __author__ = "LK"
 
 # 初始化核心组件
-scanner = ModelScanner()
-matcher = ModelMatcher(scanner)
 searcher = ModelSearcher()
+scanner = ModelScanner(
+    hash_workers=searcher.config.get("hash_workers"),
+    hash_algorithm=searcher.config.get("hash_algorithm"),
+    hash_include_mtime=searcher.config.get("hash_include_mtime", True),
+    hash_sampling=searcher.config.get("hash_sampling", "headtail"),
+    # 完整校验间隔 (小时)，其余刷新跳过 mtime 未变化的目录
+    deep_verify_interval=searcher.config.get("deep_verify_hours", 24) * 3600,
+    # 索引在后台线程加载，首次 /match 请求等待加载完成
+    load_async=True,
+)
+# 召回设置 (config.json): 每个条目最多打分的候选数，以及停用词的文档频率上限；结果缓存条数
+matcher = ModelMatcher(
+    scanner,
+    candidate_limit=searcher.config.get("match_candidate_limit", 200),
+    stop_token_ratio=searcher.config.get("match_stop_token_ratio", 0.2),
+    cross_type_fallback=searcher.config.get("match_cross_type", True),
+    cache_size=searcher.config.get("match_cache_size", 1024),
+    # 多进程匹配 (可选，常驻进程池): 工作进程数与启用的最小批量
+    process_workers=searcher.config.get("match_process_workers", 0),
+    process_batch_min=searcher.config.get("match_process_batch_min", 64),
+)
+
+# 后台扫描任务，进度通过 websocket 推送 (事件名 auto-matcher-scan)
+def publish_scan_progress(status):
+    server.PromptServer.instance.send_sync("auto-matcher-scan", status)
+
+scan_jobs = ScanJobManager(scanner, publish=publish_scan_progress)
+
+# 匹配为 CPU 密集的同步计算，放在单独的线程执行，避免阻塞 aiohttp 事件循环
+# (单线程: 匹配器的索引不支持并发修改)
+match_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AutoMatchMatch")
+
+# 可选: 后台监听模型目录，增量更新索引 (config.json: "watch_models": true)
+watcher = IndexWatcher(scanner)
+if searcher.config.get("watch_models"):
+    watcher.start()
 
 # 注册 API 路由
 @server.PromptServer.instance.routes.post("/auto-matcher/match")
@@ -18,9 +60,16 @@ async def match_models(request):
     try:
         data = await request.json()
         items = data.get("items", [])
+        # 可选的截止时间 (毫秒，从收到请求开始计算)，超时后返回已有结果并标记 partial
+        deadline_ms = data.get("deadline_ms")
+        deadline = time.monotonic() + float(deadline_ms) / 1000 if deadline_ms is not None else None
+
+        # 启动时索引在后台加载，未完成时等待 (不阻塞事件循环)
+        await asyncio.wrap_future(scanner.ready)
         
         # 调用新版 matcher，传入列表
-        matches = matcher.match(items)
+        loop = asyncio.get_running_loop()
+        matches, pending = await loop.run_in_executor(match_executor, matcher.match_partial, items, deadline)
         
         # 格式化返回结果
         results = []
@@ -33,7 +82,16 @@ async def match_models(request):
                 "new_value": m["matched_value"]
             })
         
-        return web.json_response({"matches": results})
+        return web.json_response({
+            "matches": results,
+            "partial": bool(pending),
+            "pending": [{
+                "id": p["id"],
+                "node_type": p["node_type"],
+                "widget_name": p["widget_name"],
+                "original": p["original_value"],
+            } for p in pending],
+        })
     except Exception as e:
         print(f"[AutoModelMatcher] API Error: {e}")
         return web.json_response({"error": str(e)}, status=500)
@@ -46,25 +104,24 @@ async def search_models(request):
         items = data.get("items", [])
         ignore_cache = data.get("ignore_cache", False)
         
-        # 准备并发任务
-        tasks = []
+        # 准备并发任务 (相同文件名只搜索一次，结果按原顺序分发给每个条目)
         original_filenames = []
-        
-        import asyncio
         for item in items:
             filename = item.get("current")
             if filename and "." in filename:
-                tasks.append(searcher.search(filename, ignore_cache=ignore_cache))
                 original_filenames.append(filename)
+        unique_filenames = list(dict.fromkeys(original_filenames))
+        tasks = [searcher.search(filename, ignore_cache=ignore_cache) for filename in unique_filenames]
         
         if not tasks:
             return web.json_response({"downloads": []})
             
         # 并发执行所有搜索
-        search_results = await asyncio.gather(*tasks)
+        search_results = dict(zip(unique_filenames, await asyncio.gather(*tasks)))
         
         results = []
-        for filename, result in zip(original_filenames, search_results):
+        for filename in original_filenames:
+            result = search_results[filename]
             if result:
                 results.append({
                     "original": filename,
@@ -79,17 +136,39 @@ async def search_models(request):
 @server.PromptServer.instance.routes.post("/auto-matcher/refresh-index")
 async def refresh_index(request):
     try:
-        count = scanner.scan_incremental()
-        return web.json_response({"status": "ok", "count": count})
+        # 扫描在后台线程执行，立即返回任务 ID (已有扫描在运行时返回该任务)
+        # ?deep=1 强制完整校验 (不使用目录 mtime 捷径)
+        deep = request.query.get("deep") in ("1", "true") or None
+        job, created = scan_jobs.start(deep_verify=deep)
+        return web.json_response({"status": "started" if created else "running", "job": job.to_dict()})
     except Exception as e:
         print(f"[AutoModelMatcher] Index Refresh Error: {e}")
         return web.json_response({"error": str(e)}, status=500)
 
+@server.PromptServer.instance.routes.get("/auto-matcher/refresh-index/{job_id}")
+async def refresh_index_status(request):
+    job = scan_jobs.get(request.match_info["job_id"])
+    if job is None:
+        return web.json_response({"error": "job not found"}, status=404)
+    return web.json_response(job.to_dict())
+
+@server.PromptServer.instance.routes.post("/auto-matcher/refresh-index/{job_id}/cancel")
+async def refresh_index_cancel(request):
+    job = scan_jobs.cancel(request.match_info["job_id"])
+    if job is None:
+        return web.json_response({"error": "job not found"}, status=404)
+    return web.json_response(job.to_dict())
+
 @server.PromptServer.instance.routes.post("/auto-matcher/save-config")
 async def save_config(request):
     try:
         data = await request.json()
         searcher.save_config(data)
+        if "watch_models" in data:
+            if data["watch_models"]:
+                watcher.start()
+            else:
+                watcher.stop()
         return web.json_response({"status": "ok"})
     except Exception as e:
         print(f"[AutoModelMatcher] Save Config Error: {e}")
@@ -116,6 +195,14 @@ async def get_config(request):
         print(f"[AutoModelMatcher] Get Config Error: {e}")
         return web.json_response({"error": str(e)}, status=500)
 
+@server.PromptServer.instance.routes.get("/auto-matcher/stats")
+async def get_stats(request):
+    # 只读的运行时统计 (缓存命中率等)，用于观察与调优配置
+    return web.json_response({
+        "match_cache": matcher.cache_stats(),
+        "tokenizer_cache": AdvancedTokenizer.cache_stats(),
+    })
+
 # 插件目录配置
 WEB_DIRECTORY = "./js"
 NODE_CLASS_MAPPINGS = {}
@@ -123,4 +210,5 @@ NODE_DISPLAY_NAME_MAPPINGS = {}
 
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "WEB_DIRECTORY"]
 
-print("\033[34m[AutoModelMatcher] \033[0mLoaded successfully with API support.")
+print(f"\033[34m[AutoModelMatcher] \033[0mLoaded successfully with API support. "
+      f"(import {(time.perf_counter() - _import_start) * 1000:.0f} ms, index loading in background)")
@@ -0,0 +1,103 @@
+import os
+import hashlib
+
+# xxhash 为可选依赖 (pip install xxhash)，未安装时不可选用
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+BLOCK_SIZE = 1024 * 1024  # 每个采样块 1MB
+STRIDED_BLOCKS = 8  # 跨步采样模式下的块数 (含头尾)
+
+# 旧版 (v1) 索引使用的哈希方案: MD5(size-mtime + 头 1MB + 尾 1MB)
+LEGACY_HASH_SCHEME = "md5+mtime/headtail"
+
+
+def _blake2b():
+    return hashlib.blake2b(digest_size=16)
+
+
+def _xxh3():
+    return xxhash.xxh3_128()
+
+
+# 哈希后端: 名称 -> 工厂函数 (返回带 update/hexdigest 的对象)
+HASH_BACKENDS = {
+    "md5": hashlib.md5,
+    "blake2b": _blake2b,
+}
+if xxhash is not None:
+    HASH_BACKENDS["xxhash"] = _xxh3
+
+# 默认与旧版索引相同 (md5 + mtime)，升级后已有索引无需重算哈希；blake2b/xxhash 需在配置中显式选择 (会触发一次迁移)
+DEFAULT_HASH_ALGORITHM = "md5"
+
+
+class FastHasher:
+    """
+    快速文件指纹 (采样哈希)
+    - algorithm: md5 / blake2b / xxhash
+    - include_mtime: 是否把 mtime 纳入指纹 (旧版行为；touch 或复制都会改变哈希)
+    - sampling: "headtail" 头尾各 1MB；"strided" 在全文件上均匀采样 STRIDED_BLOCKS 块
+    """
+
+    def __init__(self, algorithm=DEFAULT_HASH_ALGORITHM, include_mtime=False, sampling="headtail", blocks=STRIDED_BLOCKS):
+        if algorithm not in HASH_BACKENDS:
+            print(f"[AutoMatch] Hash algorithm '{algorithm}' unavailable, using {DEFAULT_HASH_ALGORITHM}")
+            algorithm = DEFAULT_HASH_ALGORITHM
+        if sampling not in ("headtail", "strided"):
+            sampling = "headtail"
+        self.algorithm = algorithm
+        self.include_mtime = include_mtime
+        self.sampling = sampling
+        self.blocks = max(2, int(blocks))
+
+    @classmethod
+    def from_scheme(cls, scheme):
+        """从方案字符串还原 (如 "blake2b/strided8", "md5+mtime/headtail")"""
+        algo_part, _, sampling_part = scheme.partition("/")
+        algorithm, _, flag = algo_part.partition("+")
+        blocks = STRIDED_BLOCKS
+        sampling = "headtail"
+        if sampling_part.startswith("strided"):
+            sampling = "strided"
+            blocks = int(sampling_part[len("strided"):] or STRIDED_BLOCKS)
+        return cls(algorithm, include_mtime=(flag == "mtime"), sampling=sampling, blocks=blocks)
+
+    @property
+    def scheme(self):
+        """方案字符串，写入索引元数据，变化时触发迁移"""
+        algo_part = f"{self.algorithm}+mtime" if self.include_mtime else self.algorithm
+        sampling_part = f"strided{self.blocks}" if self.sampling == "strided" else "headtail"
+        return f"{algo_part}/{sampling_part}"
+
+    def _offsets(self, file_size):
+        if self.sampling == "strided" and file_size > BLOCK_SIZE * self.blocks:
+            span = file_size - BLOCK_SIZE
+            return [span * i // (self.blocks - 1) for i in range(self.blocks)]
+        # headtail: 头 1MB + (大于 1MB 时) 尾 1MB，与旧版读取方式一致
+        offsets = [0]
+        if file_size > BLOCK_SIZE:
+            offsets.append(file_size - BLOCK_SIZE)
+        return offsets
+
+    def sample_size(self, file_size):
+        """计算一个文件指纹实际读取的字节数 (用于进度统计)"""
+        return sum(min(BLOCK_SIZE, file_size - offset) for offset in self._offsets(file_size))
+
+    def hash_file(self, filepath):
+        stat = os.stat(filepath)
+        file_size = stat.st_size
+
+        # 基础指纹
+        fingerprint = f"{file_size}-{stat.st_mtime}" if self.include_mtime else f"{file_size}"
+        digest = HASH_BACKENDS[self.algorithm]()
+        digest.update(fingerprint.encode('utf-8'))
+
+        with open(filepath, 'rb') as f:
+            for offset in self._offsets(file_size):
+                f.seek(offset)
+                digest.update(f.read(BLOCK_SIZE))
+
+        return digest.hexdigest()
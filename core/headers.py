@@ -0,0 +1,331 @@
+import os
+import json
+import struct
+
+# 头部读取上限: safetensors 头部通常只有几十 KB ~ 几 MB，超出视为损坏文件
+MAX_SAFETENSORS_HEADER = 64 * 1024 * 1024
+
+# 头部解析规则版本，规则改进后升级以便已索引的文件重新解析
+HEADER_PROBE_VERSION = 1
+
+# 支持头部解析的扩展名，以及解析结果写入索引条目的字段
+HEADER_EXTENSIONS = {".safetensors", ".sft", ".gguf"}
+HEADER_FIELDS = ("arch", "dtype", "quant", "gguf_arch", "model_name")
+
+# GGUF 元数据区的安全上限 (防止损坏文件导致长时间解析)
+MAX_GGUF_KV = 100000
+MAX_GGUF_TENSORS = 1000000
+MAX_GGUF_STRING = 64 * 1024
+
+# safetensors dtype -> 与 AdvancedTokenizer.detect_quantization 一致的精度名
+SAFETENSORS_DTYPES = {
+    "F64": "fp64",
+    "F32": "fp32",
+    "F16": "fp16",
+    "BF16": "bf16",
+    "F8_E4M3": "fp8",
+    "F8_E5M2": "fp8",
+    "I8": "int8",
+    "U8": "int8",
+}
+
+# 元数据中的架构声明 (kohya ss_base_model_version / modelspec.architecture)
+# 按顺序匹配子串，返回与 AdvancedTokenizer.detect_base_model 一致的架构名
+METADATA_ARCH_HINTS = [
+    ("sdxl", "sdxl"),
+    ("stable-diffusion-xl", "sdxl"),
+    ("flux", "flux"),
+    ("sd3", "sd3"),
+    ("stable-diffusion-3", "sd3"),
+    ("sd_v2", "sd21"),
+    ("stable-diffusion-v2", "sd21"),
+    ("sd_v1", "sd15"),
+    ("stable-diffusion-v1", "sd15"),
+    ("hunyuan", "hunyuan"),
+    ("auraflow", "auraflow"),
+]
+
+# 张量名特征: (必须同时出现的子串, 架构)，按顺序匹配，越具体的规则越靠前
+TENSOR_ARCH_RULES = [
+    (("txt_in.individual_token_refiner",), "hunyuan"),
+    (("double_blocks.", "single_blocks."), "flux"),
+    (("lora_unet_double_blocks", "lora_unet_single_blocks"), "flux"),
+    (("single_transformer_blocks.", "transformer_blocks."), "flux"),
+    (("joint_blocks.",), "sd3"),
+    (("double_layers.",), "auraflow"),
+    (("conditioner.embedders.1",), "sdxl"),
+    (("lora_te2_",), "sdxl"),
+    (("add_embedding.linear_1",), "sdxl"),
+    (("label_emb.0.0",), "sdxl"),
+    (("cond_stage_model.model.transformer",), "sd21"),
+    (("cond_stage_model.transformer",), "sd15"),
+    (("model.diffusion_model.input_blocks",), "sd15"),
+    (("lora_unet_down_blocks",), "sd15"),
+]
+
+
+def read_safetensors_header(path):
+    """
+    只读取 safetensors 文件头 (8 字节长度 + JSON)，不触碰张量数据
+    返回解析后的 dict，格式不合法时返回 None
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(8)
+        if len(prefix) != 8:
+            return None
+        (header_len,) = struct.unpack("<Q", prefix)
+        if header_len == 0 or header_len > MAX_SAFETENSORS_HEADER:
+            return None
+        raw = f.read(header_len)
+    if len(raw) != header_len or not raw.startswith(b"{"):
+        return None
+    try:
+        header = json.loads(raw)
+    except ValueError:
+        return None
+    return header if isinstance(header, dict) else None
+
+
+def _arch_from_metadata(metadata):
+    for key in ("modelspec.architecture", "ss_base_model_version"):
+        value = str(metadata.get(key, "")).lower()
+        if not value:
+            continue
+        for hint, arch in METADATA_ARCH_HINTS:
+            if hint in value:
+                return arch
+    return None
+
+
+def _arch_from_tensor_names(names):
+    joined = "\n".join(names)
+    for required, arch in TENSOR_ARCH_RULES:
+        if all(part in joined for part in required):
+            return arch
+    return None
+
+
+def inspect_safetensors(path):
+    """
+    从 safetensors 头部推断架构与主要精度 (按参数量统计的 dtype)
+    返回: { "arch": str|None, "dtype": str|None }
+    """
+    header = read_safetensors_header(path)
+    if header is None:
+        return {}
+
+    metadata = header.get("__metadata__") or {}
+    dtype_params = {}
+    names = []
+    for name, info in header.items():
+        if name == "__metadata__" or not isinstance(info, dict):
+            continue
+        names.append(name)
+        count = 1
+        for dim in info.get("shape") or []:
+            count *= dim
+        dtype = info.get("dtype")
+        dtype_params[dtype] = dtype_params.get(dtype, 0) + count
+
+    arch = _arch_from_metadata(metadata) if isinstance(metadata, dict) else None
+    if arch is None:
+        arch = _arch_from_tensor_names(names)
+
+    dtype = None
+    if dtype_params:
+        dominant = max(dtype_params.items(), key=lambda kv: kv[1])[0]
+        dtype = SAFETENSORS_DTYPES.get(dominant, str(dominant).lower())
+
+    return {"arch": arch, "dtype": dtype}
+
+
+# GGUF 值类型 -> struct 格式 (固定长度类型)
+GGUF_SCALAR_TYPES = {
+    0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i",
+    6: "<f", 7: "<?", 10: "<Q", 11: "<q", 12: "<d",
+}
+GGUF_TYPE_STRING = 8
+GGUF_TYPE_ARRAY = 9
+
+# general.file_type (llama_ftype) -> 量化名 (与 detect_quantization 的输出格式一致)
+GGUF_FILE_TYPES = {
+    0: "fp32", 1: "fp16", 2: "q4_0", 3: "q4_1", 7: "q8_0", 8: "q5_0", 9: "q5_1",
+    10: "q2_k", 11: "q3_k_s", 12: "q3_k_m", 13: "q3_k_l", 14: "q4_k_s", 15: "q4_k_m",
+    16: "q5_k_s", 17: "q5_k_m", 18: "q6_k", 19: "iq2_xxs", 20: "iq2_xs", 21: "q2_k_s",
+    22: "iq3_xs", 23: "iq3_xxs", 24: "iq1_s", 25: "iq4_nl", 26: "iq3_s", 27: "iq3_m",
+    28: "iq2_s", 29: "iq2_m", 30: "iq4_xs", 31: "iq1_m", 32: "bf16", 36: "tq1_0", 37: "tq2_0",
+}
+
+# ggml 张量类型 -> 量化名 (general.file_type 缺失时按参数量统计主要类型)
+GGML_TENSOR_TYPES = {
+    0: "fp32", 1: "fp16", 2: "q4_0", 3: "q4_1", 6: "q5_0", 7: "q5_1", 8: "q8_0", 9: "q8_1",
+    10: "q2_k", 11: "q3_k", 12: "q4_k", 13: "q5_k", 14: "q6_k", 15: "q8_k",
+    16: "iq2_xxs", 17: "iq2_xs", 18: "iq3_xxs", 19: "iq1_s", 20: "iq4_nl", 21: "iq3_s",
+    22: "iq2_s", 23: "iq4_xs", 24: "int8", 29: "iq1_m", 30: "bf16", 34: "tq1_0", 35: "tq2_0",
+}
+
+# general.architecture -> detect_base_model 的架构名 (ComfyUI-GGUF 与 llama.cpp 的命名)
+GGUF_ARCH_ALIASES = {
+    "sd1": "sd15",
+    "sdxl": "sdxl",
+    "sd3": "sd3",
+    "flux": "flux",
+    "aura": "auraflow",
+    "ltxv": "kwai",
+    "hyvid": "hunyuan",
+}
+GGUF_ARCH_PREFIXES = [("qwen", "qwen"), ("llama", "llama"), ("hunyuan", "hunyuan")]
+
+
+class _GGUFReader:
+    """按需流式读取 GGUF 元数据区，跳过不需要的值，不读取张量数据"""
+
+    def __init__(self, f, version):
+        self.f = f
+        # v1 的长度/计数字段为 uint32，v2+ 为 uint64
+        self.len_fmt = "<I" if version == 1 else "<Q"
+
+    def _unpack(self, fmt):
+        size = struct.calcsize(fmt)
+        raw = self.f.read(size)
+        if len(raw) != size:
+            raise ValueError("unexpected end of GGUF header")
+        return struct.unpack(fmt, raw)[0]
+
+    def read_count(self):
+        return self._unpack(self.len_fmt)
+
+    def read_u32(self):
+        return self._unpack("<I")
+
+    def read_string(self):
+        length = self.read_count()
+        if length > MAX_GGUF_STRING:
+            self.f.seek(length, 1)
+            return None
+        raw = self.f.read(length)
+        if len(raw) != length:
+            raise ValueError("unexpected end of GGUF header")
+        return raw.decode("utf-8", errors="replace")
+
+    def skip_string(self):
+        self.f.seek(self.read_count(), 1)
+
+    def read_value(self, value_type, keep=True):
+        """读取一个值；keep=False 时只跳过 (数组整体跳过)"""
+        if value_type in GGUF_SCALAR_TYPES:
+            fmt = GGUF_SCALAR_TYPES[value_type]
+            if not keep:
+                self.f.seek(struct.calcsize(fmt), 1)
+                return None
+            return self._unpack(fmt)
+        if value_type == GGUF_TYPE_STRING:
+            if not keep:
+                self.skip_string()
+                return None
+            return self.read_string()
+        if value_type == GGUF_TYPE_ARRAY:
+            item_type = self.read_u32()
+            count = self.read_count()
+            if item_type in GGUF_SCALAR_TYPES:
+                self.f.seek(struct.calcsize(GGUF_SCALAR_TYPES[item_type]) * count, 1)
+            else:
+                # 字符串数组 (如 tokenizer 词表) 只能逐个跳过
+                for _ in range(count):
+                    self.read_value(item_type, keep=False)
+            return None
+        raise ValueError(f"unknown GGUF value type {value_type}")
+
+
+def read_gguf_metadata(path, keys=("general.architecture", "general.name", "general.file_type")):
+    """
+    流式解析 GGUF 头部的 key/value 元数据区，只保留 keys 中的值
+    general.file_type 缺失时继续读取张量信息表 (不含张量数据) 统计主要张量类型
+    返回: ({ key: value }, dominant_tensor_type) 或 (None, None)
+    """
+    with open(path, "rb") as f:
+        if f.read(4) != b"GGUF":
+            return None, None
+        reader = _GGUFReader(f, 2)
+        version = reader.read_u32()
+        if version not in (1, 2, 3):
+            return None, None
+        reader = _GGUFReader(f, version)
+        tensor_count = reader.read_count()
+        kv_count = reader.read_count()
+        if kv_count > MAX_GGUF_KV or tensor_count > MAX_GGUF_TENSORS:
+            return None, None
+
+        wanted = set(keys)
+        values = {}
+        for _ in range(kv_count):
+            key = reader.read_string()
+            value_type = reader.read_u32()
+            keep = key in wanted
+            value = reader.read_value(value_type, keep=keep)
+            if keep:
+                values[key] = value
+
+        dominant_type = None
+        if "general.file_type" not in values:
+            type_params = {}
+            for _ in range(tensor_count):
+                reader.skip_string()
+                n_dims = reader.read_u32()
+                count = 1
+                for _ in range(n_dims):
+                    count *= reader.read_count()
+                tensor_type = reader.read_u32()
+                f.seek(8, 1)  # offset
+                type_params[tensor_type] = type_params.get(tensor_type, 0) + count
+            if type_params:
+                dominant_type = max(type_params.items(), key=lambda kv: kv[1])[0]
+        return values, dominant_type
+
+
+def _normalize_gguf_arch(raw_arch):
+    if not raw_arch:
+        return None
+    raw_arch = raw_arch.lower()
+    if raw_arch in GGUF_ARCH_ALIASES:
+        return GGUF_ARCH_ALIASES[raw_arch]
+    for prefix, arch in GGUF_ARCH_PREFIXES:
+        if raw_arch.startswith(prefix):
+            return arch
+    return None
+
+
+def inspect_gguf(path):
+    """
+    从 GGUF 元数据读取架构、量化类型与模型名
+    返回: { "arch": str|None, "gguf_arch": str|None, "quant": str|None, "model_name": str|None }
+    """
+    values, dominant_type = read_gguf_metadata(path)
+    if values is None:
+        return {}
+    raw_arch = values.get("general.architecture")
+    file_type = values.get("general.file_type")
+    if file_type is not None:
+        quant = GGUF_FILE_TYPES.get(file_type)
+    else:
+        quant = GGML_TENSOR_TYPES.get(dominant_type)
+    return {
+        "arch": _normalize_gguf_arch(raw_arch),
+        "gguf_arch": raw_arch,
+        "quant": quant,
+        "model_name": values.get("general.name"),
+    }
+
+
+def inspect_model_header(path):
+    """
+    按扩展名分发头部解析，返回可写入索引条目的字段 (不含 None 值)
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".safetensors", ".sft"):
+        info = inspect_safetensors(path)
+    elif ext == ".gguf":
+        info = inspect_gguf(path)
+    else:
+        return {}
+    return {k: v for k, v in info.items() if v is not None}
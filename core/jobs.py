@@ -0,0 +1,171 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .scanner import ScanCancelled
+except ImportError:
+    from scanner import ScanCancelled
+
+PROGRESS_INTERVAL = 0.25  # 进度推送的最小间隔 (秒)
+MAX_FINISHED_JOBS = 20  # 保留已结束任务的状态条数
+
+
+class ScanJob:
+    """
+    后台扫描任务: 记录进度计数并响应取消
+    作为 progress 对象传给 ModelIndex.scan_incremental
+    """
+
+    def __init__(self, deep_verify=None, publish=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.deep_verify = deep_verify
+        self.status = "pending"  # pending / running / done / cancelled / error
+        self.stage = None  # walk / hash / headers / save
+        self.files_seen = 0
+        self.files_hashed = 0
+        self.hash_total = 0
+        self.bytes_read = 0
+        self.bytes_total = 0
+        self.count = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._hash_started = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._publish = publish
+        self._last_publish = 0.0
+
+    # === 扫描器回调 ===
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise ScanCancelled()
+
+    def set_stage(self, stage, total=0, total_bytes=0):
+        with self._lock:
+            self.stage = stage
+            if stage == "hash":
+                self.hash_total = total
+                self.bytes_total = total_bytes
+                self._hash_started = time.time()
+        self._notify(force=True)
+
+    def add_seen(self, n=1):
+        self.check_cancelled()
+        with self._lock:
+            self.files_seen += n
+        self._notify()
+
+    def add_hashed(self, nbytes):
+        with self._lock:
+            self.files_hashed += 1
+            self.bytes_read += nbytes
+        self._notify()
+
+    # === 状态 ===
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def eta(self):
+        """按已读取字节的速率估算哈希阶段剩余秒数"""
+        if self.stage != "hash" or not self._hash_started or not self.bytes_read:
+            return None
+        elapsed = time.time() - self._hash_started
+        remaining = max(0, self.bytes_total - self.bytes_read)
+        return round(remaining * elapsed / self.bytes_read, 1)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "files_seen": self.files_seen,
+                "files_hashed": self.files_hashed,
+                "hash_total": self.hash_total,
+                "bytes_read": self.bytes_read,
+                "bytes_total": self.bytes_total,
+                "eta": self.eta,
+                "count": self.count,
+                "error": self.error,
+                "started": self.started,
+                "finished": self.finished,
+            }
+
+    def _notify(self, force=False):
+        if self._publish is None:
+            return
+        now = time.time()
+        if not force and now - self._last_publish < PROGRESS_INTERVAL:
+            return
+        self._last_publish = now
+        try:
+            self._publish(self.to_dict())
+        except Exception as e:
+            print(f"[AutoMatch] Progress publish error: {e}")
+
+
+class ScanJobManager:
+    """
+    在单独的工作线程上运行扫描，同一时间最多一个扫描任务
+    publish: 可选回调 publish(status_dict)，用于通过 websocket 推送进度
+    """
+
+    def __init__(self, index, publish=None):
+        self.index = index
+        self.publish = publish
+        self.jobs = {}
+        self.current = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AutoMatchScan")
+
+    def start(self, deep_verify=None):
+        """启动扫描；已有任务在运行时直接返回该任务"""
+        with self._lock:
+            if self.current is not None and self.current.status in ("pending", "running"):
+                return self.current, False
+            job = ScanJob(deep_verify=deep_verify, publish=self.publish)
+            self.jobs[job.id] = job
+            self.current = job
+            self._prune()
+            self._executor.submit(self._run, job)
+            return job, True
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status in ("pending", "running"):
+            job.cancel()
+        return job
+
+    def _run(self, job):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            job.check_cancelled()
+            job.count = self.index.scan_incremental(deep_verify=job.deep_verify, progress=job)
+            job.status = "done"
+        except ScanCancelled:
+            job.status = "cancelled"
+            print("[AutoMatch] Scan cancelled")
+        except Exception as e:
+            job.status = "error"
+            job.error = str(e)
+            print(f"[AutoMatch] Scan job error: {e}")
+        finally:
+            job.finished = time.time()
+            job._notify(force=True)
+
+    def _prune(self):
+        finished = [j for j in self.jobs.values() if j.status not in ("pending", "running") and j is not self.current]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
@@ -1,16 +1,123 @@
 import difflib
+import heapq
+import math
 import os
+import time
+from collections import OrderedDict
 try:
-    from .utils import AdvancedTokenizer
+    from .utils import AdvancedTokenizer, PreparedName, CRITICAL_TERMS, STRICT_PRECISIONS
 except ImportError:
-    from utils import AdvancedTokenizer
+    from utils import AdvancedTokenizer, PreparedName, CRITICAL_TERMS, STRICT_PRECISIONS
+
+# 头部元数据中的架构与文件名推断的架构之间的兼容关系 (Pony 基于 SDXL)
+ARCH_EQUIVALENTS = {"pony": "sdxl"}
+# 可以与 safetensors 头部 dtype 直接比较的精度标记
+FLOAT_PRECISIONS = {"fp32", "fp16", "bf16", "fp8"}
+# P3 候选数达到该值时，序列相似度分量改为一次批量计算
+BATCH_SCORING_MIN = 16
+# P5 模糊回退的相似度阈值 (difflib ratio)
+CLOSE_MATCH_CUTOFF = 0.85
+# P5 近似查找的 q-gram 倒排索引粒度 (三元组)
+GRAM_SIZE = 3
+# 候选召回: 按 IDF 累计权重只保留前 K 个候选；出现在超过 STOP_TOKEN_RATIO 比例模型中的词视为停用词
+# (停用词过滤只在模型数不少于 STOP_TOKEN_MIN_MODELS 时启用，小库保持全量召回)
+CANDIDATE_LIMIT = 200
+STOP_TOKEN_RATIO = 0.2
+STOP_TOKEN_MIN_MODELS = 500
+# 跨请求的匹配结果缓存条数 (LRU，键含索引代数，索引变化后旧结果自然失效)
+RESULT_CACHE_SIZE = 1024
+# 多进程匹配: 待计算的不同缺失值达到该数量时才分片到子进程 (默认关闭)
+PROCESS_BATCH_MIN = 64
+# 每个工作进程分到的分片数 (分片越小负载越均衡)
+SHARDS_PER_WORKER = 4
+
+# 工作进程中的匹配器副本 (进程池启动时由 _init_worker 从父进程的索引状态恢复)
+_worker_matcher = None
+
+
+def _init_worker(matcher):
+    """工作进程初始化: 保存父进程传来的匹配器副本，之后每个分片直接复用"""
+    global _worker_matcher
+    _worker_matcher = matcher
+
+
+def _match_shard(shard, deadline):
+    """工作进程: 依次匹配一个分片，超过截止时间的条目返回 (False, None)"""
+    results = []
+    for current_val, model_type in shard:
+        if deadline is not None and time.monotonic() >= deadline:
+            results.append((False, None))
+        else:
+            results.append((True, _worker_matcher._match_value(current_val, model_type)))
+    return results
+
+
+class ModelFeatures:
+    """
+    单个模型的文件名特征，构建索引时计算一次，P1-P5 各阶段直接复用
+    prepared 为纯文件名的 PreparedName (与 calculate_similarity 的输入一致)，P3 打分时直接比较；
+    架构、量化、分词集合、核心词等都从 prepared 读取，这里不再重复保存
+    """
+    __slots__ = ("base", "names", "tokens", "fmt", "prepared")
+
+    def __init__(self, filename, base, norm):
+        self.base = base
+        self.names = (norm, filename.lower())
+        # 保留分词顺序，倒排索引按此顺序建立
+        self.tokens = AdvancedTokenizer.tokenize(base)
+        self.fmt = AdvancedTokenizer.get_model_format(filename)
+        self.prepared = PreparedName(base)
+
 
 class ModelMatcher:
-    def __init__(self, scanner):
+    def __init__(self, scanner, candidate_limit=CANDIDATE_LIMIT, stop_token_ratio=STOP_TOKEN_RATIO, cross_type_fallback=True,
+                 cache_size=RESULT_CACHE_SIZE, process_workers=0, process_batch_min=PROCESS_BATCH_MIN):
         self.scanner = scanner
-        # 倒排索引: {token: set(model_indices)}
+        # 召回设置: 候选上限 K (None/0 不限) 与停用词频率上限 (召回率与延迟的权衡)
+        self.candidate_limit = candidate_limit
+        self.stop_token_ratio = stop_token_ratio
+        # 指定类型 (前端按 widget 推断的 checkpoints/loras/...) 内找不到时，是否再在全部类型中查找
+        self.cross_type_fallback = cross_type_fallback
+        # 倒排索引: {token: set(model_keys)}，model_key 为条目 hash (无 hash 时为序号)
         self.inverted_index = {}
-        self.model_list = [] # List storing actual model info, referenced by index
+        self.models = {} # { model_key: info }
+        # 每个模型加入索引时的序号: 候选按序号遍历，同分时取索引中靠前的模型
+        # (model_key 为 hash 字符串，set 的遍历顺序随 PYTHONHASHSEED 变化，不能依赖)
+        self.ordinals = {}
+        self._next_ordinal = 0
+        # 每个模型预先计算的特征 (文件名分词、格式、核心词)，匹配时直接复用
+        self.features = {}
+        # 精确查找: 名称 -> { model_key: None } (有序集合)
+        # full_name_map 以最后加入者为准，basename_map 以最先加入者为准 (与旧版整体重建一致)
+        self.full_name_map = {}
+        self.basename_map = {}
+        # 近似查找: 文件名长度 -> { basename: None }，P5 只在可能达到阈值的长度范围内查找
+        self.length_buckets = {}
+        # 近似查找: 三元组 -> { basename: 出现次数 }，P5 只校验共享三元组足够多的文件名
+        self.gram_index = {}
+        # 按模型类型分区: 类型 -> 倒排索引 / { basename: 条目数 } / 条目数
+        self.type_index = {}
+        self.type_basenames = {}
+        self.type_counts = {}
+        # 已同步到的扫描器索引代数 (None 表示尚未构建)
+        self._generation = None
+        # 匹配结果缓存: (缺失值, 类型, 索引代数) -> 条目或 None (0 表示关闭)
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._result_cache = OrderedDict()
+        # 多进程匹配: 工作进程数 (0 表示只在本进程内匹配) 与启用的最小批量
+        self.process_workers = process_workers
+        self.process_batch_min = process_batch_min
+        # 常驻进程池及其对应的索引代数 (索引变化后重建，工作进程持有的是启动时的索引副本)
+        self._pool = None
+        self._pool_generation = None
+
+    def __getstate__(self):
+        """传给工作进程的状态: 只保留索引与设置 (扫描器、结果缓存、进程池留在父进程)"""
+        state = self.__dict__.copy()
+        state.update(scanner=None, _result_cache=OrderedDict(), _pool=None, _pool_generation=None)
+        return state
 
     def _normalize_name(self, name):
         """标准化模型名称，移除扩展名并转小写"""
@@ -24,49 +131,586 @@ class ModelMatcher:
         base, _ = os.path.splitext(name)
         return base.lower().strip()
 
-    def _build_index(self):
-        """构建倒排索引以加速匹配 (O(N) -> O(1))"""
-        self.model_list = list(self.scanner.get_all_models())
+    @staticmethod
+    def _similarity_precheck(target, feature):
+        """
+        用预计算特征提前排除 calculate_similarity 必然判 0 分的候选 (架构冲突、量化冲突、关键功能词冲突)
+        target: 目标的 ModelFeatures
+        """
+        target, feature = target.prepared, feature.prepared
+        if target.base_model != "unknown" and feature.base_model != "unknown" and target.base_model != feature.base_model:
+            return False
+        quant_a, quant_b = target.quant, feature.quant
+        if quant_a and quant_b and quant_a != quant_b:
+            return False
+        if (quant_a in STRICT_PRECISIONS or quant_b in STRICT_PRECISIONS) and quant_a != quant_b:
+            return False
+        if (target.tokens ^ feature.tokens) & CRITICAL_TERMS:
+            return False
+        return True
+
+    @staticmethod
+    def _metadata_compatible(target_arch, target_quant, candidate_info, check_precision=True):
+        """
+        使用扫描器从文件头读取的真实元数据过滤候选 (无元数据时放行)
+        - arch: 目标文件名推断出架构时，必须与候选的真实架构一致
+        - dtype: 目标文件名明确指定浮点精度时，必须与候选的真实精度一致
+        - quant: GGUF 头部的量化类型 (file_type)，与目标文件名的量化标记比较
+        """
+        cand_arch = candidate_info.get("arch")
+        if cand_arch and target_arch != "unknown":
+            if ARCH_EQUIVALENTS.get(target_arch, target_arch) != ARCH_EQUIVALENTS.get(cand_arch, cand_arch):
+                return False
+        cand_dtype = candidate_info.get("dtype")
+        if check_precision and cand_dtype and target_quant in FLOAT_PRECISIONS:
+            if cand_dtype != target_quant:
+                return False
+        cand_quant = candidate_info.get("quant")
+        if check_precision and cand_quant and target_quant:
+            if not ModelMatcher._quant_compatible(target_quant, cand_quant):
+                return False
+        return True
+
+    @staticmethod
+    def _quant_compatible(quant_a, quant_b):
+        """量化名一致，或一方是另一方的前缀 (按张量类型统计只能得到 q4_k，文件名为 q4_k_m)"""
+        if quant_a == quant_b:
+            return True
+        short, long = sorted((quant_a, quant_b), key=len)
+        return long.startswith(short + "_")
+
+    def _pin_snapshot(self):
+        """取得扫描器当前发布的快照；扫描器不支持快照时返回 None"""
+        snapshot = getattr(self.scanner, "snapshot", None)
+        if not callable(snapshot):
+            return None
+        snapshot = snapshot()
+        return snapshot if isinstance(getattr(snapshot, "generation", None), int) else None
+
+    def _build_index(self, snapshot=None):
+        """整体重建倒排索引与精确查找表 (有快照时基于快照，条目与代数一致)"""
+        if snapshot is not None:
+            generation, entries = snapshot.generation, snapshot.models.values()
+        else:
+            generation, entries = getattr(self.scanner, "generation", None), self.scanner.get_all_models()
         self.inverted_index = {}
+        self.models = {}
+        self.ordinals = {}
+        self._next_ordinal = 0
+        self.features = {}
+        self.full_name_map = {}
+        self.basename_map = {}
+        self.length_buckets = {}
+        self.gram_index = {}
+        self.type_index = {}
+        self.type_basenames = {}
+        self.type_counts = {}
+        for idx, info in enumerate(list(entries)):
+            self._add_model(info.get("hash") or idx, info)
+        self._generation = generation if isinstance(generation, int) else None
+
+    def _add_model(self, key, info):
+        """加入单个模型 (已存在时先移除旧条目，保留原序号)"""
+        ordinal = self.ordinals.get(key)
+        if key in self.models:
+            self._remove_model(key)
+        if ordinal is None:
+            ordinal = self._next_ordinal
+            self._next_ordinal += 1
+        self.ordinals[key] = ordinal
+        filename = info["filename"]
+        feature = ModelFeatures(filename, self._get_basename(filename), self._normalize_name(filename))
+        self.models[key] = info
+        self.features[key] = feature
+        # 使用 AdvancedTokenizer 对完整文件名 (无后缀) 的分词建立倒排 (全局 + 所属类型分区)
+        model_type = info.get("type")
+        type_index = self.type_index.setdefault(model_type, {})
+        for token in feature.tokens:
+            self.inverted_index.setdefault(token, set()).add(key)
+            type_index.setdefault(token, set()).add(key)
+        type_basenames = self.type_basenames.setdefault(model_type, {})
+        type_basenames[feature.base] = type_basenames.get(feature.base, 0) + 1
+        self.type_counts[model_type] = self.type_counts.get(model_type, 0) + 1
+        for name in feature.names:
+            keys = self.full_name_map.setdefault(name, {})
+            keys.pop(key, None)
+            keys[key] = None
+        if feature.base not in self.basename_map:
+            self.length_buckets.setdefault(len(feature.base), {})[feature.base] = None
+            for gram, count in self._grams(feature.base).items():
+                self.gram_index.setdefault(gram, {})[feature.base] = count
+        self.basename_map.setdefault(feature.base, {})[key] = None
+
+    def _remove_model(self, key):
+        info = self.models.pop(key, None)
+        if info is None:
+            return
+        feature = self.features.pop(key)
+        del self.ordinals[key]
+        model_type = info.get("type")
+        for index in (self.inverted_index, self.type_index[model_type]):
+            for token in feature.tokens:
+                keys = index.get(token)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del index[token]
+        type_basenames = self.type_basenames[model_type]
+        type_basenames[feature.base] -= 1
+        if not type_basenames[feature.base]:
+            del type_basenames[feature.base]
+        self.type_counts[model_type] -= 1
+        if not self.type_counts[model_type]:
+            del self.type_counts[model_type]
+            del self.type_index[model_type]
+            del self.type_basenames[model_type]
+        for name_map, names in ((self.full_name_map, feature.names), (self.basename_map, (feature.base,))):
+            for name in names:
+                keys = name_map.get(name)
+                if keys is not None:
+                    keys.pop(key, None)
+                    if not keys:
+                        del name_map[name]
+                        if name_map is self.basename_map:
+                            bucket = self.length_buckets[len(name)]
+                            del bucket[name]
+                            if not bucket:
+                                del self.length_buckets[len(name)]
+                            for gram in self._grams(name):
+                                postings = self.gram_index[gram]
+                                del postings[name]
+                                if not postings:
+                                    del self.gram_index[gram]
+
+    def _sync_index(self):
+        """
+        与扫描器索引同步 (固定在同步开始时发布的快照，扫描在后台提交也不会看到中间状态):
+        - 代数未变: 直接复用
+        - 代数前进且变更记录完整: 只应用增删的条目 (到快照的代数为止)
+        - 其他情况 (首次、变更记录已被截断、扫描器不支持代数): 整体重建
+        """
+        snapshot = self._pin_snapshot()
+        if snapshot is None:
+            self._build_index()
+            return
+        if self._generation is None:
+            self._build_index(snapshot)
+            return
+        if snapshot.generation == self._generation:
+            return
+        changes = self.scanner.changes_since(self._generation)
+        if changes is None:
+            self._build_index(snapshot)
+            return
+        for change_generation, added, removed in changes:
+            if change_generation > snapshot.generation:
+                break
+            for key in removed:
+                self._remove_model(key)
+            for key, info in added.items():
+                self._add_model(key, info)
+            self._generation = change_generation
+
+    def _lookup_full_name(self, name, model_type=None):
+        """同名时以最后加入者为准；model_type 不为空时只在该类型内查找"""
+        for key in reversed(self.full_name_map.get(name, {})):
+            if model_type is None or self.models[key].get("type") == model_type:
+                return self.models[key]
+        return None
+
+    def _lookup_basename(self, name, model_type=None):
+        """同名时以最先加入者为准；model_type 不为空时只在该类型内查找"""
+        for key in self.basename_map.get(name, {}):
+            if model_type is None or self.models[key].get("type") == model_type:
+                return self.models[key]
+        return None
+
+    def _retrieve_candidates(self, tokens, model_type=None):
+        """
+        IDF 加权召回: 返回按索引序号排列的候选 model_key 列表 (model_type 不为空时只在该类型分区内召回)
+        - 文档频率 (df) 即倒排表长度；高于频率上限的停用词不参与召回 (全部是停用词时保留最稀有的一个)
+        - 候选超过 candidate_limit 时，按命中词的 IDF 累计权重取前 K 个
+        """
+        if model_type is None:
+            index, total = self.inverted_index, len(self.models)
+        else:
+            index, total = self.type_index.get(model_type, {}), self.type_counts.get(model_type, 0)
+        postings = [(token, index[token]) for token in dict.fromkeys(tokens) if token in index]
+        if not postings:
+            return []
+        if self.stop_token_ratio and total >= STOP_TOKEN_MIN_MODELS:
+            ceiling = total * self.stop_token_ratio
+            kept = [p for p in postings if len(p[1]) <= ceiling]
+            postings = kept or [min(postings, key=lambda p: len(p[1]))]
+
+        candidates = set()
+        for _, keys in postings:
+            candidates.update(keys)
+        if self.candidate_limit and len(candidates) > self.candidate_limit:
+            weights = {}
+            for _, keys in postings:
+                idf = math.log((total + 1) / (len(keys) + 1)) + 1.0
+                for key in keys:
+                    weights[key] = weights.get(key, 0.0) + idf
+            # 权重相同时保留序号靠前的模型
+            ordinals = self.ordinals
+            candidates = heapq.nlargest(self.candidate_limit, weights, key=lambda key: (weights[key], -ordinals[key]))
+        return sorted(candidates, key=self.ordinals.__getitem__)
+
+    @staticmethod
+    def _grams(name):
+        """文件名的三元组计数 {gram: 次数} (短于 GRAM_SIZE 时为空)"""
+        grams = {}
+        for i in range(len(name) - GRAM_SIZE + 1):
+            gram = name[i:i + GRAM_SIZE]
+            grams[gram] = grams.get(gram, 0) + 1
+        return grams
+
+    @staticmethod
+    def _min_shared_grams(la, lb, cutoff):
+        """
+        ratio >= cutoff 时两个文件名至少共享的三元组数 (<= 0 表示无法用三元组过滤)
+        difflib 的匹配字符数 M 不超过 LCS，因此 LCS >= ceil(cutoff*(la+lb)/2)；
+        a 中每个未匹配字符最多破坏 q 个三元组，b 中每个插入字符最多破坏 q-1 个
+        """
+        lcs = math.ceil(cutoff * (la + lb) / 2 - 1e-9)
+        q = GRAM_SIZE
+        return max(
+            (la - q + 1) - q * (la - lcs) - (q - 1) * (lb - lcs),
+            (lb - q + 1) - q * (lb - lcs) - (q - 1) * (la - lcs),
+        )
+
+    def _closest_basename(self, target, model_type=None, cutoff=CLOSE_MATCH_CUTOFF):
+        """
+        与 difflib.get_close_matches(target, basenames, n=1, cutoff) 结果一致的近似查找:
+        1. 长度过滤: ratio <= 2*min(la, lb)/(la+lb)，只取可能达到阈值的长度桶
+        2. 三元组倒排索引 (计数过滤): 按长度计算达到阈值所需的最少共享三元组数 needed，
+           候选必然包含目标中最稀有的 (总数 - needed + 1) 个三元组之一，只取这些倒排表的并集
+           (needed <= 0 的短名长度桶整体保留)
+        3. rapidfuzz Indel 相似度 (基于 LCS，不小于 difflib 的 ratio) 批量预筛
+        4. 对剩余候选用 difflib 计算精确 ratio，取 (score, name) 最大者
+        """
+        length = len(target)
+        if not length or not self.length_buckets:
+            return None
+        min_len = int(length * cutoff / (2 - cutoff))
+        max_len = int(length * (2 - cutoff) / cutoff) + 1
+        names = []
+        needed_by_len = {}
+        for bucket_len, bucket in self.length_buckets.items():
+            if not min_len <= bucket_len <= max_len:
+                continue
+            needed = self._min_shared_grams(length, bucket_len, cutoff)
+            if needed <= 0:
+                names.extend(bucket)
+            else:
+                needed_by_len[bucket_len] = needed
+        if needed_by_len:
+            target_grams = self._grams(target)
+            # 未选中的三元组最多贡献 (needed - 1) 次共享，按最宽松的长度桶选取
+            budget = len(target) - GRAM_SIZE + 1 - min(needed_by_len.values())
+            seeds = set()
+            for gram in sorted(target_grams, key=lambda g: len(self.gram_index.get(g, ()))):
+                seeds.update(self.gram_index.get(gram, ()))
+                budget -= target_grams[gram]
+                if budget < 0:
+                    break
+            names.extend(name for name in seeds if len(name) in needed_by_len)
+        if model_type is not None:
+            allowed = self.type_basenames.get(model_type, {})
+            names = [name for name in names if name in allowed]
+        if not names:
+            return None
+
+        from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+        prefiltered = rf_process.extract(target, names, scorer=rf_fuzz.ratio,
+                                         score_cutoff=cutoff * 100 - 1e-6, limit=None)
+        best = None
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(target)
+        for name, _, _ in prefiltered:
+            matcher.set_seq1(name)
+            score = matcher.ratio()
+            if score >= cutoff and (best is None or (score, name) > best):
+                best = (score, name)
+        return best[1] if best else None
+
+    def _match_value(self, current_val, model_type=None):
+        """
+        为单个缺失值查找本地模型，返回条目或 None
+        model_type: 前端推断的模型类型 (只是猜测，默认 checkpoints)
+        - P1/P2 精确匹配在全部模型中进行 (同类型优先)，精确命中总是优先于模糊匹配
+        - P3-P5 模糊匹配先在该类型分区内进行，找不到时按设置回退到全部类型
+        """
+        target_norm = self._normalize_name(current_val)
+        target_base = self._get_basename(current_val)
+        target = ModelFeatures(current_val, target_base, target_norm)
         
-        for idx, info in enumerate(self.model_list):
-            filename = info["filename"]
-            
-            # 使用 AdvancedTokenizer
-            # 1. 对完整文件名 (无后缀) 分词
-            base_tokens = AdvancedTokenizer.tokenize(self._get_basename(filename))
+        # Prepare Target Format for Strict Checking
+        target_fmt = target.fmt
+        if target_fmt == "other":
+            # Try to infer from usage or assume checkpoint if unclear, but safer to match 'other' loosely
+            if "gguf" in target_base.lower(): target_fmt = "gguf"
+            elif ".safetensors" in current_val or ".ckpt" in current_val: target_fmt = "checkpoint"
+
+        # 目标的架构/精度 (每个条目只推断一次，用于与候选的真实元数据比较)
+        target_arch = AdvancedTokenizer.detect_base_model(current_val)
+        target_quant = AdvancedTokenizer.detect_quantization(current_val)
+
+        typed = model_type is not None and model_type in self.type_counts
+        scopes = (model_type, None) if typed else (None,)
+
+        # Priority 1: Exact Full Path Match
+        for scope in scopes:
+            best_match = self._lookup_full_name(target.names[0], scope) or self._lookup_full_name(current_val.lower(), scope)
+            if best_match:
+                return best_match
+
+        # Priority 2: Exact Basename Match
+        for scope in scopes:
+            best_match = self._lookup_basename(target.base, scope)
+            if best_match:
+                return best_match
+
+        if model_type is not None:
+            best_match = None
+            if typed:
+                best_match = self._fuzzy_stages(current_val, target, target_fmt, target_arch, target_quant, model_type)
+            if best_match or not self.cross_type_fallback:
+                return best_match
+        return self._fuzzy_stages(current_val, target, target_fmt, target_arch, target_quant)
+
+    def _fuzzy_stages(self, current_val, target, target_fmt, target_arch, target_quant, model_type=None):
+        """依次执行 P3-P5 模糊匹配，model_type 不为空时只在该类型分区内查找"""
+        target_base = target.base
+        best_match = None
+        
+        # Priority 3: Inverted Index Fuzzy Match (Optimization)
+        # This handles small typos or differences
+        if not best_match:
+            candidate_indices = self._retrieve_candidates(target.tokens, model_type)
             
-            # 2. 对路径进行简单分词 (可选，防止干扰太大暂不深入)
+            best_token_score = 0.0
+            token_candidate_info = None
+
+            if candidate_indices:
+                # 先用规则过滤 (格式/特征预检查/头部元数据)，再对剩余候选打分
+                survivors = []
+                for idx in candidate_indices:
+                    candidate_info = self.models[idx]
+                    feature = self.features[idx]
+                    
+                    # [Strict Check] Format Compatibility
+                    cand_fmt = feature.fmt
+                    if target_fmt != "other" and cand_fmt != "other":
+                        if target_fmt != cand_fmt:
+                            continue
+
+                    # 预计算特征即可判定为 0 分的候选不再计算相似度
+                    if not self._similarity_precheck(target, feature):
+                        continue
+
+                    # [Strict Check] 文件头元数据 (架构/精度)
+                    if not self._metadata_compatible(target_arch, target_quant, candidate_info):
+                        continue
+
+                    survivors.append((candidate_info, feature))
+
+                # 候选较多时一次批量计算序列相似度 (rapidfuzz)，其余规则仍逐个计算
+                seq_ratios = [None] * len(survivors)
+                if len(survivors) >= BATCH_SCORING_MIN:
+                    seq_ratios = AdvancedTokenizer.batch_sequence_ratios(
+                        target.prepared.seq_text, [feature.prepared.seq_text for _, feature in survivors]
+                    )
+
+                for (candidate_info, feature), seq_ratio in zip(survivors, seq_ratios):
+                    score = AdvancedTokenizer.calculate_similarity_prepared(target.prepared, feature.prepared, seq_ratio=seq_ratio)
+                    if score > best_token_score:
+                        best_token_score = score
+                        token_candidate_info = candidate_info
+                
+                # Strict threshold for fuzzy
+                if best_token_score >= 0.6:
+                    best_match = token_candidate_info
+
+        # Priority 4: Variant Match (Cross-Quantization)
+        # e.g., "Qwen...bf16.safetensors" vs "Qwen...fp16.safetensors"
+        # BUT: Strict format check (GGUF != Safetensors)
+        if not best_match:
+            # 提取核心 Token (去除量化、格式后缀)
+            target_core = target.prepared.core
+            # target_fmt ALREADY DEFINED above
             
-            for token in base_tokens:
-                if token not in self.inverted_index:
-                    self.inverted_index[token] = set()
-                self.inverted_index[token].add(idx)
+            if target_core: # 只有存在核心词时才尝试
+                best_variant_score = 0.0
+                variant_candidate = None
+                variant_exact_quant = False
+                
+                variant_indices = self._retrieve_candidates(target_core, model_type)
+                
+                if variant_indices:
+                    for idx in variant_indices:
+                        candidate_info = self.models[idx]
+                        feature = self.features[idx]
+                        
+                        # Strict Format Check
+                        cand_fmt = feature.fmt
+                        # e.g. GGUF can only match GGUF
+                        if target_fmt != "other" and cand_fmt != "other" and target_fmt != cand_fmt:
+                            continue
+                        # 变体匹配允许跨精度，但架构必须一致
+                        if not self._metadata_compatible(target_arch, target_quant, candidate_info, check_precision=False):
+                            continue
+                        
+                        # 候选的核心词 (构建索引时已提取)
+                        candidate_core = feature.prepared.core
+                        if not candidate_core: continue
+                        
+                        # 计算核心词 Jaccard 相似度
+                        intersection = len(target_core.intersection(candidate_core))
+                        union = len(target_core.union(candidate_core))
+                        core_score = intersection / union if union > 0 else 0.0
+                        
+                        # 同分时优先头部量化类型与目标完全一致的变体
+                        exact_quant = bool(target_quant) and candidate_info.get("quant") == target_quant
+                        
+                        # 要求极高的核心词重合度
+                        if core_score > best_variant_score or (
+                            core_score == best_variant_score and exact_quant and not variant_exact_quant
+                        ):
+                            best_variant_score = core_score
+                            variant_candidate = candidate_info
+                            variant_exact_quant = exact_quant
+                    
+                    # 如果核心词几乎完全一致 (>0.9)，则认为是变体匹配
+                    if best_variant_score >= 0.9:
+                         best_match = variant_candidate
+
+        # Priority 5: Legacy Fuzzy Match (如果 Token 索引也没找到)
+        if not best_match:
+            similar = self._closest_basename(target_base, model_type)
+            if similar:
+                candidate_info = self._lookup_basename(similar, model_type)
+                if self._metadata_compatible(target_arch, target_quant, candidate_info):
+                    best_match = candidate_info
+
+        return best_match
+
+    def _cached_match_value(self, current_val, model_type=None):
+        """
+        带 LRU 缓存的 _match_value
+        扫描器不支持代数时无法判断索引是否变化，不使用缓存
+        """
+        if not self.cache_size or self._generation is None:
+            return self._match_value(current_val, model_type)
+        key = (current_val, model_type, self._generation)
+        if key in self._result_cache:
+            self._result_cache.move_to_end(key)
+            self.cache_hits += 1
+            return self._result_cache[key]
+        self.cache_misses += 1
+        result = self._match_value(current_val, model_type)
+        self._cache_put(current_val, model_type, result)
+        return result
+
+    def _cache_put(self, current_val, model_type, result):
+        if not self.cache_size or self._generation is None:
+            return
+        self._result_cache[(current_val, model_type, self._generation)] = result
+        while len(self._result_cache) > self.cache_size:
+            self._result_cache.popitem(last=False)
+
+    def _process_pool_context(self, pending_count):
+        """
+        满足多进程条件时返回进程上下文，否则返回 None (走本进程路径)
+        匹配在后台线程中运行，不能在线程中 fork (可能继承其他线程持有的锁)，因此使用 forkserver/spawn
+        """
+        if not self.process_workers or self.process_workers < 2 or pending_count < self.process_batch_min:
+            return None
+        import multiprocessing
+        methods = multiprocessing.get_all_start_methods()
+        return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+    def _get_pool(self, context):
+        """返回与当前索引代数一致的常驻进程池 (首次使用或索引变化时启动，工作进程初始化时接收索引副本)"""
+        if self._pool is not None and self._pool_generation == self._generation:
+            return self._pool
+        self.close()
+        from concurrent.futures import ProcessPoolExecutor
+        self._pool = ProcessPoolExecutor(max_workers=self.process_workers, mp_context=context,
+                                         initializer=_init_worker, initargs=(self,))
+        self._pool_generation = self._generation
+        return self._pool
+
+    def close(self):
+        """关闭常驻进程池"""
+        pool, self._pool, self._pool_generation = self._pool, None, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _match_in_processes(self, keys, deadline, context):
+        """
+        把待计算的 (缺失值, 类型) 分片交给常驻进程池，结果按键合并
+        返回 { key: 结果 }，超过截止时间未计算的键不在其中
+        工作进程异常退出 (如被系统杀掉、无法导入本模块) 时放弃本批结果，由调用方在本进程内匹配
+        """
+        from concurrent.futures.process import BrokenProcessPool
+
+        shard_count = min(len(keys), self.process_workers * SHARDS_PER_WORKER)
+        shards = [keys[i::shard_count] for i in range(shard_count)]
+
+        resolved = {}
+        try:
+            pool = self._get_pool(context)
+            for shard, results in zip(shards, pool.map(_match_shard, shards, [deadline] * len(shards))):
+                for key, (evaluated, result) in zip(shard, results):
+                    if evaluated:
+                        resolved[key] = result
+        except BrokenProcessPool as e:
+            print(f"[AutoMatch] Match worker pool failed, falling back to in-process matching: {e}")
+            self.close()
+            return {}
+
+        self.cache_misses += len(resolved)
+        for (current_val, model_type), result in resolved.items():
+            self._cache_put(current_val, model_type, result)
+        return resolved
+
+    def _is_cached(self, current_val, model_type=None):
+        return bool(self.cache_size) and self._generation is not None and \
+            (current_val, model_type, self._generation) in self._result_cache
+
+    def cache_stats(self):
+        return {
+            "size": len(self._result_cache),
+            "capacity": self.cache_size,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+        }
 
     def match(self, missing_items):
         """
         匹配缺失的模型
         """
+        return self.match_partial(missing_items)[0]
+
+    def match_partial(self, missing_items, deadline=None):
+        """
+        匹配缺失的模型，可设置截止时间
+        deadline: time.monotonic() 的截止时刻；超时后不再计算新的条目 (已解析或已缓存的仍直接返回)
+        返回 (matches, pending)，pending 为未来得及匹配的条目
+        """
         matches = []
+        pending = []
         
-        # 每次匹配前重建索引? 为了性能，最好缓存。
-        # 但考虑到文件可能变动，且构建速度很快 (几千个文件毫秒级)，每次重建是可以接受的，或者在 scanner 变动时重建。
-        # 为了简单和一致性，这里每次重建 (因为 scanner 数据是动态的)。
-        self._build_index()
-        
-        # 辅助映射: 快速精确查找
-        full_name_map = {}
-        basename_map = {}
-        for idx, info in enumerate(self.model_list):
-             filename = info["filename"]
-             norm = self._normalize_name(filename)
-             full_name_map[norm] = info
-             full_name_map[filename.lower()] = info
-             
-             base = self._get_basename(filename)
-             if base not in basename_map:
-                 basename_map[base] = info
+        # 按扫描器的索引代数增量同步 (索引未变时为 O(1))
+        self._sync_index()
 
+        # 同一请求中多个节点引用同一缺失模型时只解析一次，结果分发给每个节点
+        # 键使用原始值而非 _normalize_name: 扩展名参与格式推断与全名匹配，去掉后结果可能不同
+        resolved = {}
+
+        candidates = []
         for item in missing_items:
             current_val = item.get("current")
             if not current_val:
@@ -78,116 +722,27 @@ class ModelMatcher:
             _, ext = os.path.splitext(current_val)
             if ext.lower() not in VALID_EXTS:
                 continue
+            candidates.append((item, current_val, item.get("type")))
 
-            target_norm = self._normalize_name(current_val)
-            target_base = self._get_basename(current_val)
-            
-            best_match = None
-            
-            # Priority 1: Exact Full Path Match
-            if target_norm in full_name_map:
-                best_match = full_name_map[target_norm]
-            elif current_val.lower() in full_name_map:
-                best_match = full_name_map[current_val.lower()]
-            
-            # Priority 2: Exact Basename Match
-            elif target_base in basename_map:
-                best_match = basename_map[target_base]
-            
-            # Priority 3: Inverted Index Fuzzy Match (Optimization)
-            # This handles small typos or differences
-            # Prepare Target Format for Strict Checking
-            target_fmt = AdvancedTokenizer.get_model_format(current_val)
-            if target_fmt == "other":
-                # Try to infer from usage or assume checkpoint if unclear, but safer to match 'other' loosely
-                if "gguf" in target_base.lower(): target_fmt = "gguf"
-                elif ".safetensors" in current_val or ".ckpt" in current_val: target_fmt = "checkpoint"
-
-            if not best_match:
-                target_tokens = AdvancedTokenizer.tokenize(target_base)
-                candidate_indices = set()
-                for token in target_tokens:
-                    if token in self.inverted_index:
-                        candidate_indices.update(self.inverted_index[token])
-                
-                best_token_score = 0.0
-                token_candidate_info = None
-
-                if candidate_indices:
-                    for idx in candidate_indices:
-                        candidate_info = self.model_list[idx]
-                        
-                        # [Strict Check] Format Compatibility
-                        cand_fmt = AdvancedTokenizer.get_model_format(candidate_info["filename"])
-                        if target_fmt != "other" and cand_fmt != "other":
-                            if target_fmt != cand_fmt:
-                                continue
-
-                        candidate_base = self._get_basename(candidate_info["filename"])
-                        
-                        score = AdvancedTokenizer.calculate_similarity(target_base, candidate_base)
-                        if score > best_token_score:
-                            best_token_score = score
-                            token_candidate_info = candidate_info
-                    
-                    # Strict threshold for fuzzy
-                    if best_token_score >= 0.6:
-                        best_match = token_candidate_info
-
-            # Priority 4: Variant Match (Cross-Quantization)
-            # e.g., "Qwen...bf16.safetensors" vs "Qwen...fp16.safetensors"
-            # BUT: Strict format check (GGUF != Safetensors)
-            if not best_match:
-                # 提取核心 Token (去除量化、格式后缀)
-                target_core = AdvancedTokenizer.get_core_tokens(target_base)
-                # target_fmt ALREADY DEFINED above
-                
-                if target_core: # 只有存在核心词时才尝试
-                    best_variant_score = 0.0
-                    variant_candidate = None
-                    
-                    variant_indices = set()
-                    for token in target_core:
-                        if token in self.inverted_index:
-                            variant_indices.update(self.inverted_index[token])
-                    
-                    if variant_indices:
-                        for idx in variant_indices:
-                            candidate_info = self.model_list[idx]
-                            candidate_filename = candidate_info["filename"]
-                            
-                            # Strict Format Check
-                            cand_fmt = AdvancedTokenizer.get_model_format(candidate_filename)
-                            # e.g. GGUF can only match GGUF
-                            if target_fmt != "other" and cand_fmt != "other" and target_fmt != cand_fmt:
-                                continue
-                            
-                            candidate_base = self._get_basename(candidate_filename)
-                            
-                            # 提取候选的核心词
-                            candidate_core = AdvancedTokenizer.get_core_tokens(candidate_base)
-                            if not candidate_core: continue
-                            
-                            # 计算核心词 Jaccard 相似度
-                            intersection = len(target_core.intersection(candidate_core))
-                            union = len(target_core.union(candidate_core))
-                            core_score = intersection / union if union > 0 else 0.0
-                            
-                            # 要求极高的核心词重合度
-                            if core_score > best_variant_score:
-                                best_variant_score = core_score
-                                variant_candidate = candidate_info
-                        
-                        # 如果核心词几乎完全一致 (>0.9)，则认为是变体匹配
-                        if best_variant_score >= 0.9:
-                             best_match = variant_candidate
+        # 大批量时分片到多个进程计算 (结果按键合并，与条目顺序和分片方式无关)
+        uncached = [key for key in dict.fromkeys((v, t) for _, v, t in candidates) if not self._is_cached(*key)]
+        context = self._process_pool_context(len(uncached))
+        if context is not None:
+            resolved.update(self._match_in_processes(uncached, deadline, context))
 
-            # Priority 5: Legacy Fuzzy Match (如果 Token 索引也没找到)
-            if not best_match:
-                available_names = list(basename_map.keys())
-                similars = difflib.get_close_matches(target_base, available_names, n=1, cutoff=0.85)
-                if similars:
-                    best_match = basename_map[similars[0]]
+        for item, current_val, model_type in candidates:
+            key = (current_val, model_type)
+            if key not in resolved:
+                if deadline is not None and time.monotonic() >= deadline and not self._is_cached(current_val, model_type):
+                    pending.append({
+                        "id": item["id"],
+                        "node_type": item["node_type"],
+                        "widget_name": item["widget_name"],
+                        "original_value": current_val,
+                    })
+                    continue
+                resolved[key] = self._cached_match_value(current_val, model_type)
+            best_match = resolved[key]
 
             if best_match:
                 if best_match["filename"] != current_val:
@@ -200,4 +755,4 @@ class ModelMatcher:
                         "path": best_match["path"] 
                     })
 
-        return matches
+        return matches, pending
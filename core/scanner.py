@@ -1,8 +1,19 @@
 import os
-import hashlib
 import json
 import time
+import threading
+from collections import deque
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor, Future
 import folder_paths
+try:
+    from .storage import IndexStore
+    from .hashing import FastHasher, DEFAULT_HASH_ALGORITHM, LEGACY_HASH_SCHEME
+    from .headers import inspect_model_header, HEADER_PROBE_VERSION, HEADER_EXTENSIONS, HEADER_FIELDS
+except ImportError:
+    from storage import IndexStore
+    from hashing import FastHasher, DEFAULT_HASH_ALGORITHM, LEGACY_HASH_SCHEME
+    from headers import inspect_model_header, HEADER_PROBE_VERSION, HEADER_EXTENSIONS, HEADER_FIELDS
 
 # 定义要扫描的模型类型 (对应 folder_paths 中的 key)
 MODEL_TYPES = {
@@ -25,214 +36,855 @@ VALID_MODEL_EXTENSIONS = {
     '.gguf', '.onnx', '.pkl', '.sft'
 }
 
-HASH_VERSION = 1  # 索引结构版本，不兼容时升级
+HASH_VERSION = 2  # 索引结构版本，不兼容时升级 (v2: 可插拔哈希方案，记录 hash_scheme)
+
+# 哈希线程池配置 (哈希以 IO 为主，线程数可以高于 CPU 核数)
+HASH_WORKERS = min(32, (os.cpu_count() or 4) * 2)  # 全局线程上限 (由各设备的线程池分摊，每个设备至少 1 个)
+# 单个物理设备的并发上限: NVMe/SSD 可以承受高并发，机械硬盘并发读取只会互相抢磁头
+DEVICE_WORKERS_SSD = 16
+DEVICE_WORKERS_HDD = 2
+DEVICE_WORKERS_DEFAULT = 4  # 无法识别设备类型时 (网络盘、Windows、macOS)
+
+# 增量扫描跳过 mtime 未变化的目录；每隔 DEEP_VERIFY_INTERVAL 秒做一次完整校验 (发现原地修改的文件)
+DEEP_VERIFY_INTERVAL = 24 * 3600
+DIR_MTIME_SLACK = 2.0  # 距今不足该秒数的目录 mtime 不可信 (粗粒度时间戳)
+
+CHANGE_FEED_SIZE = 256  # 保留最近多少代的变更记录，更旧的消费者整体重建
+
+
+def _device_workers(st_dev):
+    """
+    根据 st_dev 推断物理设备类型并返回该设备的并发上限
+    仅 Linux 可通过 /sys/dev/block/<major>:<minor> 判断是否为机械硬盘
+    """
+    try:
+        major, minor = os.major(st_dev), os.minor(st_dev)
+        dev_dir = os.path.realpath(f"/sys/dev/block/{major}:{minor}")
+        # 分区没有 queue 目录，需要回退到所属的整盘设备
+        for candidate in (dev_dir, os.path.dirname(dev_dir)):
+            rotational_file = os.path.join(candidate, "queue", "rotational")
+            if os.path.exists(rotational_file):
+                with open(rotational_file, "r") as f:
+                    is_rotational = f.read().strip() == "1"
+                return DEVICE_WORKERS_HDD if is_rotational else DEVICE_WORKERS_SSD
+    except Exception:
+        pass
+    return DEVICE_WORKERS_DEFAULT
+
+
+class ScanCancelled(Exception):
+    """扫描任务被取消 (索引保持扫描前的状态)"""
+
+
+class IndexSnapshot:
+    """
+    某一代数下全部条目的只读快照
+    扫描/监听器提交时整体替换发布；读取方取得引用后无需加锁，之后的提交不影响已取得的快照
+    """
+    __slots__ = ("generation", "models")
+
+    def __init__(self, generation, models):
+        self.generation = generation
+        self.models = MappingProxyType(models)  # { hash: info }
+
 
 class ModelIndex:
-    def __init__(self):
-        # 索引文件路径 (保存在项目根目录，即 core 的上级目录)
-        self.index_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "model_index.json")
+    def __init__(self, index_file=None, hash_workers=None, hash_algorithm=None, hash_include_mtime=True, hash_sampling="headtail",
+                 deep_verify_interval=DEEP_VERIFY_INTERVAL, load_async=False):
+        # 索引数据库路径 (默认保存在项目根目录，即 core 的上级目录)
+        self.index_file = index_file or os.path.join(os.path.dirname(os.path.dirname(__file__)), "model_index.db")
+        # 旧版 JSON 索引路径，首次启动时自动迁移
+        self.legacy_index_file = os.path.splitext(self.index_file)[0] + ".json"
+        # 哈希线程数，<= 1 时退化为串行
+        self.hash_workers = HASH_WORKERS if hash_workers is None else hash_workers
+        # 快速哈希方案 (算法/是否包含 mtime/采样方式)，变化时下次扫描原地迁移
+        # 条目以快速哈希为键: 不含 mtime 时同一模型的多个副本哈希相同，只能保留一个，因此默认包含 mtime
+        self.hasher = FastHasher(hash_algorithm or DEFAULT_HASH_ALGORITHM, include_mtime=hash_include_mtime, sampling=hash_sampling)
         self.data = {
             "version": HASH_VERSION,
+            "hash_scheme": self.hasher.scheme,
             "last_scan": 0,
+            "last_deep_scan": 0,
             "models": {} # { unique_hash: { path, filename, type, size, mtime } }
         }
-        self.load_index()
+        # 完整校验间隔 (秒)，None/0 表示每次都完整遍历
+        self.deep_verify_interval = deep_verify_interval
+        # 目录状态 { dir_path: { mtime, files, subdirs } }，用于跳过未变化的目录
+        self.dir_state = {}
+        self._saved_dirs = {}
+        self.store = None
+        # 扫描与监听器的增量更新互斥
+        self._lock = threading.RLock()
+        # 上次持久化时的条目快照，用于计算增量
+        self._saved_models = {}
+        # 索引代数: 条目每次变化 +1；变更记录 [(generation, added { hash: info }, removed [hash])]
+        # 匹配器据此增量更新自己的倒排索引
+        self.generation = 0
+        self._changes = deque(maxlen=CHANGE_FEED_SIZE)
+        self._feed_lock = threading.Lock()
+        # 当前发布的快照 (引用赋值是原子的，读取方直接取用)
+        self._snapshot = IndexSnapshot(self.generation, self.data["models"])
+        # 索引加载完成后 set_result；load_async=True 时在后台线程加载，不阻塞 ComfyUI 启动
+        self.ready = Future()
+        if load_async:
+            threading.Thread(target=self._load_and_signal, name="AutoMatchIndexLoad", daemon=True).start()
+        else:
+            self._load_and_signal()
+
+    def _load_and_signal(self):
+        start_time = time.time()
+        try:
+            self.load_index()
+        finally:
+            elapsed = time.time() - start_time
+            print(f"[AutoMatch] Index loaded in {elapsed:.2f}s ({len(self.data['models'])} entries)")
+            self.ready.set_result(elapsed)
+
+    def _set_models(self, models):
+        """
+        替换索引条目、记录变更并发布新快照
+        models 交给索引后不再修改 (条目 dict 同样只整体替换，不原地修改)，快照因此无需复制
+        """
+        with self._feed_lock:
+            old_models = self.data["models"]
+            added = {h: info for h, info in models.items() if old_models.get(h) is not info}
+            removed = [h for h in old_models if h not in models]
+            self.data["models"] = models
+            if added or removed:
+                self.generation += 1
+                self._changes.append((self.generation, added, removed))
+            self._snapshot = IndexSnapshot(self.generation, models)
+
+    def changes_since(self, generation):
+        """
+        返回 generation 之后的变更记录 [(generation, added, removed)]
+        记录已被截断 (或 generation 来自重新加载之前) 时返回 None，调用方应整体重建
+        """
+        with self._feed_lock:
+            if generation == self.generation:
+                return []
+            if generation > self.generation or not self._changes or self._changes[0][0] > generation + 1:
+                return None
+            return [change for change in self._changes if change[0] > generation]
+
+    def wait_ready(self, timeout=None):
+        """阻塞直到索引加载完成 (异步代码中应 await asyncio.wrap_future(index.ready))"""
+        self.ready.result(timeout)
 
     def load_index(self):
-        if os.path.exists(self.index_file):
-            try:
-                with open(self.index_file, "r", encoding="utf-8") as f:
-                    saved_data = json.load(f)
-                    if saved_data.get("version") == HASH_VERSION:
-                        self.data = saved_data
-                    else:
-                        print("[AutoMatch] Index version mismatch, rebuilding...")
-            except Exception as e:
-                print(f"[AutoMatch] Failed to load index: {e}")
+        try:
+            self.store = IndexStore(self.index_file)
+        except Exception as e:
+            print(f"[AutoMatch] Failed to open index database: {e}")
+            return
+
+        try:
+            if self.store.is_empty():
+                self._migrate_legacy_index()
+                return
+
+            version = self.store.get_meta("version")
+            if isinstance(version, int) and version <= HASH_VERSION:
+                self.data["last_scan"] = self.store.get_meta("last_scan", 0)
+                self.data["last_deep_scan"] = self.store.get_meta("last_deep_scan", 0)
+                self._set_models(self.store.load_models())
+                self._saved_models = {h: dict(info) for h, info in self.data["models"].items()}
+                self.dir_state = self.store.load_dirs()
+                self._saved_dirs = dict(self.dir_state)
+                self._load_hash_scheme(version, self.store.get_meta("hash_scheme"))
+            else:
+                print("[AutoMatch] Index version mismatch, rebuilding...")
+                self.store.replace_all({}, meta={"version": HASH_VERSION, "hash_scheme": self.hasher.scheme, "last_scan": 0})
+        except Exception as e:
+            print(f"[AutoMatch] Failed to load index: {e}")
+
+    def _load_hash_scheme(self, version, scheme):
+        """
+        记录已有条目使用的哈希方案；与当前方案不同时，下次扫描对仍存在的文件原地重算哈希
+        (保留条目的其他字段，而不是丢弃整个索引重建)
+        """
+        self.data["version"] = HASH_VERSION
+        # 规范化已保存的方案字符串 (如省略块数的 "blake2b/strided")，避免写法不同引起无谓的迁移
+        self.data["hash_scheme"] = FastHasher.from_scheme(scheme or LEGACY_HASH_SCHEME).scheme
+        if self.data["hash_scheme"] != self.hasher.scheme:
+            print(f"[AutoMatch] Hash scheme changed ({self.data['hash_scheme']} -> {self.hasher.scheme}), "
+                  f"index v{version} will be migrated on next scan")
+
+    def _migrate_legacy_index(self):
+        """将旧版 model_index.json 导入 SQLite，并重命名为 .json.bak"""
+        if not os.path.exists(self.legacy_index_file):
+            return
+        try:
+            with open(self.legacy_index_file, "r", encoding="utf-8") as f:
+                saved_data = json.load(f)
+            version = saved_data.get("version")
+            if isinstance(version, int) and version <= HASH_VERSION:
+                self.data["last_scan"] = saved_data.get("last_scan", 0)
+                self._set_models(saved_data.get("models", {}))
+                self._load_hash_scheme(version, saved_data.get("hash_scheme"))
+                self.save_index()
+                print(f"[AutoMatch] Migrated {len(self.data['models'])} entries from {os.path.basename(self.legacy_index_file)}")
+            else:
+                print("[AutoMatch] Legacy index version mismatch, rebuilding...")
+            os.replace(self.legacy_index_file, self.legacy_index_file + ".bak")
+        except Exception as e:
+            print(f"[AutoMatch] Failed to migrate legacy index: {e}")
 
     def save_index(self):
+        """增量写入: 只提交新增/变化/删除的条目"""
+        if self.store is None:
+            return
         try:
-            with open(self.index_file, "w", encoding="utf-8") as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            models = self.data["models"]
+            upserts = {h: info for h, info in models.items() if self._saved_models.get(h) != info}
+            deletes = [h for h in self._saved_models if h not in models]
+            dirs = self.dir_state
+            dir_upserts = {d: state for d, state in dirs.items() if self._saved_dirs.get(d) != state}
+            dir_deletes = [d for d in self._saved_dirs if d not in dirs]
+            self.store.apply(
+                upserts=upserts,
+                deletes=deletes,
+                meta={
+                    "version": self.data["version"],
+                    "hash_scheme": self.data["hash_scheme"],
+                    "last_scan": self.data["last_scan"],
+                    "last_deep_scan": self.data["last_deep_scan"]
+                },
+                dir_upserts=dir_upserts,
+                dir_deletes=dir_deletes
+            )
+            self._saved_models = {h: dict(info) for h, info in models.items()}
+            self._saved_dirs = dict(dirs)
         except Exception as e:
             print(f"[AutoMatch] Failed to save index: {e}")
 
     def calculate_fast_hash(self, filepath):
         """
-        计算快速哈希：Size + MTime + First 1MB + Last 1MB (MD5)
-        足以区分大部分模型文件，且速度极快
+        计算快速哈希：Size (+ MTime) + 采样块 (头尾 1MB 或跨步多块)
+        算法与采样方式由 self.hasher 决定，足以区分大部分模型文件，且速度极快
         """
         try:
-            stat = os.stat(filepath)
-            file_size = stat.st_size
-            mtime = stat.st_mtime
-            
-            # 基础指纹
-            fingerprint = f"{file_size}-{mtime}"
-            
-            # 读取头尾数据进行哈希 (避免仅靠元数据冲突)
-            md5 = hashlib.md5()
-            md5.update(fingerprint.encode('utf-8'))
-            
-            with open(filepath, 'rb') as f:
-                # Read first 1MB
-                chunk = f.read(1024 * 1024)
-                md5.update(chunk)
-                
-                # Check for last 1MB
-                if file_size > 1024 * 1024:
-                    f.seek(-1024 * 1024, 2)
-                    chunk = f.read(1024 * 1024)
-                    md5.update(chunk)
-            
-            return md5.hexdigest()
+            return self.hasher.hash_file(filepath)
         except Exception as e:
             print(f"[AutoMatch] Hash error {filepath}: {e}")
             return None
 
-    def scan_incremental(self):
+    def _run_per_device(self, func, paths, devices=None):
         """
-        执行增量扫描
+        对每个路径执行 func(path)，返回 { path: result }
+        按物理设备分组，每个设备使用独立的有界线程池 (并发上限取决于设备类型)
+        各设备线程数之和不超过 hash_workers (设备数更多时每个设备仍保留 1 个线程)
+        devices: 可选的 { path: st_dev }，缺失时自动 stat
         """
-        start_time = time.time()
-        print("[AutoMatch] Starting incremental scan...")
-        
-        current_models_on_disk = set()
-        new_or_updated_count = 0
-        
-        # 1. 扫描磁盘
-        for type_key, folder_key in MODEL_TYPES.items():
-            # 获取该类型下的所有文件名 (folder_paths.get_filename_list 返回的是相对路径 list)
+        results = {}
+        if not paths:
+            return results
+
+        if self.hash_workers <= 1 or len(paths) == 1:
+            for path in paths:
+                results[path] = func(path)
+            return results
+
+        # 按设备分组
+        groups = {}
+        for path in paths:
+            st_dev = devices.get(path) if devices else None
+            if st_dev is None:
+                try:
+                    st_dev = os.stat(path).st_dev
+                except OSError:
+                    st_dev = 0
+            groups.setdefault(st_dev, []).append(path)
+
+        allocation = self._split_workers(
+            self.hash_workers, {st_dev: min(_device_workers(st_dev), len(group)) for st_dev, group in groups.items()}
+        )
+
+        executors = []
+        futures = {}
+        try:
+            for st_dev, group in groups.items():
+                workers = allocation[st_dev]
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="AutoMatchHash")
+                executors.append(executor)
+                for path in group:
+                    futures[path] = executor.submit(func, path)
+
+            for path, future in futures.items():
+                results[path] = future.result()
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True)
+
+        return results
+
+    @staticmethod
+    def _split_workers(total, limits):
+        """
+        把 total 个线程分给各设备: 每个设备先分 1 个，其余轮流分配，不超过设备自身上限
+        limits: { st_dev: 上限 }，返回 { st_dev: 线程数 }
+        """
+        allocation = {st_dev: 1 for st_dev in limits}
+        budget = total - len(limits)
+        while budget > 0:
+            grew = False
+            for st_dev, limit in limits.items():
+                if budget > 0 and allocation[st_dev] < limit:
+                    allocation[st_dev] += 1
+                    budget -= 1
+                    grew = True
+            if not grew:
+                break
+        return allocation
+
+    def _hash_files(self, paths, devices=None, progress=None):
+        """
+        批量计算快速哈希，返回 { path: hash }
+        progress: 可选的进度对象 (check_cancelled / add_hashed)
+        """
+        if progress is None:
+            return self._run_per_device(self.calculate_fast_hash, paths, devices)
+
+        def hash_one(path):
+            progress.check_cancelled()
+            file_hash = self.calculate_fast_hash(path)
+            try:
+                progress.add_hashed(self.hasher.sample_size(os.path.getsize(path)))
+            except OSError:
+                progress.add_hashed(0)
+            return file_hash
+
+        return self._run_per_device(hash_one, paths, devices)
+
+    @staticmethod
+    def _probe_header(path):
+        """读取模型文件头部元数据 (架构/精度)，失败时返回空 dict"""
+        try:
+            return inspect_model_header(path)
+        except Exception as e:
+            print(f"[AutoMatch] Header read error {path}: {e}")
+            return {}
+
+    def _attach_header_metadata(self, models):
+        """
+        为尚未解析过头部的条目补充元数据 (只读文件头，不读张量数据)
+        models: { hash: info }，原地替换为新的条目 dict
+        """
+        targets = {
+            h: info for h, info in models.items()
+            if info.get("probe") != HEADER_PROBE_VERSION
+            and os.path.splitext(info["path"])[1].lower() in HEADER_EXTENSIONS
+        }
+        if not targets:
+            return 0
+        headers = self._run_per_device(
+            self._probe_header,
+            [info["path"] for info in targets.values()],
+            {info["path"]: info.get("dev") for info in targets.values()}
+        )
+        for file_hash, info in targets.items():
+            entry = {k: v for k, v in info.items() if k not in HEADER_FIELDS}
+            entry.update(headers.get(info["path"]) or {})
+            entry["probe"] = HEADER_PROBE_VERSION
+            models[file_hash] = entry
+        return len(targets)
+
+    @staticmethod
+    def _walk_model_dir(root, dir_cache=None, dir_state=None, known_files=None):
+        """
+        使用 os.scandir 单次遍历目录树
+        直接复用 DirEntry 的 stat 缓存，并在遍历时按扩展名过滤
+        dir_cache: 上次扫描记录的目录状态 { dir_path: { mtime, files, subdirs } }
+                   目录 mtime 未变时不重新列举，文件元数据直接取自 known_files (索引条目)
+        dir_state: 输出本次扫描的目录状态
+        生成: (相对路径, 绝对路径, { size, mtime, dev, ino })
+        """
+        stack = [(root, "")]
+        visited_dirs = set()
+        while stack:
+            dir_path, rel_dir = stack.pop()
             try:
-                # ComfyUI 方法: get_filename_list
-                filenames = folder_paths.get_filename_list(folder_key)
-                if not filenames:
-                    print(f"[AutoMatch] No models found for type: {type_key} (folder: {folder_key})")
+                dir_mtime = os.stat(dir_path).st_mtime
+            except OSError as e:
+                print(f"[AutoMatch] Cannot list {dir_path}: {e}")
+                continue
+
+            cached = dir_cache.get(dir_path) if dir_cache else None
+            if cached and cached["mtime"] == dir_mtime:
+                # 目录本身没有增删改名: 复用上次的文件与子目录列表 (每个目录一次 stat)
+                files, subdirs = cached["files"], cached["subdirs"]
+                prefix = os.path.join(dir_path, "")
+                for name in files:
+                    full_path = prefix + name
+                    info = known_files.get(full_path) if known_files else None
+                    if info is None:
+                        try:
+                            info = ModelIndex._stat_meta(os.stat(full_path))
+                        except OSError:
+                            continue
+                    yield (os.path.join(rel_dir, name) if rel_dir else name), full_path, info
+            else:
+                try:
+                    with os.scandir(dir_path) as it:
+                        entries = sorted(it, key=lambda e: e.name)
+                except OSError as e:
+                    print(f"[AutoMatch] Cannot list {dir_path}: {e}")
                     continue
-                
-                print(f"[AutoMatch] Scanning {len(filenames)} files for {type_key}...")
 
-                for filename in filenames:
-                    # 获取绝对路径
-                    full_path = folder_paths.get_full_path(folder_key, filename)
-                    if not full_path:
+                files, subdirs = [], []
+                for entry in entries:
+                    rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                    try:
+                        if entry.is_dir():
+                            # 跳过隐藏目录 (.git 等)
+                            if entry.name.startswith("."):
+                                continue
+                            subdirs.append((entry.name, entry.is_symlink()))
+                            continue
+
+                        # 过滤非模型文件 (图片、音频、文本等)
+                        _, ext = os.path.splitext(entry.name)
+                        if ext.lower() not in VALID_MODEL_EXTENSIONS:
+                            continue
+
+                        files.append(entry.name)
+                        yield rel_path, entry.path, ModelIndex._stat_meta(entry.stat())
+                    except OSError:
                         continue
-                    
-                    # 记录该路径存在
-                    current_models_on_disk.add(full_path)
-                    
-                    # 检查是否需要更新索引
-                    # 我们使用 full_path 作为 lookup key 来检查是否已索引 (为了快速检测变化)
-                    # 但存储时使用 hash 作为 key
-                    
-                    # 为了高效，我们需要反向查找: Path -> Hash
-                    # 但因为 JSON 结构是 Hash -> Info，我们需要先遍历一遍建立临时映射?
-                    # 为了增量快，我们在内存中维护 Path -> Info 的映射会更好?
-                    # 暂且用简单的遍历查找 (优化点)
-                    # 或者，我们在 data 中存一个 "paths" 辅助字典?
-                    pass 
 
-            except Exception as e:
-                print(f"[AutoMatch] Error creating file list for {type_key}: {e}")
+            next_dirs = []
+            walked_subdirs = []
+            for name, is_symlink in subdirs:
+                sub_path = os.path.join(dir_path, name)
+                # 符号链接目录可能成环，记录真实目录标识
+                if is_symlink:
+                    try:
+                        st = os.stat(sub_path)
+                    except OSError:
+                        continue
+                    dir_id = (st.st_dev, st.st_ino)
+                    if dir_id in visited_dirs:
+                        continue
+                    visited_dirs.add(dir_id)
+                walked_subdirs.append((name, is_symlink))
+                next_dirs.append((sub_path, os.path.join(rel_dir, name) if rel_dir else name))
+
+            if dir_state is not None:
+                # mtime 粒度较粗的文件系统 (FAT/SMB) 上，刚修改过的目录下次仍需重新列举
+                trusted = time.time() - dir_mtime > DIR_MTIME_SLACK
+                dir_state[dir_path] = {"mtime": dir_mtime if trusted else None, "files": files, "subdirs": walked_subdirs}
+
+            # 倒序压栈，保证按字母顺序深度优先遍历
+            stack.extend(reversed(next_dirs))
+
+    def _dirs_unchanged(self):
+        """
+        快速路径: 所有已记录目录的 mtime 都没变，且没有新增/消失的目录
+        此时没有文件被增删或改名，无需逐个文件处理 (每个目录一次 stat)
+        """
+        if not self.dir_state:
+            return False
+        visited = set()
+        stack = [root for _, root in self.get_model_roots()]
+        while stack:
+            dir_path = stack.pop()
+            if dir_path in visited:
                 continue
+            visited.add(dir_path)
+            cached = self.dir_state.get(dir_path)
+            if cached is None or cached["mtime"] is None:
+                return False
+            try:
+                if os.stat(dir_path).st_mtime != cached["mtime"]:
+                    return False
+            except OSError:
+                return False
+            stack.extend(os.path.join(dir_path, name) for name, _ in cached["subdirs"])
+        return visited == set(self.dir_state)
 
-        # 优化: 重构数据结构以支持 Path-Key 查找?
-        # 不，用户要求 "模型位置变动也能感应到"，这意味着 Identity 是 Hash。
-        # 如果 v1.5 从 A 移到 B。
-        # 1. A 消失 -> Scan 发现 A 不在 disk。
-        # 2. B 出现 -> Scan 发现 B 是新文件。
-        # 3. 计算 B 的 Hash -> 发现 Hash 等于原来的 A。
-        # 4. 更新条目: Hash 不变，Path 变了。
-        
-        # 实现逻辑:
-        # A. 构建 disk_files_map: { full_path: { type, filename, mtime, size } }
-        disk_files = {}
+    @staticmethod
+    def _stat_meta(stat):
+        return {"size": stat.st_size, "mtime": stat.st_mtime, "dev": stat.st_dev, "ino": stat.st_ino}
+
+    def get_model_roots(self):
+        """
+        返回所有存在的模型根目录: [(type_key, root)]，顺序与 MODEL_TYPES / folder_paths 一致
+        """
+        roots = []
         for type_key, folder_key in MODEL_TYPES.items():
             try:
-                filenames = folder_paths.get_filename_list(folder_key)
-                if not filenames: continue
-                for filename in filenames:
-                    full_path = folder_paths.get_full_path(folder_key, filename)
-                    if not full_path or not os.path.exists(full_path): continue
-                    
-                    # 过滤非模型文件 (图片、音频、文本等)
-                    _, ext = os.path.splitext(full_path)
-                    if ext.lower() not in VALID_MODEL_EXTENSIONS:
-                        continue
-                    
-                    stat = os.stat(full_path)
-                    disk_files[full_path] = {
-                        "type": type_key,
-                        "filename": filename,
-                        "size": stat.st_size,
-                        "mtime": stat.st_mtime
-                    }
-            except:
-                pass
-
-        # B. 遍历现有索引，标记移除和保持
-        # existing_index: { hash: info }
-        # 我们需要识别:
-        # 1. 路径匹配且 mtime/size 匹配 -> 保持 (Keep)
-        # 2. 路径匹配但 mtime/size 变了 -> 需要重算 Hash (Dirty)
-        # 3. 路径在索引有但在 disk_files 无 -> 可能是移动了或删除了 (Lost)
+                folder_roots = folder_paths.get_folder_paths(folder_key)
+            except Exception as e:
+                print(f"[AutoMatch] Error getting folder paths for {type_key}: {e}")
+                continue
+            for root in folder_roots or []:
+                if os.path.isdir(root):
+                    roots.append((type_key, root))
+        return roots
+
+    def resolve_model_path(self, path, roots=None):
+        """
+        将绝对路径解析为 (type_key, 相对文件名)，不在任何模型根目录下或不是模型文件时返回 None
+        根目录嵌套时取最深的根目录
+        """
+        _, ext = os.path.splitext(path)
+        if ext.lower() not in VALID_MODEL_EXTENSIONS:
+            return None
+        best = None
+        for type_key, root in (roots if roots is not None else self.get_model_roots()):
+            root = os.path.abspath(root)
+            try:
+                if os.path.commonpath([root, os.path.abspath(path)]) != root:
+                    continue
+            except ValueError:
+                # Windows 下不同盘符
+                continue
+            if best is None or len(root) > len(best[1]):
+                best = (type_key, root)
+        if best is None:
+            return None
+        return best[0], os.path.relpath(path, best[1])
+
+    def _collect_disk_files(self, deep_verify=True, dir_state=None, progress=None):
+        """
+        遍历所有 MODEL_TYPES 根目录，返回 { full_path: { type, filename, size, mtime, dev, ino } }
+        同一类型下多个根目录存在同名文件时，与 folder_paths.get_full_path 一致，以先出现的根目录为准
+        deep_verify=False 时跳过 mtime 未变化的目录 (原地修改的文件要等下次深度校验才能发现)
+        dir_state: 输出本次扫描的目录状态
+        progress: 可选的进度对象，每个文件调用一次 add_seen (可在此处取消)
+        """
+        dir_cache, known_files = None, None
+        if not deep_verify:
+            dir_cache = self.dir_state
+            known_files = {info["path"]: info for info in self.data["models"].values()}
+
+        disk_files = {}
+        seen_filenames = {type_key: set() for type_key in MODEL_TYPES}
+        for type_key, root in self.get_model_roots():
+            seen = seen_filenames[type_key]
+            for filename, full_path, meta in self._walk_model_dir(root, dir_cache, dir_state, known_files):
+                if progress is not None:
+                    progress.add_seen()
+                if filename in seen:
+                    continue
+                seen.add(filename)
+                disk_files[full_path] = {
+                    "type": type_key,
+                    "filename": filename,
+                    "size": meta["size"],
+                    "mtime": meta["mtime"],
+                    "dev": meta.get("dev"),
+                    "ino": meta.get("ino")
+                }
+
+        for type_key, seen in seen_filenames.items():
+            if not seen:
+                print(f"[AutoMatch] No models found for type: {type_key} (folder: {MODEL_TYPES[type_key]})")
+        return disk_files
+
+    @staticmethod
+    def _make_entry(path, meta, file_hash, base=None):
+        """
+        构建索引条目；base 为旧条目时保留其附加字段，只刷新路径与文件元数据
+        """
+        entry = dict(base) if base else {}
+        entry.update({
+            "path": path,
+            "filename": meta["filename"],
+            "type": meta["type"],
+            "size": meta["size"],
+            "mtime": meta["mtime"],
+            "hash": file_hash # 冗余存储方便
+        })
+        if meta.get("ino"):
+            entry["dev"] = meta["dev"]
+            entry["ino"] = meta["ino"]
+        return entry
+
+    @staticmethod
+    def _build_identity_map(entries):
+        """
+        文件身份映射: (st_dev, st_ino, size) -> hash
+        同一身份对应多个条目时视为有歧义 (值为 None)，不参与移动检测
+        不支持 inode 的文件系统 (ino 为 0) 不参与
+        """
+        identity_map = {}
+        for info in entries:
+            if not info.get("ino"):
+                continue
+            key = (info.get("dev"), info["ino"], info["size"])
+            identity_map[key] = None if key in identity_map else info["hash"]
+        return identity_map
+
+    @staticmethod
+    def _lookup_identity(identity_map, models, meta):
+        """按 inode 身份查找被移动的条目 (mtime 也必须一致)，找不到或有歧义时返回 None"""
+        if not meta.get("ino"):
+            return None
+        file_hash = identity_map.get((meta.get("dev"), meta["ino"], meta["size"]))
+        old_info = models.get(file_hash) if file_hash else None
+        if old_info and abs(old_info["mtime"] - meta["mtime"]) < 1.0:
+            return file_hash
+        return None
+
+    def scan_incremental(self, deep_verify=None, progress=None):
+        """
+        执行增量扫描
+        deep_verify: True 时不使用目录 mtime 捷径，逐个 stat 所有文件；
+                     None 时按 deep_verify_interval 周期自动决定
+        progress: 可选的进度对象 (set_stage / add_seen / add_hashed / check_cancelled)
+                  取消时抛出 ScanCancelled，索引不做任何修改
+        """
+        self.wait_ready()
+        with self._lock:
+            start_time = time.time()
+            if deep_verify is None:
+                deep_verify = (not self.deep_verify_interval
+                               or start_time - self.data.get("last_deep_scan", 0) >= self.deep_verify_interval)
+            print(f"[AutoMatch] Starting {'deep' if deep_verify else 'incremental'} scan...")
+            if progress is not None:
+                progress.set_stage("walk")
+
+            if not deep_verify and self.data.get("hash_scheme") == self.hasher.scheme and self._dirs_unchanged():
+                self.data["last_scan"] = time.time()
+                if self.store is not None:
+                    self.store.apply(meta={"last_scan": self.data["last_scan"]})
+                elapsed = time.time() - start_time
+                print(f"[AutoMatch] Scan finished in {elapsed:.2f}s. No directory changed, total: {len(self.data['models'])}")
+                return len(self.data["models"])
+        
+            # 如果 v1.5 从 A 移到 B。
+            # 1. A 消失 -> Scan 发现 A 不在 disk。
+            # 2. B 出现 -> Scan 发现 B 是新文件。
+            # 3. 计算 B 的 Hash -> 发现 Hash 等于原来的 A。
+            # 4. 更新条目: Hash 不变，Path 变了。
+        
+            # 1. 扫描磁盘
+            # A. 构建 disk_files_map: { full_path: { type, filename, mtime, size } }
+            dir_state = {}
+            disk_files = self._collect_disk_files(deep_verify, dir_state, progress)
+
+            # B. 遍历现有索引，标记移除和保持
+            # existing_index: { hash: info }
+            # 我们需要识别:
+            # 1. 路径匹配且 mtime/size 匹配 -> 保持 (Keep)
+            # 2. 路径匹配但 mtime/size 变了 -> 需要重算 Hash (Dirty)
+            # 3. 路径在索引有但在 disk_files 无 -> 可能是移动了或删除了 (Lost)
         
-        # 为了处理移动，我们需要 careful。
+            # 为了处理移动，我们需要 careful。
         
-        next_models = {} # 新的 models 字典
+            next_models = {} # 新的 models 字典
         
-        # 建立 path -> hash 的映射以便快速查找
-        path_to_hash = {}
-        for h, info in self.data["models"].items():
-            path_to_hash[info["path"]] = h
-
-        # 处理磁盘文件
-        for path, meta in disk_files.items():
-            file_hash = None
-            
-            # Case 1: 路径在索引中存在
-            if path in path_to_hash:
-                old_hash = path_to_hash[path]
-                old_info = self.data["models"].get(old_hash)
+            # 建立 path -> hash 的映射以便快速查找
+            path_to_hash = {}
+            for h, info in self.data["models"].items():
+                path_to_hash[info["path"]] = h
+
+            # 路径已不在磁盘上的旧条目: 可能被删除，也可能被移动/重命名
+            lost_entries = [info for info in self.data["models"].values() if info["path"] not in disk_files]
+            identity_map = self._build_identity_map(lost_entries)
+
+            # 处理磁盘文件
+            # 第一遍: 找出未变化或仅移动的文件，收集需要重算哈希的路径
+            pending_paths = []
+            reused_hashes = {}
+            moved_hashes = {}
+            for path, meta in disk_files.items():
+                # Case 1: 路径在索引中存在
+                if path in path_to_hash:
+                    old_hash = path_to_hash[path]
+                    old_info = self.data["models"].get(old_hash)
                 
-                # Check consistency
-                if old_info and old_info["size"] == meta["size"] and abs(old_info["mtime"] - meta["mtime"]) < 1.0:
-                    # 完全没变
-                    file_hash = old_hash
+                    # Check consistency
+                    if old_info and old_info["size"] == meta["size"] and abs(old_info["mtime"] - meta["mtime"]) < 1.0:
+                        # 完全没变
+                        reused_hashes[path] = old_hash
+                        continue
+                else:
+                    # Case 2: 新路径，先用 inode 身份判断是否是移动/重命名 (零读取)
+                    moved_hash = self._lookup_identity(identity_map, self.data["models"], meta)
+                    if moved_hash:
+                        moved_hashes[path] = moved_hash
+                        continue
+                # Case 3: 内容变了 (Modified) 或无法确认身份的新文件，需要重算 hash
+                pending_paths.append(path)
+
+            # 哈希方案变化: 原地迁移，仍存在的文件按新方案重算哈希，并保留条目的其他字段
+            migrate_bases = {}
+            if self.data.get("hash_scheme") != self.hasher.scheme:
+                for path, old_hash in list(reused_hashes.items()) + list(moved_hashes.items()):
+                    migrate_bases[path] = self.data["models"][old_hash]
+                    pending_paths.append(path)
+                reused_hashes, moved_hashes = {}, {}
+                print(f"[AutoMatch] Migrating {len(migrate_bases)} entries to hash scheme {self.hasher.scheme}")
+
+            # 第二遍: 线程池并发计算哈希
+            if progress is not None:
+                progress.set_stage("hash", len(pending_paths),
+                                   sum(self.hasher.sample_size(disk_files[p]["size"]) for p in pending_paths))
+            computed_hashes = self._hash_files(pending_paths, {p: disk_files[p]["dev"] for p in pending_paths}, progress)
+            new_or_updated_count = len(pending_paths) - len(migrate_bases)
+
+            # 第三遍: 按磁盘顺序组装新索引 (与串行实现的结果保持一致)
+            for path, meta in disk_files.items():
+                if path in reused_hashes:
+                    file_hash = reused_hashes[path]
+                    old_info = self.data["models"][file_hash]
+                    if meta.get("ino") and (old_info.get("dev"), old_info.get("ino")) != (meta["dev"], meta["ino"]):
+                        # 旧版本条目补充 inode 身份
+                        old_info = self._make_entry(path, meta, file_hash, base=old_info)
                     # 更新 entry (直接复用 old_info)
                     next_models[file_hash] = old_info
                     continue
-                else:
-                    # 变了 (Modified), 重算 hash
-                    file_hash = self.calculate_fast_hash(path)
-                    new_or_updated_count += 1
-            else:
-                # Case 2: 新路径 (New File or Moved File)
-                file_hash = self.calculate_fast_hash(path)
-                new_or_updated_count += 1
-            
-            if file_hash:
-                # 更新/添加到新索引
-                next_models[file_hash] = {
-                    "path": path,
-                    "filename": meta["filename"],
-                    "type": meta["type"],
-                    "size": meta["size"],
-                    "mtime": meta["mtime"],
-                    "hash": file_hash # 冗余存储方便
-                }
 
-        # 3. 替换索引
-        self.data["models"] = next_models
-        self.data["last_scan"] = time.time()
-        self.save_index()
+                if path in moved_hashes:
+                    # 移动/重命名: 仅更新路径元数据，保留哈希
+                    file_hash = moved_hashes[path]
+                    next_models[file_hash] = self._make_entry(path, meta, file_hash, base=self.data["models"][file_hash])
+                    continue
+
+                file_hash = computed_hashes.get(path)
+                if file_hash:
+                    # 更新/添加到新索引
+                    next_models[file_hash] = self._make_entry(path, meta, file_hash, base=migrate_bases.get(path))
+
+            # C. 读取新文件的头部元数据 (架构/精度)，供匹配器直接过滤
+            if progress is not None:
+                progress.set_stage("headers")
+            self._attach_header_metadata(next_models)
+            if progress is not None:
+                # 最后一次取消机会，之后写入索引
+                progress.check_cancelled()
+                progress.set_stage("save")
+
+            # 3. 替换索引
+            self._set_models(next_models)
+            self.data["hash_scheme"] = self.hasher.scheme
+            self.data["last_scan"] = time.time()
+            if deep_verify:
+                self.data["last_deep_scan"] = self.data["last_scan"]
+            self.dir_state = dir_state
+            self.save_index()
         
-        elapsed = time.time() - start_time
-        print(f"[AutoMatch] Scan finished in {elapsed:.2f}s. Total: {len(next_models)}, Updated: {new_or_updated_count}")
-        return len(next_models)
+            elapsed = time.time() - start_time
+            print(f"[AutoMatch] Scan finished in {elapsed:.2f}s. Total: {len(next_models)}, Updated: {new_or_updated_count}, Moved: {len(moved_hashes)}")
+            return len(next_models)
+
+    def apply_changes(self, updated=(), removed=(), moved=()):
+        """
+        将文件系统事件增量应用到索引 (供后台监听器调用)
+        updated: 新增或内容变化的路径 (会校验 size/mtime，必要时重算哈希)
+        removed: 已删除的路径
+        moved: [(old_path, new_path)] 重命名/移动，仅更新元数据
+        返回索引是否发生变化
+        """
+        self.wait_ready()
+        with self._lock:
+            roots = self.get_model_roots()
+            models = dict(self.data["models"])
+            path_to_hash = {info["path"]: h for h, info in models.items()}
+            updated = list(updated)
+            removed = list(removed)
+            moved = list(moved)
+            changed = False
+
+            for old_path, new_path in moved:
+                file_hash = path_to_hash.pop(old_path, None)
+                if file_hash is None:
+                    # 旧路径未被索引 (如 .part 下载完成后重命名)，按新文件处理
+                    updated.append(new_path)
+                    continue
+                changed = True
+                # 覆盖式移动 (os.replace 到已索引的路径): 目标路径上的旧条目已不存在
+                replaced_hash = path_to_hash.pop(new_path, None)
+                if replaced_hash is not None and replaced_hash != file_hash:
+                    models.pop(replaced_hash, None)
+                resolved = self.resolve_model_path(new_path, roots)
+                if not resolved:
+                    # 移出了模型目录
+                    models.pop(file_hash, None)
+                    continue
+                type_key, filename = resolved
+                entry = dict(models[file_hash])
+                # rename 不改变 inode，只需要更新路径元数据
+                entry.update({"path": new_path, "filename": filename, "type": type_key})
+                models[file_hash] = entry
+                path_to_hash[new_path] = file_hash
+
+            removed_entries = []
+            for path in removed:
+                file_hash = path_to_hash.pop(path, None)
+                if file_hash is not None:
+                    removed_entries.append(models.pop(file_hash))
+                    changed = True
+
+            pending = {}
+            for path in updated:
+                resolved = self.resolve_model_path(path, roots)
+                if not resolved:
+                    continue
+                old_hash = path_to_hash.get(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # 事件之后文件又被删除
+                    if old_hash is not None:
+                        removed_entries.append(models.pop(old_hash))
+                        path_to_hash.pop(path, None)
+                        changed = True
+                    continue
+                old_info = models.get(old_hash) if old_hash else None
+                if old_info and old_info["size"] == stat.st_size and abs(old_info["mtime"] - stat.st_mtime) < 1.0:
+                    continue
+                type_key, filename = resolved
+                pending[path] = {
+                    "type": type_key,
+                    "filename": filename,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "dev": stat.st_dev,
+                    "ino": stat.st_ino
+                }
+
+            # 同一批次中 "删除 + 新增" 的同一 inode 视为移动 (轮询模式或跨批次的重命名)
+            identity_map = self._build_identity_map(removed_entries)
+            removed_by_hash = {info["hash"]: info for info in removed_entries}
+            to_hash = []
+            for path, meta in pending.items():
+                if path not in path_to_hash:
+                    moved_hash = self._lookup_identity(identity_map, removed_by_hash, meta)
+                    if moved_hash and moved_hash not in models:
+                        models[moved_hash] = self._make_entry(path, meta, moved_hash, base=removed_by_hash[moved_hash])
+                        path_to_hash[path] = moved_hash
+                        changed = True
+                        continue
+                to_hash.append(path)
+
+            computed_hashes = self._hash_files(to_hash, {p: pending[p]["dev"] for p in to_hash})
+            for path in to_hash:
+                old_hash = path_to_hash.pop(path, None)
+                if old_hash is not None:
+                    models.pop(old_hash, None)
+                file_hash = computed_hashes.get(path)
+                if file_hash:
+                    models[file_hash] = self._make_entry(path, pending[path], file_hash)
+                    path_to_hash[path] = file_hash
+                changed = True
+
+            if changed:
+                self._attach_header_metadata(models)
+                self._set_models(models)
+                self.save_index()
+                print(f"[AutoMatch] Index updated by watcher: +{len(to_hash)} -{len(removed)} ~{len(moved)}")
+            return changed
+
+    def snapshot(self):
+        """返回当前发布的只读快照 (IndexSnapshot)，条目与代数保证一致"""
+        self.wait_ready()
+        return self._snapshot
 
     def get_all_models(self):
-        return self.data["models"].values()
+        return self.snapshot().models.values()
 
 class ModelScanner(ModelIndex):
     pass
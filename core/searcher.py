@@ -4,14 +4,24 @@ import os
 import json
 import re
 import random
-from curl_cffi.requests import AsyncSession
-from parsel import Selector
 
 try:
     from .utils import AdvancedTokenizer
 except ImportError:
     from utils import AdvancedTokenizer
 
+
+# curl_cffi / parsel 导入较慢 (约 250ms)，只在首次发起搜索时加载
+def AsyncSession(*args, **kwargs):
+    from curl_cffi.requests import AsyncSession as _AsyncSession
+    return _AsyncSession(*args, **kwargs)
+
+
+def Selector(*args, **kwargs):
+    from parsel import Selector as _Selector
+    return _Selector(*args, **kwargs)
+
+
 class BaseProvider:
     def __init__(self, config=None):
         self.config = config or {}
@@ -62,6 +72,8 @@ class CivitaiProvider(BaseProvider):
 
                 items = data.get("items", [])
                 original_lower = original_filename.lower()
+                # 查询名只提取一次特征，与每个候选文件比较
+                query = AdvancedTokenizer.prepare(original_lower)
                 
                 for item in items:
                     model_name = item.get("name", "")
@@ -77,13 +89,13 @@ class CivitaiProvider(BaseProvider):
                             
                             # Scoring
                             fname_base = os.path.splitext(fname)[0].lower()
-                            file_score = AdvancedTokenizer.calculate_similarity(original_lower, fname_base)
+                            file_score = AdvancedTokenizer.calculate_similarity_prepared(query, AdvancedTokenizer.prepare(fname_base))
                             
                             # Strict exclusion
                             if file_score <= 0.05: continue
                             
                             combined_name = f"{model_name} {ver_name}"
-                            name_score = AdvancedTokenizer.calculate_similarity(original_lower, combined_name.lower())
+                            name_score = AdvancedTokenizer.calculate_similarity_prepared(query, AdvancedTokenizer.prepare(combined_name.lower()))
                             
                             # Final weighted score
                             final_score = max(file_score, (file_score * 0.7 + name_score * 0.3))
@@ -123,6 +135,7 @@ class HuggingFaceProvider(BaseProvider):
                 except: return []
                 
                 original_lower = original_filename.lower()
+                query = AdvancedTokenizer.prepare(original_lower)
                 
                 for repo in data:
                     model_id = repo.get("modelId", "")
@@ -130,8 +143,8 @@ class HuggingFaceProvider(BaseProvider):
                     
                     repo_name_clean = model_id.split("/")[-1]
                     
-                    score = AdvancedTokenizer.calculate_similarity(original_lower, repo_name_clean.lower())
-                    full_score = AdvancedTokenizer.calculate_similarity(original_lower, model_id.lower().replace("/", " "))
+                    score = AdvancedTokenizer.calculate_similarity_prepared(query, AdvancedTokenizer.prepare(repo_name_clean.lower()))
+                    full_score = AdvancedTokenizer.calculate_similarity_prepared(query, AdvancedTokenizer.prepare(model_id.lower().replace("/", " ")))
                     final_score = max(score, full_score)
                     
                     if final_score > 0.35:
@@ -179,6 +192,7 @@ class ModelScopeProvider(BaseProvider):
                 models = data.get("Data", {}).get("Model", {}).get("Models", [])
                 
                 original_lower = original_filename.lower()
+                query = AdvancedTokenizer.prepare(original_lower)
                 
                 for model in models:
                     org_name = model.get("Path", "")
@@ -188,11 +202,11 @@ class ModelScopeProvider(BaseProvider):
                     full_path_cleansed = org_name.split("/")[-1] if "/" in org_name else org_name
                     
                     scores = [
-                        AdvancedTokenizer.calculate_similarity(original_lower, model_name.lower()),
-                        AdvancedTokenizer.calculate_similarity(original_lower, full_path_cleansed.lower()),
+                        AdvancedTokenizer.calculate_similarity_prepared(query, AdvancedTokenizer.prepare(model_name.lower())),
+                        AdvancedTokenizer.calculate_similarity_prepared(query, AdvancedTokenizer.prepare(full_path_cleansed.lower())),
                     ]
                     if chinese_name:
-                        scores.append(AdvancedTokenizer.calculate_similarity(original_lower, chinese_name.lower()))
+                        scores.append(AdvancedTokenizer.calculate_similarity_prepared(query, AdvancedTokenizer.prepare(chinese_name.lower())))
                         
                     score = max(scores)
                     
@@ -352,6 +366,7 @@ class LiblibProvider(BaseProvider):
                 links = selector.css('a[href*="/modelinfo/"]::attr(href)').getall()
                 
                 original_lower = original_filename.lower()
+                query = AdvancedTokenizer.prepare(original_lower)
                 seen_urls = set()
                 
                 for link in links[:10]:
@@ -368,7 +383,7 @@ class LiblibProvider(BaseProvider):
                     
                     model_id = link.split("/modelinfo/")[-1].split("/")[0] if "/modelinfo/" in link else "Liblib Model"
                     
-                    score = AdvancedTokenizer.calculate_similarity(original_lower, model_id.lower())
+                    score = AdvancedTokenizer.calculate_similarity_prepared(query, AdvancedTokenizer.prepare(model_id.lower()))
                     
                     if score > 0.3:
                         results.append({
@@ -481,19 +496,31 @@ class DuckDuckGoProvider(BaseProvider):
 class ModelSearcher:
     def __init__(self):
         self.config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config.json")
-        self.config = self.load_config()
         self.search_cache = {}
-        
-        # Provider 优先级：Civitai > HuggingFace > Liblib > ModelScope > Google (兜底)
-        # DuckDuckGo 作为 Google 的备选兜底
-        self.providers = [
-            CivitaiProvider(self.config),
-            HuggingFaceProvider(self.config),
-            LiblibProvider(self.config),
-            ModelScopeProvider(self.config),
-            GoogleOmniProvider(self.config),
-            DuckDuckGoProvider(self.config)
-        ]
+        # 配置与 Provider 在首次使用时才创建 (不在 ComfyUI 启动时读盘)
+        self._config = None
+        self._providers = None
+
+    @property
+    def config(self):
+        if self._config is None:
+            self._config = self.load_config()
+        return self._config
+
+    @property
+    def providers(self):
+        if self._providers is None:
+            # Provider 优先级：Civitai > HuggingFace > Liblib > ModelScope > Google (兜底)
+            # DuckDuckGo 作为 Google 的备选兜底
+            self._providers = [
+                CivitaiProvider(self.config),
+                HuggingFaceProvider(self.config),
+                LiblibProvider(self.config),
+                ModelScopeProvider(self.config),
+                GoogleOmniProvider(self.config),
+                DuckDuckGoProvider(self.config)
+            ]
+        return self._providers
 
     def load_config(self):
         if os.path.exists(self.config_path):
@@ -0,0 +1,190 @@
+import os
+import json
+import sqlite3
+import threading
+
+# models 表的固定列，其余字段统一序列化到 extra (JSON)，新增字段无需改表结构
+CORE_COLUMNS = ("hash", "path", "filename", "type", "size", "mtime")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS models (
+    hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    type TEXT,
+    size INTEGER,
+    mtime REAL,
+    basename TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    files TEXT,
+    subdirs TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_models_path ON models(path);
+CREATE INDEX IF NOT EXISTS idx_models_type ON models(type);
+CREATE INDEX IF NOT EXISTS idx_models_basename ON models(basename);
+"""
+
+
+def _basename(filename):
+    """纯文件名 (不含目录，不含扩展名，小写)，与 ModelMatcher._get_basename 一致"""
+    name = os.path.basename(filename.replace("\\", "/"))
+    base, _ = os.path.splitext(name)
+    return base.lower().strip()
+
+
+class IndexStore:
+    """
+    SQLite 模型索引存储
+    - WAL 模式: 扫描写入时不阻塞读取
+    - 按行增量更新，避免每次整体重写
+    - path / hash / type / basename 均有索引
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        conn = self._conn()
+        with self._write_lock:
+            conn.executescript(SCHEMA)
+            conn.commit()
+
+    def _conn(self):
+        # 每个线程独立连接，WAL 下读写互不阻塞
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_row(info):
+        extra = {k: v for k, v in info.items() if k not in CORE_COLUMNS}
+        return (
+            info["hash"], info["path"], info["filename"], info.get("type"),
+            info.get("size"), info.get("mtime"), _basename(info["filename"]),
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+
+    @staticmethod
+    def _from_row(row):
+        info = {
+            "path": row["path"],
+            "filename": row["filename"],
+            "type": row["type"],
+            "size": row["size"],
+            "mtime": row["mtime"],
+            "hash": row["hash"],
+        }
+        if row["extra"]:
+            info.update(json.loads(row["extra"]))
+        return info
+
+    def is_empty(self):
+        row = self._conn().execute("SELECT 1 FROM models LIMIT 1").fetchone()
+        return row is None and self.get_meta("version") is None
+
+    def get_meta(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row["value"]) if row else default
+
+    def load_models(self):
+        """读取全部条目: { hash: info }"""
+        rows = self._conn().execute("SELECT * FROM models ORDER BY rowid").fetchall()
+        return {row["hash"]: self._from_row(row) for row in rows}
+
+    def load_dirs(self):
+        """读取目录状态: { dir_path: { mtime, files, subdirs } }"""
+        rows = self._conn().execute("SELECT * FROM dirs").fetchall()
+        return {
+            row["path"]: {
+                "mtime": row["mtime"],
+                "files": json.loads(row["files"]),
+                "subdirs": [tuple(d) for d in json.loads(row["subdirs"])],
+            }
+            for row in rows
+        }
+
+    def apply(self, upserts=None, deletes=None, meta=None, dir_upserts=None, dir_deletes=None):
+        """
+        单事务增量写入
+        upserts: { hash: info } 新增或变更的条目
+        deletes: 需要删除的 hash 集合
+        meta: { key: value } 元数据
+        dir_upserts / dir_deletes: 目录状态 (增量扫描时跳过未变化的目录)
+        """
+        conn = self._conn()
+        with self._write_lock:
+            try:
+                if deletes:
+                    conn.executemany("DELETE FROM models WHERE hash = ?", [(h,) for h in deletes])
+                if upserts:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO models (hash, path, filename, type, size, mtime, basename, extra) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [self._to_row(info) for info in upserts.values()],
+                    )
+                if meta:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                        [(k, json.dumps(v)) for k, v in meta.items()],
+                    )
+                if dir_deletes:
+                    conn.executemany("DELETE FROM dirs WHERE path = ?", [(d,) for d in dir_deletes])
+                if dir_upserts:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO dirs (path, mtime, files, subdirs) VALUES (?, ?, ?, ?)",
+                        [
+                            (path, state["mtime"], json.dumps(state["files"], ensure_ascii=False),
+                             json.dumps(state["subdirs"], ensure_ascii=False))
+                            for path, state in dir_upserts.items()
+                        ],
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def replace_all(self, models, meta=None):
+        """清空后整体写入 (用于迁移或版本重建)"""
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute("DELETE FROM models")
+            conn.execute("DELETE FROM dirs")
+            conn.commit()
+        self.apply(upserts=models, meta=meta)
+
+    # === 索引查询 ===
+
+    def find_by_hash(self, file_hash):
+        row = self._conn().execute("SELECT * FROM models WHERE hash = ?", (file_hash,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def find_by_path(self, path):
+        row = self._conn().execute("SELECT * FROM models WHERE path = ?", (path,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def find_by_type(self, model_type):
+        rows = self._conn().execute("SELECT * FROM models WHERE type = ?", (model_type,)).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def find_by_basename(self, name):
+        rows = self._conn().execute("SELECT * FROM models WHERE basename = ?", (_basename(name),)).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -1,9 +1,8 @@
 import re
 import os
+from functools import lru_cache
 
-# 尝试导入 rapidfuzz (高性能模糊匹配库)
-from rapidfuzz import fuzz as rf_fuzz
-from rapidfuzz import process as rf_process
+# rapidfuzz (高性能模糊匹配库) 在首次计算相似度时才导入，不拖慢 ComfyUI 启动
 USE_RAPIDFUZZ = True
 
 # 噪声后缀词（仅过滤纯技术后缀，不过滤版本号和模型组件名）
@@ -194,6 +193,64 @@ CRITICAL_TERMS = {
     'depth', 'canny', 'openpose', 'softedge', 'scribble', 'hed', 'mlsd', 'normalbae', 'seg', 'lineart',
 }
 
+# 特殊精度 (bf16, fp8, int8) 必须严格匹配 (fp16/fp32 较为通用，文件名常省略，故不做单侧强制)
+STRICT_PRECISIONS = {'bf16', 'fp8', 'int8', 'int4', 'q8'}
+
+# ============================================================
+# 分词流水线: 预编译正则与冻结词表 (模块加载时构建一次)
+# ============================================================
+_CJK_THEN_ASCII_RE = re.compile(r'([\u4e00-\u9fff])([a-zA-Z0-9])')
+_ASCII_THEN_CJK_RE = re.compile(r'([a-zA-Z0-9])([\u4e00-\u9fff])')
+_FLUX_SHORT_RE = re.compile(r'\bf[\.\-_\s]?1\b')
+# 分隔符统一替换为空格
+_DELIMITER_TABLE = str.maketrans({char: ' ' for char in ['_', '-', '.', ' ', '/', '\\', '[', ']', '(', ')']})
+_SUB_TOKEN_RE = re.compile(r'[a-z]+|\d+|[^\x00-\x7f]+')
+
+# _strip_variant_terms: 需要移除的技术术语
+VARIANT_REMOVE_TERMS = frozenset({
+    # 量化标记
+    'q4', 'q5', 'q6', 'q8', 'q3', 'bf16', 'fp16', 'fp32', 'fp8', 'int8', 'int4',
+    'q4_0', 'q4_1', 'q5_0', 'q5_1', 'q8_0', 'q4_k', 'q4_k_m', 'q4_k_s', 'q5_k_m', 'q5_k_s', 'q6_k',
+    # 单字母量化后缀（量化标记残留，如 Q4_K_S 分解后的 k、s）
+    'k', 'm', 's', 'l',
+    # 格式后缀
+    'gguf', 'safetensors', 'ckpt', 'pt', 'bin', 'pth', 'onnx', 'pkl',
+    # GGUF 特殊精度
+    'f16', 'f32',
+    # 训练变体
+    'pruned', 'ema', 'emaonly', 'noema', 'noembed', 'full',
+    # 发布标记
+    'fix', 'fixed', 'final', 'official', 'release',
+    # 内容分级
+    'sfw', 'nsfw',
+    # 速度变体
+    'lightning', 'turbo', 'hyper', 'lcm', 'simpo', '8steps', '4steps', '2steps',
+})
+# _strip_variant_terms: 保护的关键词（不管在哪里都保留）
+VARIANT_PROTECTED_TERMS = frozenset(PROTECTED_TERMS | {
+    # 扩展保护词（确保这些永不被移除）
+    'dev', 'schnell', 'base', 'refiner', 'instruct', 'chat', 'vl', 'vision',
+    '1', '2', '3', '5', '7', '8', '13', '70',  # 常见模型版本号
+})
+MODEL_EXTENSIONS = frozenset({'.gguf', '.safetensors', '.ckpt', '.pt', '.bin', '.pth', '.onnx', '.pkl'})
+_VARIANT_SPLIT_RE = re.compile(r'[\-_.]+')
+_QUANT_PART_RE = re.compile(r'^(?:q|iq|sq|tq)\d+[a-z0-9_]*$')
+_PRECISION_PART_RE = re.compile(r'^(?:bf|fp|f|int)\d+$')
+_WHITESPACE_RE = re.compile(r'\s+')
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+_ASCII_TOKEN_RE = re.compile(r'^[a-zA-Z0-9]+$')
+
+# detect_base_model / detect_quantization
+_FLUX_PREFIX_RE = re.compile(r'\bfl\d?[\-_]')
+_SD3_RE = re.compile(r'sd3[\._]?5|sd3')
+_SDXL_RE = re.compile(r'(?:[\W_]|^)xl(?:[\W_]|$)|sdxl|base_1\.0|refiner|supir')
+_SD15_RE = re.compile(r'v1[\-._]?5|sd15|1\.5|dreamshaper|realistic_vision')
+_SD21_RE = re.compile(r'v2[\-._]?1|sd21|2\.1')
+_GGUF_QUANT_RE = re.compile(r'(?:[\W_]|^)((?:q|iq|sq|tq)\d+[a-z0-9_]*)(?:[\W_]|$)')
+
+# 分词结果缓存 (LRU) 的容量: 同一批文件名在一次匹配中会被反复分词
+TOKENIZER_CACHE_SIZE = 16384
+
 class AdvancedTokenizer:
     """
     统一的智能分词器，用于本地匹配和网络搜索
@@ -202,6 +259,7 @@ class AdvancedTokenizer:
 
 
     @staticmethod
+    @lru_cache(maxsize=TOKENIZER_CACHE_SIZE)
     def _normalize_text(text):
         """
         统一的文本预处理/归一化逻辑
@@ -209,25 +267,28 @@ class AdvancedTokenizer:
         text = text.lower()
         
         # 1. CJK Segmentation
-        text = re.sub(r'([\u4e00-\u9fff])([a-zA-Z0-9])', r'\1 \2', text)
-        text = re.sub(r'([a-zA-Z0-9])([\u4e00-\u9fff])', r'\1 \2', text)
+        text = _CJK_THEN_ASCII_RE.sub(r'\1 \2', text)
+        text = _ASCII_THEN_CJK_RE.sub(r'\1 \2', text)
         
         # 2. Global Normalization (F.1 -> Flux 1)
         text = text.replace("f.1", "flux 1")
         text = text.replace("f 1", "flux 1")
-        text = re.sub(r'\bf[\.\-_\s]?1\b', 'flux 1', text)
+        text = _FLUX_SHORT_RE.sub('flux 1', text)
         
         # 3. Replace delimiters
-        for char in ['_', '-', '.', ' ', '/', '\\', '[', ']', '(', ')']:
-            text = text.replace(char, ' ')
-            
-        return text
+        return text.translate(_DELIMITER_TABLE)
 
     @staticmethod
     def tokenize(text):
         """
         将文本拆分为 token 集合 (支持数字分离: flux1 -> flux 1)
         """
+        # 缓存中保存不可变的 tuple，每次返回新的列表
+        return list(AdvancedTokenizer._tokenize_cached(text))
+
+    @staticmethod
+    @lru_cache(maxsize=TOKENIZER_CACHE_SIZE)
+    def _tokenize_cached(text):
         # 使用统一预处理
         text = AdvancedTokenizer._normalize_text(text)
 
@@ -245,7 +306,7 @@ class AdvancedTokenizer:
             # [a-z]+ matches English words
             # \d+ matches numbers
             # [^\x00-\x7f]+ matches non-ASCII (Chinese, etc.)
-            sub_tokens = re.findall(r'[a-z]+|\d+|[^\x00-\x7f]+', part)
+            sub_tokens = _SUB_TOKEN_RE.findall(part)
             if sub_tokens:
                 tokens.extend(sub_tokens)
             else:
@@ -259,7 +320,7 @@ class AdvancedTokenizer:
             if s and s not in seen:
                 seen.add(s)
                 ordered_tokens.append(s)
-        return ordered_tokens
+        return tuple(ordered_tokens)
 
     @staticmethod
     def lookup_popular_model(filename):
@@ -294,94 +355,55 @@ class AdvancedTokenizer:
         return (None, None)
 
     @staticmethod
+    @lru_cache(maxsize=TOKENIZER_CACHE_SIZE)
     def _strip_variant_terms(text):
         """
         使用 Regex 移除文件名中的技术/变体术语
         返回清洗后的字符串 (保留原有的非技术分隔符)
         
-        保护关键词：dev, schnell, base, refiner, instruct 等
-        移除：量化标记(Q4_K_M, bf16等)、格式后缀(gguf, safetensors等)、速度变体(lightning等)
+        保护关键词：dev, schnell, base, refiner, instruct 等 (VARIANT_PROTECTED_TERMS)
+        移除：量化标记(Q4_K_M, bf16等)、格式后缀(gguf, safetensors等)、速度变体(lightning等) (VARIANT_REMOVE_TERMS)
         """
         text = text.lower()
         
         # 只移除真正的模型文件扩展名
-        valid_extensions = {'.gguf', '.safetensors', '.ckpt', '.pt', '.bin', '.pth', '.onnx', '.pkl'}
         base, ext = os.path.splitext(text)
-        if ext not in valid_extensions:
+        if ext not in MODEL_EXTENSIONS:
             # 不是有效的模型扩展名，保留原始文本
             base = text
         
-        # 需要移除的技术术语集合
-        remove_terms = {
-            # 量化标记
-            'q4', 'q5', 'q6', 'q8', 'q3', 'bf16', 'fp16', 'fp32', 'fp8', 'int8', 'int4',
-            'q4_0', 'q4_1', 'q5_0', 'q5_1', 'q8_0', 'q4_k', 'q4_k_m', 'q4_k_s', 'q5_k_m', 'q5_k_s', 'q6_k',
-            # 单字母量化后缀（量化标记残留，如 Q4_K_S 分解后的 k、s）
-            'k', 'm', 's', 'l',
-            # 格式后缀
-            'gguf', 'safetensors', 'ckpt', 'pt', 'bin', 'pth', 'onnx', 'pkl',
-            # GGUF 特殊精度
-            'f16', 'f32',
-            # 训练变体
-            'pruned', 'ema', 'emaonly', 'noema', 'noembed', 'full',
-            # 发布标记
-            'fix', 'fixed', 'final', 'official', 'release',
-            # 内容分级
-            'sfw', 'nsfw',
-            # 速度变体
-            'lightning', 'turbo', 'hyper', 'lcm', 'simpo', '8steps', '4steps', '2steps',
-        }
-        
-        # 保护的关键词（不管在哪里都保留）
-        protected = PROTECTED_TERMS | {
-            # 扩展保护词（确保这些永不被移除）
-            'dev', 'schnell', 'base', 'refiner', 'instruct', 'chat', 'vl', 'vision',
-            '1', '2', '3', '5', '7', '8', '13', '70',  # 常见模型版本号
-        }
-        
         # 分词
-        parts = re.split(r'[\-_.]+', base)
         filtered = []
-        
-        i = 0
-        while i < len(parts):
-            part = parts[i]
-            
+        for part in _VARIANT_SPLIT_RE.split(base):
             # 跳过空串
             if not part:
-                i += 1
                 continue
             
             # 检查是否是保护词
-            if part in protected:
+            if part in VARIANT_PROTECTED_TERMS:
                 filtered.append(part)
-                i += 1
                 continue
             
             # 检查是否是需要移除的技术术语
-            if part in remove_terms:
-                i += 1
+            if part in VARIANT_REMOVE_TERMS:
                 continue
             
             # 检查是否是复杂量化标记 (q/iq/sq + 数字 + 可选后缀)
             # 例如 q4, q4_k, iq2_xxs, sq1 等复杂模式
-            if re.match(r'^(?:q|iq|sq|tq)\d+[a-z0-9_]*$', part):
-                i += 1
+            if _QUANT_PART_RE.match(part):
                 continue
             
             # 检查是否是精度标记 (f16, fp16, bf16, etc.)
-            if re.match(r'^(?:bf|fp|f|int)\d+$', part):
-                i += 1
+            if _PRECISION_PART_RE.match(part):
                 continue
             
             # 保留其他词
             filtered.append(part)
-            i += 1
         
         # 重新组合
         cleaned = ' '.join(filtered)
         # 清理多余空格
-        cleaned = re.sub(r'\s+', ' ', cleaned)
+        cleaned = _WHITESPACE_RE.sub(' ', cleaned)
         return cleaned.strip()
 
     @staticmethod
@@ -389,10 +411,14 @@ class AdvancedTokenizer:
         """
         提取核心 Token 集合
         """
+        # 缓存中保存 frozenset，每次返回新的 set (兼容 set 接口，调用方可以修改)
+        return set(AdvancedTokenizer._core_tokens_cached(text))
+
+    @staticmethod
+    @lru_cache(maxsize=TOKENIZER_CACHE_SIZE)
+    def _core_tokens_cached(text):
         cleaned = AdvancedTokenizer._strip_variant_terms(text)
-        # tokenize 返回列表，get_core_tokens 通常期望返回集合用于比较，但列表也可
-        # 为了兼容 set 接口，这里转为 set
-        return set(AdvancedTokenizer.tokenize(cleaned))
+        return frozenset(AdvancedTokenizer._tokenize_cached(cleaned))
 
     @staticmethod
     def get_model_format(filename):
@@ -590,6 +616,7 @@ class AdvancedTokenizer:
         return unique_terms[:5]
 
     @staticmethod
+    @lru_cache(maxsize=TOKENIZER_CACHE_SIZE)
     def detect_base_model(filename):
         """
         语义识别: 检测基座模型架构
@@ -603,11 +630,11 @@ class AdvancedTokenizer:
             
         # 2. Flux
         # 匹配 flux, flux1, fl_ (common prefix), awportraitfl, f.1 (e.g. F.1 奶油风)
-        if "flux" in lower or re.search(r'\bfl\d?[\-_]', lower) or "awportraitfl" in lower or "f.1" in lower:
+        if "flux" in lower or _FLUX_PREFIX_RE.search(lower) or "awportraitfl" in lower or "f.1" in lower:
             return "flux"
         
         # 3. SD3 (SD3.5, SD3)
-        if re.search(r'sd3[\._]?5|sd3', lower):
+        if _SD3_RE.search(lower):
             return "sd3"
 
         # 4. SDXL
@@ -616,7 +643,7 @@ class AdvancedTokenizer:
         # (?:[\W_]|^)xl -> start of word xl
         # xl(?:[\W_]|$) -> end of word xl
         # AND capture 'ends with xl' logic via .*xl(\.safetensors)?
-        if re.search(r'(?:[\W_]|^)xl(?:[\W_]|$)|sdxl|base_1\.0|refiner|supir', lower):
+        if _SDXL_RE.search(lower):
             return "sdxl"
         # Case: juggernautXL (no separator). Explicit check or heuristic?
         # If 'xl' is at the end of the name part (before ext)
@@ -625,9 +652,9 @@ class AdvancedTokenizer:
             return "sdxl"
             
         # 5. SD1.5 / SD2.1
-        if re.search(r'v1[\-._]?5|sd15|1\.5|dreamshaper|realistic_vision', lower):
+        if _SD15_RE.search(lower):
             return "sd15"
-        if re.search(r'v2[\-._]?1|sd21|2\.1', lower):
+        if _SD21_RE.search(lower):
             return "sd21"
             
         # 6. New Gen (Hunyuan, AuraFlow, Kwai/LTX)
@@ -643,6 +670,7 @@ class AdvancedTokenizer:
         return "unknown"
 
     @staticmethod
+    @lru_cache(maxsize=TOKENIZER_CACHE_SIZE)
     def detect_quantization(filename):
         """
         检测模型量化/精度版本
@@ -655,7 +683,7 @@ class AdvancedTokenizer:
         # iq1_s, iq2_xxs, sq...
         # match full pattern (q|iq|sq|tq)\d+[a-z0-9_]*
         # Allow separators: - _ .
-        gguf_match = re.search(r'(?:[\W_]|^)((?:q|iq|sq|tq)\d+[a-z0-9_]*)(?:[\W_]|$)', lower)
+        gguf_match = _GGUF_QUANT_RE.search(lower)
         if gguf_match:
             return gguf_match.group(1)
             
@@ -731,88 +759,114 @@ class AdvancedTokenizer:
         return None, None
 
 
+    # 带 LRU 缓存的分词步骤 (名称 -> lru_cache 包装的函数)
+    CACHED_STEPS = ("_normalize_text", "_tokenize_cached", "_strip_variant_terms", "_core_tokens_cached",
+                    "detect_base_model", "detect_quantization", "prepare")
+
     @staticmethod
-    def _check_flux_compatibility(name_a, name_b):
-        """
-        验证 Flux 模型兼容性
-        Dev 与 Schnell 互斥
-        """
-        a = name_a.lower()
-        b = name_b.lower()
-        
-        is_dev_a = "dev" in a
-        is_schnell_a = "schnell" in a
-        
-        is_dev_b = "dev" in b
-        is_schnell_b = "schnell" in b
-        
-        # 如果两边都明确指定了类型，必须一致
-        if (is_dev_a or is_schnell_a) and (is_dev_b or is_schnell_b):
-            if is_dev_a and not is_dev_b: return False
-            if is_schnell_a and not is_schnell_b: return False
-            
-        return True
+    def cache_stats():
+        """各分词步骤缓存的命中统计 { 名称: { hits, misses, size, maxsize, hit_rate } }"""
+        stats = {}
+        for name in AdvancedTokenizer.CACHED_STEPS:
+            info = getattr(AdvancedTokenizer, name).cache_info()
+            total = info.hits + info.misses
+            stats[name] = {
+                "hits": info.hits,
+                "misses": info.misses,
+                "size": info.currsize,
+                "maxsize": info.maxsize,
+                "hit_rate": info.hits / total if total else 0.0,
+            }
+        return stats
 
     @staticmethod
-    def _check_sdxl_compatibility(name_a, name_b):
+    def cache_clear():
+        for name in AdvancedTokenizer.CACHED_STEPS:
+            getattr(AdvancedTokenizer, name).cache_clear()
+
+    @staticmethod
+    def sequence_text(name):
+        """calculate_similarity 中序列相似度使用的文本 (去除仓库前缀后归一化)"""
+        processed = name.rsplit("/", 1)[-1] if "/" in name else name
+        norm = AdvancedTokenizer._normalize_text(processed)
+        return norm if norm.strip() else processed.lower()
+
+    @staticmethod
+    def batch_sequence_ratios(query_text, choice_texts):
         """
-        验证 SDXL 模型兼容性
-        Base 与 Refiner 互斥
+        批量计算 calculate_similarity 的序列相似度分量: max(ratio, token_set_ratio) / 100
+        一次调用完成一个查询对全部候选的打分 (rapidfuzz 在 C++ 中循环)
+        有 numpy 时使用 process.cdist(workers=-1) 多线程计算，否则退化为 process.extract
         """
-        a = name_a.lower()
-        b = name_b.lower()
-        
-        is_base_a = "base" in a
-        is_refiner_a = "refiner" in a
-        
-        is_base_b = "base" in b
-        is_refiner_b = "refiner" in b
-        
-        if (is_base_a or is_refiner_a) and (is_base_b or is_refiner_b):
-            if is_base_a and not is_base_b: return False
-            if is_refiner_a and not is_refiner_b: return False
-            
-        return True
+        if not choice_texts:
+            return []
+        from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+        try:
+            ratio = rf_process.cdist([query_text], choice_texts, scorer=rf_fuzz.ratio, workers=-1)[0]
+            token_set = rf_process.cdist([query_text], choice_texts, scorer=rf_fuzz.token_set_ratio, workers=-1)[0]
+            return [max(float(a), float(b)) / 100.0 for a, b in zip(ratio, token_set)]
+        except ImportError:
+            # cdist 依赖 numpy
+            scores = [0.0] * len(choice_texts)
+            for scorer in (rf_fuzz.ratio, rf_fuzz.token_set_ratio):
+                for _, score, idx in rf_process.extract(query_text, choice_texts, scorer=scorer, limit=None):
+                    scores[idx] = max(scores[idx], score)
+            return [score / 100.0 for score in scores]
+
+    @staticmethod
+    @lru_cache(maxsize=TOKENIZER_CACHE_SIZE)
+    def prepare(name):
+        """返回 name 的 PreparedName (带缓存；PreparedName 创建后不再修改，可以共享)"""
+        return PreparedName(name)
 
     @staticmethod
-    def calculate_similarity(name_a, name_b):
+    def calculate_similarity(name_a, name_b, seq_ratio=None):
         """
         计算综合相似度 (Smart Rules + Jaccard + RapidFuzz)
+        seq_ratio: 可选，由 batch_sequence_ratios 预先批量计算好的序列相似度分量
+        同一查询与多个候选比较时，可先 prepare 再调用 calculate_similarity_prepared
         """
         if not name_a or not name_b: return 0.0
+        return AdvancedTokenizer.calculate_similarity_prepared(
+            AdvancedTokenizer.prepare(name_a), AdvancedTokenizer.prepare(name_b), seq_ratio=seq_ratio
+        )
+
+    @staticmethod
+    def calculate_similarity_prepared(a, b, seq_ratio=None):
+        """
+        calculate_similarity 的比较部分: a / b 为 PreparedName，只执行比较逻辑，不再重新提取特征
+        """
+        if not a.name or not b.name: return 0.0
         
         # === 0. Semantic Architecture Check (The "Brain" Filter) ===
-        base_a = AdvancedTokenizer.detect_base_model(name_a)
-        base_b = AdvancedTokenizer.detect_base_model(name_b)
+        base_a = a.base_model
+        base_b = b.base_model
         
         if base_a != "unknown" and base_b != "unknown":
             if base_a != base_b:
                 return 0.0
         
         # === 0.1 Strict Flux Compatibility Check ===
+        # Dev 与 Schnell 互斥: 两边都明确指定了类型时必须一致
         if base_a == "flux" and base_b == "flux":
-            if not AdvancedTokenizer._check_flux_compatibility(name_a, name_b):
-                return 0.0
+            if (a.is_dev or a.is_schnell) and (b.is_dev or b.is_schnell):
+                if a.is_dev and not b.is_dev: return 0.0
+                if a.is_schnell and not b.is_schnell: return 0.0
 
         # === 0.2 Strict SDXL Compatibility Check ===
+        # Base 与 Refiner 互斥
         if base_a == "sdxl" and base_b == "sdxl":
-             if not AdvancedTokenizer._check_sdxl_compatibility(name_a, name_b):
-                return 0.0
+            if (a.is_base or a.is_refiner) and (b.is_base or b.is_refiner):
+                if a.is_base and not b.is_base: return 0.0
+                if a.is_refiner and not b.is_refiner: return 0.0
 
         # === 0.5 Quantization/Precision Check (The "Strict" Filter) ===
-        quant_a = AdvancedTokenizer.detect_quantization(name_a)
-        quant_b = AdvancedTokenizer.detect_quantization(name_b)
+        quant_a = a.quant
+        quant_b = b.quant
         
         # 特殊处理 GGUF 仓库级匹配：
-        name_a_upper = name_a.upper()
-        name_b_upper = name_b.upper()
-        # ... (rest of old code below) ...
-        name_b_upper = name_b.upper()
-        is_gguf_repo_a = (name_a_upper.endswith("-GGUF") or "/GGUF" in name_a_upper) and not quant_a
-        is_gguf_repo_b = (name_b_upper.endswith("-GGUF") or "/GGUF" in name_b_upper) and not quant_b
-        
         # 如果一侧是 GGUF 通配仓库，另一侧有具体量化，则跳过严格量化检测
-        skip_quant_check = (is_gguf_repo_a and quant_b) or (is_gguf_repo_b and quant_a)
+        skip_quant_check = (a.is_gguf_repo and quant_b) or (b.is_gguf_repo and quant_a)
         
         # 只有当两边都有明确量化标记，且不一致时，才判定不兼容
         # e.g. "bf16" vs "fp16" -> Mismatch
@@ -825,7 +879,6 @@ class AdvancedTokenizer:
         # 特殊精度 (bf16, fp8, int8) 必须严格匹配
         # 如果 A 指定了 bf16，而 B 没有指定（或指定了其他的），则不匹配
         # (fp16/fp32 较为通用，文件名常省略，故不做单侧强制)
-        STRICT_PRECISIONS = {'bf16', 'fp8', 'int8', 'int4', 'q8'}
         
         # Case A: Target has strict precision, Candidate missing or different
         if quant_a in STRICT_PRECISIONS:
@@ -841,20 +894,10 @@ class AdvancedTokenizer:
             if quant_a != quant_b:
                 return 0.0
         
-        # === 预处理：移除仓库组织名前缀 ===
-        # HuggingFace 仓库格式通常是 "org/repo-name"，例如 "unsloth/Qwen-Image-Edit-2511-GGUF"
-        # 组织名对相似度匹配是噪声，应当移除
-        processed_a = name_a
-        processed_b = name_b
-        if "/" in name_a:
-            # 只保留仓库名部分 (最后一个 / 之后)
-            processed_a = name_a.rsplit("/", 1)[-1]
-        if "/" in name_b:
-            processed_b = name_b.rsplit("/", 1)[-1]
-        
         # 1. Token Similarity (Jaccard) - 使用全部 token 检测关键词冲突
-        tokens_a = set(AdvancedTokenizer.tokenize(processed_a))
-        tokens_b = set(AdvancedTokenizer.tokenize(processed_b))
+        # (仓库组织名前缀已在 PreparedName 中移除)
+        tokens_a = a.tokens
+        tokens_b = b.tokens
         
         if not tokens_a or not tokens_b: return 0.0
         
@@ -870,8 +913,8 @@ class AdvancedTokenizer:
         
         # 2. 核心 Token Jaccard (移除技术后缀后的匹配)
         # 这对于 GGUF 仓库匹配至关重要：排除 q4, k, s 等噪声
-        core_a = AdvancedTokenizer.get_core_tokens(processed_a)
-        core_b = AdvancedTokenizer.get_core_tokens(processed_b)
+        core_a = a.core
+        core_b = b.core
         
         if not core_a or not core_b:
             # 降级到普通 token 匹配
@@ -886,17 +929,10 @@ class AdvancedTokenizer:
             # --- Chinese Optimization: Partial English Match ---
             # 如果一侧包含中文，计算 "English-Only Jaccard"
             # 假设中文部分只是描述，英文部分是核心 ID
-            has_cn_a = bool(re.search(r'[\u4e00-\u9fff]', processed_a))
-            has_cn_b = bool(re.search(r'[\u4e00-\u9fff]', processed_b))
-            
-            if has_cn_a or has_cn_b:
-                # 提取纯 ASCII token (只包含英文字母和数字)
-                # Helper inline function
-                def get_ascii_tokens(tokens):
-                    return {t for t in tokens if re.match(r'^[a-zA-Z0-9]+$', t)}
-                
-                ascii_a = get_ascii_tokens(core_a)
-                ascii_b = get_ascii_tokens(core_b)
+            if a.has_cn or b.has_cn:
+                # 纯 ASCII 核心 token (只包含英文字母和数字)
+                ascii_a = a.ascii_core
+                ascii_b = b.ascii_core
                 
                 if ascii_a and ascii_b:
                     asc_int = len(ascii_a.intersection(ascii_b))
@@ -942,22 +978,46 @@ class AdvancedTokenizer:
         
         # 3. Sequence Similarity (用于捕捉顺序和部分匹配)
         # 使用 rapidfuzz 加速
-        # 关键修改：使用归一化后的文本进行比较，以匹配 F.1 vs Flux 1
-        norm_a = AdvancedTokenizer._normalize_text(processed_a)
-        norm_b = AdvancedTokenizer._normalize_text(processed_b)
-        
-        # 如果归一化后变成空的（极少见），回退到原始
-        s1 = norm_a if norm_a.strip() else processed_a.lower()
-        s2 = norm_b if norm_b.strip() else processed_b.lower()
-
-        # rapidfuzz.fuzz.ratio 返回 0-100 的分数
-        seq_ratio = rf_fuzz.ratio(s1, s2) / 100.0
-        # 额外使用 token_set_ratio 捕捉词汇重排序匹配
-        token_ratio = rf_fuzz.token_set_ratio(s1, s2) / 100.0
-        seq_ratio = max(seq_ratio, token_ratio)
+        # 关键修改：使用归一化后的文本进行比较，以匹配 F.1 vs Flux 1 (见 sequence_text)
+        if seq_ratio is None:
+            # rapidfuzz.fuzz.ratio 返回 0-100 的分数
+            from rapidfuzz import fuzz as rf_fuzz
+            seq_ratio = rf_fuzz.ratio(a.seq_text, b.seq_text) / 100.0
+            # 额外使用 token_set_ratio 捕捉词汇重排序匹配
+            token_ratio = rf_fuzz.token_set_ratio(a.seq_text, b.seq_text) / 100.0
+            seq_ratio = max(seq_ratio, token_ratio)
         
         # 加权平均: Token 相似度通常更重要，因为文件名可能有无关前缀/后缀
         final_score = (jaccard * 0.7) + (seq_ratio * 0.3)
              
         return final_score
 
+
+class PreparedName:
+    """
+    预先提取好的名称特征 (calculate_similarity 对单个名称需要的全部内容)
+    同一查询与大量候选比较时只需提取一次，见 AdvancedTokenizer.calculate_similarity_prepared
+    """
+    __slots__ = ("name", "base_model", "quant", "is_gguf_repo", "is_dev", "is_schnell", "is_base", "is_refiner",
+                 "processed", "tokens", "core", "has_cn", "ascii_core", "seq_text")
+
+    def __init__(self, name):
+        self.name = name
+        lower = name.lower()
+        upper = name.upper()
+        self.base_model = AdvancedTokenizer.detect_base_model(name)
+        self.quant = AdvancedTokenizer.detect_quantization(name)
+        # GGUF 通配仓库 (如 "xxx-GGUF")：没有具体量化标记
+        self.is_gguf_repo = (upper.endswith("-GGUF") or "/GGUF" in upper) and not self.quant
+        # Flux: Dev / Schnell；SDXL: Base / Refiner
+        self.is_dev = "dev" in lower
+        self.is_schnell = "schnell" in lower
+        self.is_base = "base" in lower
+        self.is_refiner = "refiner" in lower
+        # HuggingFace 仓库格式通常是 "org/repo-name"，组织名对相似度匹配是噪声，只保留仓库名部分
+        self.processed = name.rsplit("/", 1)[-1] if "/" in name else name
+        self.tokens = frozenset(AdvancedTokenizer.tokenize(self.processed))
+        self.core = frozenset(AdvancedTokenizer.get_core_tokens(self.processed))
+        self.has_cn = bool(_CJK_RE.search(self.processed))
+        self.ascii_core = frozenset(t for t in self.core if _ASCII_TOKEN_RE.match(t))
+        self.seq_text = AdvancedTokenizer.sequence_text(name)
@@ -0,0 +1,379 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+
+# 文件写入结束后需要静默多久才认为写完 (秒)，避免大文件拷贝过程中反复哈希
+DEBOUNCE_SECONDS = 2.0
+# 轮询模式下两次检查目录 mtime 的间隔 (秒)
+POLL_INTERVAL = 5.0
+
+# inotify 事件常量 (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MODIFY | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _iter_dirs(root):
+    """深度优先遍历目录树 (包含 root 本身)，跳过隐藏目录"""
+    stack = [root]
+    while stack:
+        dir_path = stack.pop()
+        yield dir_path
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False) and not entry.name.startswith("."):
+                            stack.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+class _InotifyBackend:
+    """
+    Linux inotify 后端 (ctypes 直接调用 libc，无额外依赖)
+    产生事件: ("changed" | "deleted", path) / ("moved", old, new) / ("dir_moved", old, new) / ("rescan", dir)
+    """
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._ctypes = ctypes
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | getattr(os, "O_CLOEXEC", 0))
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.wd_paths = {}
+
+    def add_tree(self, root):
+        for dir_path in _iter_dirs(root):
+            self._add_watch(dir_path)
+
+    def _add_watch(self, dir_path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dir_path), WATCH_MASK | IN_ONLYDIR)
+        if wd < 0:
+            err = self._ctypes.get_errno()
+            if err == errno.ENOSPC:
+                # fs.inotify.max_user_watches 耗尽，交给调用方回退到轮询
+                raise OSError(err, "inotify watch limit reached")
+            return
+        self.wd_paths[wd] = dir_path
+
+    def read(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        moved_from = {}  # cookie -> (path, is_dir)
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buf):
+            wd, mask, cookie, name_len = EVENT_HEADER.unpack_from(buf, offset)
+            offset += EVENT_HEADER.size
+            name = buf[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，只能对所有目录做一次对账
+                events.extend(("rescan", path) for path in set(self.wd_paths.values()))
+                continue
+            if mask & IN_IGNORED:
+                self.wd_paths.pop(wd, None)
+                continue
+
+            dir_path = self.wd_paths.get(wd)
+            if dir_path is None or not name:
+                continue
+            path = os.path.join(dir_path, os.fsdecode(name))
+            is_dir = bool(mask & IN_ISDIR)
+
+            if mask & IN_MOVED_FROM:
+                moved_from[cookie] = (path, is_dir)
+            elif mask & IN_MOVED_TO:
+                source = moved_from.pop(cookie, None)
+                if source and is_dir:
+                    self._rename_watches(source[0], path)
+                    events.append(("dir_moved", source[0], path))
+                elif source:
+                    events.append(("moved", source[0], path))
+                elif is_dir:
+                    # 从外部移入的目录
+                    self.add_tree(path)
+                    events.append(("rescan", path))
+                else:
+                    events.append(("changed", path))
+            elif is_dir:
+                if mask & IN_CREATE:
+                    self.add_tree(path)
+                    events.append(("rescan", path))
+                elif mask & IN_DELETE:
+                    events.append(("dir_deleted", path))
+            elif mask & IN_DELETE:
+                events.append(("deleted", path))
+            elif mask & (IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE):
+                events.append(("changed", path))
+
+        # 未配对的 MOVED_FROM: 移出了监听范围
+        for path, is_dir in moved_from.values():
+            events.append(("dir_deleted" if is_dir else "deleted", path))
+        return events
+
+    def _rename_watches(self, old_dir, new_dir):
+        prefix = old_dir + os.sep
+        for wd, path in list(self.wd_paths.items()):
+            if path == old_dir:
+                self.wd_paths[wd] = new_dir
+            elif path.startswith(prefix):
+                self.wd_paths[wd] = new_dir + path[len(old_dir):]
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class _PollingBackend:
+    """
+    轮询后端: 只比较目录 mtime (每个目录一次 stat)，目录内容变化时交给监听器对账
+    目录 mtime 不反映已有文件的原地修改，这种情况依赖手动刷新
+    """
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.roots = []
+        self.dir_mtimes = {}
+
+    def add_tree(self, root):
+        self.roots.append(root)
+        for dir_path in _iter_dirs(root):
+            try:
+                self.dir_mtimes[dir_path] = os.stat(dir_path).st_mtime
+            except OSError:
+                continue
+
+    def read(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        events = []
+        current = {}
+        for root in self.roots:
+            for dir_path in _iter_dirs(root):
+                try:
+                    current[dir_path] = os.stat(dir_path).st_mtime
+                except OSError:
+                    continue
+        for dir_path, mtime in current.items():
+            if self.dir_mtimes.get(dir_path) != mtime:
+                events.append(("rescan", dir_path))
+        for dir_path in self.dir_mtimes:
+            if dir_path not in current:
+                events.append(("dir_deleted", dir_path))
+        self.dir_mtimes = current
+        return events
+
+    def close(self):
+        pass
+
+
+class IndexWatcher:
+    """
+    后台文件系统监听器，将新增/删除/移动增量应用到 ModelIndex，避免手动全量刷新
+    - Linux 下使用 inotify，其他平台或 inotify 不可用时回退到目录 mtime 轮询
+    - 新增/修改的文件需静默 debounce 秒且大小稳定后才会哈希
+    """
+
+    def __init__(self, index, debounce=DEBOUNCE_SECONDS, poll_interval=POLL_INTERVAL, use_inotify=None):
+        self.index = index
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = sys.platform.startswith("linux") if use_inotify is None else use_inotify
+        self.backend = None
+        self._thread = None
+        # 每次 start 使用新的停止事件: stop 后立即 start 时，旧线程仍能看到自己的停止信号并退出
+        self._stop_event = threading.Event()
+        # 事件处理与状态重置互斥，旧线程退出前不会与新线程同时修改待处理状态
+        self._state_lock = threading.Lock()
+        # 待处理: { path: (last_event_time, last_size) }
+        self._pending = {}
+        self._pending_moves = []
+        self._pending_removed = set()
+        self._dir_cache = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop_event,), name="AutoMatchWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=False):
+        self._stop_event.set()
+        if self._thread and wait:
+            self._thread.join(timeout=self.poll_interval + 1)
+        self._thread = None
+
+    def _create_backend(self, roots):
+        if self.use_inotify:
+            backend = None
+            try:
+                backend = _InotifyBackend()
+                for _, root in roots:
+                    backend.add_tree(root)
+                return backend
+            except Exception as e:
+                print(f"[AutoMatch] inotify unavailable ({e}), falling back to polling")
+                if backend:
+                    backend.close()
+        backend = _PollingBackend(self.poll_interval)
+        for _, root in roots:
+            backend.add_tree(root)
+        return backend
+
+    def _run(self, stop_event):
+        roots = self.index.get_model_roots()
+        # 每次运行独立的后端 (inotify fd 由本线程关闭)
+        backend = self._create_backend(roots)
+        with self._state_lock:
+            if stop_event.is_set():
+                backend.close()
+                return
+            self.backend = backend
+            self._pending = {}
+            self._pending_moves = []
+            self._pending_removed = set()
+        print(f"[AutoMatch] Watching {len(roots)} model folders ({type(backend).__name__.strip('_')})")
+        try:
+            while not stop_event.is_set():
+                timeout = self.debounce / 2 if self._pending else self.poll_interval
+                try:
+                    events = backend.read(timeout)
+                except Exception as e:
+                    print(f"[AutoMatch] Watcher read error: {e}")
+                    events = []
+                with self._state_lock:
+                    if stop_event.is_set():
+                        break
+                    self._handle_events(events)
+                    self._flush()
+        finally:
+            backend.close()
+
+    def _known_paths_under(self, dir_path, recursive):
+        """索引中位于 dir_path 下的路径 (按批次缓存 目录 -> 路径 映射)"""
+        if self._dir_cache is None:
+            self._dir_cache = {}
+            for info in list(self.index.get_all_models()):
+                self._dir_cache.setdefault(os.path.dirname(info["path"]), []).append(info["path"])
+        if not recursive:
+            return list(self._dir_cache.get(dir_path, []))
+        prefix = dir_path + os.sep
+        paths = []
+        for parent, children in self._dir_cache.items():
+            if parent == dir_path or parent.startswith(prefix):
+                paths.extend(children)
+        return paths
+
+    def _handle_events(self, events):
+        now = time.time()
+        self._dir_cache = None
+        for event in events:
+            kind = event[0]
+            if kind == "changed":
+                self._mark_changed(event[1], now)
+            elif kind == "deleted":
+                self._pending.pop(event[1], None)
+                self._pending_removed.add(event[1])
+            elif kind == "moved":
+                self._pending_moves.append((event[1], event[2]))
+            elif kind == "dir_moved":
+                old_dir, new_dir = event[1], event[2]
+                for path in self._known_paths_under(old_dir, recursive=True):
+                    self._pending_moves.append((path, new_dir + path[len(old_dir):]))
+            elif kind == "dir_deleted":
+                self._pending_removed.update(self._known_paths_under(event[1], recursive=True))
+            elif kind == "rescan":
+                self._reconcile_dir(event[1], now)
+
+    def _mark_changed(self, path, now):
+        _, last_size = self._pending.get(path, (0, None))
+        self._pending[path] = (now, last_size)
+
+    def _reconcile_dir(self, dir_path, now):
+        """对比目录当前内容与索引 (仅当前目录，新子目录会单独产生 rescan 事件)"""
+        on_disk = set()
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file():
+                            on_disk.add(entry.path)
+                        elif entry.is_dir() and not entry.name.startswith(".") and isinstance(self.backend, _InotifyBackend):
+                            # inotify 下新建目录里可能已经有文件
+                            self._reconcile_dir(entry.path, now)
+                    except OSError:
+                        continue
+        except OSError:
+            self._pending_removed.update(self._known_paths_under(dir_path, recursive=True))
+            return
+
+        known = set(self._known_paths_under(dir_path, recursive=False))
+        for path in on_disk - known:
+            self._mark_changed(path, now)
+        self._pending_removed.update(known - on_disk)
+
+    def _flush(self):
+        now = time.time()
+        ready = []
+        for path, (last_event, last_size) in list(self._pending.items()):
+            if now - last_event < self.debounce:
+                continue
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                size = None
+            if size is not None and size != last_size and last_size is not None:
+                # 仍在写入，继续等待
+                self._pending[path] = (now, size)
+                continue
+            if size is not None and last_size is None:
+                # 第一次检查: 记录大小，下个周期确认稳定
+                self._pending[path] = (now, size)
+                continue
+            ready.append(path)
+            del self._pending[path]
+
+        if not (ready or self._pending_moves or (self._pending_removed and not self._pending)):
+            return
+
+        moves, self._pending_moves = self._pending_moves, []
+        if self._pending:
+            # 还有文件在等待写完: 删除事件一起延后，便于把 "删除 + 新建" 识别为同一 inode 的移动
+            removed = set()
+        else:
+            removed, self._pending_removed = self._pending_removed, set()
+        removed -= set(ready)
+        try:
+            self.index.apply_changes(updated=ready, removed=sorted(removed), moved=moves)
+        except Exception as e:
+            print(f"[AutoMatch] Watcher failed to update index: {e}")
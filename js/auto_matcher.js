@@ -169,29 +169,99 @@ app.registerExtension({
             refreshBtn.style.color = "#ddd";
         };
 
+        // --- 扫描进度 (后台任务，通过 websocket 推送) ---
+        const progressLabel = document.createElement("span");
+        progressLabel.id = "lk-index-progress";
+        progressLabel.style.cssText = `
+            color: #aaa;
+            font-size: 12px;
+            white-space: nowrap;
+            display: none;
+        `;
+
+        let scanJobId = null;
+
+        const formatScanProgress = (job) => {
+            if (job.stage === "hash" && job.hash_total) {
+                const eta = job.eta != null ? ` · 剩余 ${Math.ceil(job.eta)}s` : "";
+                const mb = (job.bytes_read / 1048576).toFixed(0);
+                return `哈希 ${job.files_hashed}/${job.hash_total} · ${mb}MB${eta}`;
+            }
+            if (job.stage === "headers") return "读取文件头...";
+            if (job.stage === "save") return "写入索引...";
+            return `已检查 ${job.files_seen} 个文件`;
+        };
+
+        const finishScan = (job) => {
+            scanJobId = null;
+            progressLabel.style.display = "none";
+            refreshBtn.style.transition = "none";
+            refreshBtn.style.transform = "none";
+            refreshBtn.title = "更新本地模型索引";
+            if (job.status === "done") {
+                app.ui.dialog.show(`✅ 索引更新完成\n数据库共 ${job.count} 个模型文件。`);
+            } else if (job.status === "error") {
+                app.ui.dialog.show("更新失败: " + job.error);
+            }
+        };
+
+        const onScanProgress = (job) => {
+            if (!job || job.job_id !== scanJobId) return;
+            if (job.status === "done" || job.status === "cancelled" || job.status === "error") {
+                finishScan(job);
+                return;
+            }
+            progressLabel.textContent = formatScanProgress(job);
+        };
+
+        api.addEventListener("auto-matcher-scan", (e) => onScanProgress(e.detail));
+
+        // websocket 断开时的兜底: 轮询任务状态
+        const pollScan = async (jobId) => {
+            while (scanJobId === jobId) {
+                await new Promise((r) => setTimeout(r, 2000));
+                if (scanJobId !== jobId) return;
+                try {
+                    const res = await api.fetchApi(`/auto-matcher/refresh-index/${jobId}`);
+                    if (res.ok) onScanProgress(await res.json());
+                } catch (e) {
+                    console.warn("[AutoMatch] Scan status error:", e);
+                }
+            }
+        };
+
         // --- 事件绑定 ---
         refreshBtn.onclick = async () => {
+            // 扫描进行中: 再次点击取消
+            if (scanJobId) {
+                if (confirm("正在更新索引，是否取消？")) {
+                    await api.fetchApi(`/auto-matcher/refresh-index/${scanJobId}/cancel`, { method: "POST" });
+                }
+                return;
+            }
+
             // Animate spin
             refreshBtn.style.transition = "transform 1s linear";
             refreshBtn.style.transform = "rotate(360deg)";
 
-            refreshBtn.disabled = true;
             try {
                 const res = await api.fetchApi("/auto-matcher/refresh-index", { method: "POST" });
                 const data = await res.json();
-                if (data.status === "ok") {
-                    app.ui.dialog.show(`✅ 索引更新完成\n数据库共 ${data.count} 个模型文件。`);
+                if (data.job) {
+                    scanJobId = data.job.job_id;
+                    refreshBtn.title = "正在更新索引 (点击取消)";
+                    progressLabel.style.display = "inline";
+                    onScanProgress(data.job);
+                    pollScan(scanJobId);
                 } else {
                     app.ui.dialog.show("更新失败: " + data.error);
+                    refreshBtn.style.transition = "none";
+                    refreshBtn.style.transform = "none";
                 }
             } catch (e) {
                 app.ui.dialog.show("请求出错: " + e.message);
-            } finally {
-                setTimeout(() => {
-                    refreshBtn.style.transition = "none";
-                    refreshBtn.style.transform = "none";
-                    refreshBtn.disabled = false;
-                }, 1000);
+                refreshBtn.style.transition = "none";
+                refreshBtn.style.transform = "none";
             }
         };
 
@@ -203,6 +273,7 @@ app.registerExtension({
         floater.appendChild(titleSpan);
         floater.appendChild(autoMatchBtn);
         floater.appendChild(refreshBtn);
+        floater.appendChild(progressLabel);
         floater.appendChild(settingsBtn); // Add settings button
         document.body.appendChild(floater);
     }
@@ -0,0 +1,181 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+import json
+import struct
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from headers import inspect_safetensors, inspect_model_header, read_safetensors_header, inspect_gguf
+from matcher import ModelMatcher
+
+
+def write_safetensors(path, tensors, metadata=None):
+    """写入只有头部 (张量数据用 0 填充) 的 safetensors 文件"""
+    header = {}
+    offset = 0
+    for name, (dtype, shape) in tensors.items():
+        size = 2
+        for dim in shape:
+            size *= dim
+        header[name] = {"dtype": dtype, "shape": shape, "data_offsets": [offset, offset + size]}
+        offset += size
+    if metadata:
+        header["__metadata__"] = metadata
+    raw = json.dumps(header).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(raw)))
+        f.write(raw)
+        f.write(b"\0" * offset)
+
+
+def _gguf_string(text):
+    raw = text.encode("utf-8")
+    return struct.pack("<Q", len(raw)) + raw
+
+
+def write_gguf(path, kv, tensors=()):
+    """
+    写入最小 GGUF v3 文件 (头部 + 张量信息表 + 少量填充数据)
+    kv: [(key, value_type, packed_value_bytes)]
+    tensors: [(name, shape, ggml_type)]
+    """
+    out = b"GGUF" + struct.pack("<IQQ", 3, len(tensors), len(kv))
+    for key, value_type, value in kv:
+        out += _gguf_string(key) + struct.pack("<I", value_type) + value
+    for i, (name, shape, ggml_type) in enumerate(tensors):
+        out += _gguf_string(name) + struct.pack("<I", len(shape))
+        out += b"".join(struct.pack("<Q", d) for d in shape)
+        out += struct.pack("<IQ", ggml_type, i * 32)
+    with open(path, "wb") as f:
+        f.write(out)
+        f.write(b"\0" * 256)
+
+
+class TestSafetensorsHeader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def test_sdxl_checkpoint(self):
+        path = self._path("anything.safetensors")
+        write_safetensors(path, {
+            "conditioner.embedders.1.model.ln_final.weight": ("F16", [1280]),
+            "model.diffusion_model.input_blocks.0.0.weight": ("F16", [320, 4, 3, 3]),
+            "model.diffusion_model.out.0.weight": ("F32", [320]),
+        })
+        self.assertEqual(inspect_safetensors(path), {"arch": "sdxl", "dtype": "fp16"})
+
+    def test_flux_unet_bf16(self):
+        path = self._path("mystery_model.safetensors")
+        write_safetensors(path, {
+            "double_blocks.0.img_attn.qkv.weight": ("BF16", [64, 64]),
+            "single_blocks.0.linear1.weight": ("BF16", [64, 64]),
+            "final_layer.norm.weight": ("F32", [64]),
+        })
+        self.assertEqual(inspect_safetensors(path), {"arch": "flux", "dtype": "bf16"})
+
+    def test_lora_metadata_wins(self):
+        path = self._path("lora.safetensors")
+        write_safetensors(path, {"lora_unet_down_blocks_0.lora_down.weight": ("F16", [4, 320])},
+                          metadata={"ss_base_model_version": "sdxl_base_v1-0"})
+        self.assertEqual(inspect_safetensors(path)["arch"], "sdxl")
+
+    def test_invalid_file(self):
+        path = self._path("broken.safetensors")
+        with open(path, "wb") as f:
+            f.write(b"\xff" * 64)
+        self.assertIsNone(read_safetensors_header(path))
+        self.assertEqual(inspect_model_header(path), {})
+        self.assertEqual(inspect_model_header(self._path("model.ckpt")), {})
+
+
+class TestGGUFHeader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_metadata_fields(self):
+        path = os.path.join(self.tmp_dir, "unet.gguf")
+        vocab = struct.pack("<IQ", 8, 3) + b"".join(_gguf_string(t) for t in ("a", "bb", "ccc"))
+        write_gguf(path, [
+            ("general.architecture", 8, _gguf_string("flux")),
+            ("tokenizer.ggml.tokens", 9, vocab),
+            ("general.name", 8, _gguf_string("FLUX.1 Dev")),
+            ("general.quantization_version", 4, struct.pack("<I", 2)),
+            ("general.file_type", 4, struct.pack("<I", 15)),
+        ])
+        self.assertEqual(inspect_gguf(path), {
+            "arch": "flux", "gguf_arch": "flux", "quant": "q4_k_m", "model_name": "FLUX.1 Dev",
+        })
+
+    def test_quant_from_tensor_types(self):
+        """没有 general.file_type 时按参数量统计主要张量类型"""
+        path = os.path.join(self.tmp_dir, "clip.gguf")
+        write_gguf(path, [("general.architecture", 8, _gguf_string("t5encoder"))], tensors=[
+            ("enc.norm.weight", [4096], 0),
+            ("enc.blk.0.attn_q.weight", [4096, 4096], 8),
+        ])
+        self.assertEqual(inspect_model_header(path), {"gguf_arch": "t5encoder", "quant": "q8_0"})
+
+    def test_not_gguf(self):
+        path = os.path.join(self.tmp_dir, "fake.gguf")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 64)
+        self.assertEqual(inspect_model_header(path), {})
+
+
+class TestMetadataFiltering(unittest.TestCase):
+    def test_real_arch_filters_candidate(self):
+        """文件名看不出架构时，用头部真实架构排除错误候选"""
+        scanner = MagicMock()
+        scanner.get_all_models.return_value = [
+            {"filename": "realistic_mix_v2.safetensors", "path": "/m/a", "type": "checkpoints", "arch": "sd15"},
+        ]
+        matcher = ModelMatcher(scanner)
+        items = [{"id": 1, "current": "realistic_mix_v2_xl.safetensors", "node_type": "CheckpointLoader", "widget_name": "ckpt"}]
+        self.assertEqual(matcher.match(items), [])
+
+        scanner.get_all_models.return_value[0]["arch"] = "sdxl"
+        result = matcher.match(items)
+        self.assertEqual(len(result), 1)
+
+    def test_real_dtype_filters_candidate(self):
+        """文件名标注的精度与真实 dtype 不一致时，优先选择真实精度匹配的候选"""
+        scanner = MagicMock()
+        scanner.get_all_models.return_value = [
+            {"filename": "model_v1_fp16_pruned.safetensors", "path": "/m/a", "type": "checkpoints", "dtype": "fp32"},
+            {"filename": "model_v1_fp16_emaonly.safetensors", "path": "/m/b", "type": "checkpoints", "dtype": "fp16"},
+        ]
+        matcher = ModelMatcher(scanner)
+        items = [{"id": 1, "current": "model_v1_fp16.safetensors", "node_type": "CheckpointLoader", "widget_name": "ckpt"}]
+        result = matcher.match(items)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]["matched_value"], "model_v1_fp16_emaonly.safetensors")
+
+    def test_gguf_quant_filters_candidate(self):
+        """文件名不带量化标记的 GGUF，用头部量化类型判断是否兼容"""
+        scanner = MagicMock()
+        scanner.get_all_models.return_value = [
+            {"filename": "flux1-dev-custom.gguf", "path": "/m/a", "type": "unet", "quant": "q8_0"},
+            {"filename": "flux1-dev-custom-v2.gguf", "path": "/m/b", "type": "unet", "quant": "q4_k"},
+        ]
+        matcher = ModelMatcher(scanner)
+        items = [{"id": 1, "current": "flux1-dev-custom-Q4_K_M.gguf", "node_type": "UnetLoaderGGUF", "widget_name": "unet_name"}]
+        result = matcher.match(items)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]["matched_value"], "flux1-dev-custom-v2.gguf")
+
+
+if __name__ == '__main__':
+    unittest.main()
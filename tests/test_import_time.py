@@ -0,0 +1,55 @@
+import unittest
+import subprocess
+import sys
+import os
+
+CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core")
+PLUGIN_MODULES = ["utils", "storage", "hashing", "headers", "scanner", "matcher", "searcher", "watcher", "jobs"]
+# 启动时不应导入的重量级依赖 (只在搜索/相似度计算时加载)
+HEAVY_MODULES = ["curl_cffi", "parsel", "rapidfuzz"]
+IMPORT_BUDGET_MS = 300
+
+IMPORT_SCRIPT = (
+    "import sys\n"
+    "from unittest.mock import MagicMock\n"
+    "sys.modules['folder_paths'] = MagicMock()\n"
+    "sys.path.insert(0, sys.argv[1])\n"
+    "import " + ", ".join(PLUGIN_MODULES) + "\n"
+)
+
+
+def measure_import():
+    """用 python -X importtime 导入插件模块，返回 ({ 模块名: 累计微秒 }, 全部导入的模块名)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SCRIPT, CORE_DIR],
+        capture_output=True, text=True, check=True,
+    )
+    cumulative, imported = {}, set()
+    for line in result.stderr.splitlines():
+        parts = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        raw_name = parts[2]
+        name = raw_name.strip()
+        imported.add(name.split(".")[0])
+        # 只统计顶层导入 (嵌套导入已包含在上层的累计时间中)
+        if name in PLUGIN_MODULES and len(raw_name) - len(raw_name.lstrip()) == 1:
+            cumulative[name] = int(parts[1])
+    return cumulative, imported
+
+
+class TestImportTime(unittest.TestCase):
+    def test_heavy_dependencies_are_deferred(self):
+        _, imported = measure_import()
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, imported)
+
+    def test_import_budget(self):
+        measure_import()  # 第一次运行会编译 .pyc，不计入
+        cumulative, _ = measure_import()
+        total_ms = sum(cumulative.values()) / 1000
+        self.assertLess(total_ms, IMPORT_BUDGET_MS, f"plugin import took {total_ms:.0f} ms: {cumulative}")
+
+
+if __name__ == '__main__':
+    unittest.main()
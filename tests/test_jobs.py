@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if 'folder_paths' not in sys.modules:
+    sys.modules['folder_paths'] = MagicMock()
+
+import scanner
+from scanner import ModelIndex, ScanCancelled
+from jobs import ScanJob, ScanJobManager
+
+
+class TestScanJobs(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.model_dir = os.path.join(self.tmp_dir, "checkpoints")
+        os.makedirs(self.model_dir)
+        for i in range(5):
+            with open(os.path.join(self.model_dir, f"m{i}.safetensors"), "wb") as f:
+                f.write(bytes([i]) * 2048)
+
+        self.folder_paths = MagicMock()
+        model_dir = self.model_dir
+        self.folder_paths.get_folder_paths.side_effect = lambda key: [model_dir] if key == "checkpoints" else []
+        self.patcher = patch.object(scanner, "folder_paths", self.folder_paths)
+        self.patcher.start()
+        self.index = ModelIndex(index_file=os.path.join(self.tmp_dir, "model_index.db"), hash_workers=2)
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_job_reports_progress(self):
+        events = []
+        manager = ScanJobManager(self.index, publish=events.append)
+        job, created = manager.start()
+        self.assertTrue(created)
+        manager._executor.shutdown(wait=True)
+
+        status = manager.get(job.id).to_dict()
+        self.assertEqual(status["status"], "done")
+        self.assertEqual(status["count"], 5)
+        self.assertEqual(status["files_seen"], 5)
+        self.assertEqual(status["files_hashed"], 5)
+        self.assertEqual(status["bytes_read"], 5 * 2048)
+        self.assertEqual(events[-1]["status"], "done")
+        self.assertIn("hash", [e["stage"] for e in events])
+
+    def test_cancel_leaves_index_untouched(self):
+        self.index.scan_incremental()
+        before = dict(self.index.data["models"])
+        with open(os.path.join(self.model_dir, "new.safetensors"), "wb") as f:
+            f.write(b"n" * 2048)
+
+        job = ScanJob(deep_verify=True)
+        job.cancel()
+        with self.assertRaises(ScanCancelled):
+            self.index.scan_incremental(deep_verify=True, progress=job)
+        self.assertEqual(self.index.data["models"], before)
+
+        manager = ScanJobManager(self.index)
+        job, _ = manager.start()
+        manager.cancel(job.id)
+        manager._executor.shutdown(wait=True)
+        self.assertIn(job.status, ("cancelled", "done"))
+        self.assertIsNone(manager.cancel("missing"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,13 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 import sys
 import os
+import difflib
+import random
+import shutil
+import subprocess
+import tempfile
+import time
 
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -9,8 +15,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Mock folder_paths BEFORE importing scanner
 sys.modules['folder_paths'] = MagicMock()
 
+import scanner
 from scanner import ModelScanner
-from matcher import ModelMatcher
+from matcher import ModelMatcher, ModelFeatures
+from utils import AdvancedTokenizer
 
 class TestModelMatcher(unittest.TestCase):
     def setUp(self):
@@ -62,5 +70,376 @@ class TestModelMatcher(unittest.TestCase):
         result = self.matcher.match(items)
         self.assertEqual(len(result), 0)
 
+
+def make_entry(file_hash, filename):
+    return {"hash": file_hash, "filename": filename, "path": "/m/" + filename, "type": "checkpoints", "size": 1, "mtime": 0.0}
+
+
+class TestIncrementalIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.index = ModelScanner(index_file=os.path.join(self.tmp_dir, "model_index.db"))
+        self.index._set_models({
+            "h1": make_entry("h1", "sd_xl_base_1.0.safetensors"),
+            "h2": make_entry("h2", "v1-5-pruned-emaonly.ckpt"),
+        })
+        self.matcher = ModelMatcher(self.index)
+        self.items = [{"id": 1, "current": "dreamshaper_8.pt", "node_type": "CheckpointLoaderSimple", "widget_name": "ckpt_name"}]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_unchanged_generation_skips_rebuild(self):
+        self.matcher.match(self.items)
+        with patch.object(self.index, "get_all_models") as get_all:
+            self.matcher.match(self.items)
+            get_all.assert_not_called()
+
+    def test_changes_are_applied_incrementally(self):
+        self.assertEqual(self.matcher.match(self.items), [])
+        models = dict(self.index.data["models"])
+        models["h3"] = make_entry("h3", "dreamshaper_8.safetensors")
+        del models["h2"]
+        self.index._set_models(models)
+
+        with patch.object(self.matcher, "_build_index") as rebuild:
+            result = self.matcher.match(self.items)
+            rebuild.assert_not_called()
+        self.assertEqual(result[0]["matched_value"], "dreamshaper_8.safetensors")
+        self.assertNotIn("h2", self.matcher.models)
+        self.assertNotIn("v1-5-pruned-emaonly", self.matcher.basename_map)
+
+    def test_sync_pins_published_snapshot(self):
+        pinned = self.index.snapshot()
+        models = dict(self.index.data["models"])
+        models["h3"] = make_entry("h3", "dreamshaper_8.safetensors")
+        self.index._set_models(models)
+
+        # 同步期间发布的新快照不影响已固定的快照
+        with patch.object(self.index, "snapshot", return_value=pinned):
+            self.assertEqual(self.matcher.match(self.items), [])
+        self.assertEqual(self.matcher._generation, pinned.generation)
+        self.assertNotIn("h3", self.matcher.models)
+
+        result = self.matcher.match(self.items)
+        self.assertEqual(result[0]["matched_value"], "dreamshaper_8.safetensors")
+        self.assertEqual(self.matcher._generation, self.index.generation)
+
+    def test_repeat_match_served_from_cache(self):
+        self.matcher.match(self.items)
+        self.assertEqual(self.matcher.cache_stats()["misses"], 1)
+        with patch.object(self.matcher, "_match_value") as match_value:
+            self.assertEqual(self.matcher.match(self.items), [])
+            match_value.assert_not_called()
+        self.assertEqual(self.matcher.cache_hits, 1)
+
+        # 索引变化后旧结果失效
+        models = dict(self.index.data["models"])
+        models["h3"] = make_entry("h3", "dreamshaper_8.safetensors")
+        self.index._set_models(models)
+        result = self.matcher.match(self.items)
+        self.assertEqual(result[0]["matched_value"], "dreamshaper_8.safetensors")
+        self.assertEqual(self.matcher.cache_misses, 2)
+
+    def test_expired_deadline_marks_items_pending(self):
+        items = [dict(self.items[0], id=1), dict(self.items[0], id=2, current="sd_xl_base_1.0.ckpt")]
+        matches, pending = self.matcher.match_partial(items, deadline=time.monotonic() - 1)
+        self.assertEqual(matches, [])
+        self.assertEqual([p["id"] for p in pending], [1, 2])
+
+        # 已缓存的值在超时后仍直接返回
+        self.matcher.match(items[1:])
+        matches, pending = self.matcher.match_partial(items, deadline=time.monotonic() - 1)
+        self.assertEqual([m["matched_value"] for m in matches], ["sd_xl_base_1.0.safetensors"])
+        self.assertEqual([p["id"] for p in pending], [1])
+
+    def test_cache_is_bounded(self):
+        self.matcher.cache_size = 2
+        for i in range(5):
+            self.matcher.match([dict(self.items[0], current=f"missing_{i}.safetensors")])
+        self.assertEqual(self.matcher.cache_stats()["size"], 2)
+
+    def test_truncated_feed_rebuilds(self):
+        self.matcher.match(self.items)
+        for i in range(scanner.CHANGE_FEED_SIZE + 1):
+            models = dict(self.index.data["models"])
+            models[f"x{i}"] = make_entry(f"x{i}", f"extra_{i}.safetensors")
+            self.index._set_models(models)
+        self.assertIsNone(self.index.changes_since(self.matcher._generation))
+
+        self.matcher.match(self.items)
+        self.assertEqual(self.matcher._generation, self.index.generation)
+        self.assertEqual(len(self.matcher.models), 2 + scanner.CHANGE_FEED_SIZE + 1)
+
+
+class TestModelFeatures(unittest.TestCase):
+    def _features(self, filename):
+        matcher = ModelMatcher(None)
+        return ModelFeatures(filename, matcher._get_basename(filename), matcher._normalize_name(filename))
+
+    def test_compact_record(self):
+        feature = self._features("loras/flux1-dev-lora_bf16.safetensors")
+        self.assertFalse(hasattr(feature, "__dict__"))
+        self.assertEqual(feature.base, "flux1-dev-lora_bf16")
+        self.assertEqual(feature.prepared.quant, "bf16")
+        self.assertEqual(feature.fmt, "checkpoint")
+
+    def test_precheck_agrees_with_similarity(self):
+        """预检查排除的候选，calculate_similarity 也必须给 0 分"""
+        names = ["flux1-dev-Q4_K_M.gguf", "flux1-dev-Q8_0.gguf", "sd_xl_base_1.0.safetensors",
+                 "sdxl_vae.safetensors", "model_bf16.safetensors", "model.safetensors", "model_upscale.safetensors"]
+        features = [self._features(n) for n in names]
+        for a in features:
+            for b in features:
+                if not ModelMatcher._similarity_precheck(a, b):
+                    self.assertEqual(AdvancedTokenizer.calculate_similarity(a.base, b.base), 0.0, (a.base, b.base))
+
+
+class TestBatchScoring(unittest.TestCase):
+    NAMES = ["flux1-dev-fp8", "flux1_dev", "Flux.1 Dev", "sd_xl_base_1.0", "sdxl base", "realistic vision v5",
+             "dreamshaper_8", "juggernaut xl v9", "", "qwen-image-edit-2511"]
+
+    def test_batch_matches_scalar(self):
+        from rapidfuzz import fuzz
+        query = AdvancedTokenizer.sequence_text("flux1-dev")
+        texts = [AdvancedTokenizer.sequence_text(n) for n in self.NAMES if n]
+        batch = AdvancedTokenizer.batch_sequence_ratios(query, texts)
+        for text, score in zip(texts, batch):
+            expected = max(fuzz.ratio(query, text), fuzz.token_set_ratio(query, text)) / 100.0
+            self.assertAlmostEqual(score, expected, places=5)
+
+    def test_matcher_results_unchanged(self):
+        scanner_mock = MagicMock()
+        scanner_mock.get_all_models.return_value = [
+            {"filename": f"realistic_mix_v{i}.safetensors", "path": f"/m/{i}", "type": "checkpoints"} for i in range(40)
+        ]
+        items = [{"id": 1, "current": "realistic_mix_v7_pruned.safetensors", "node_type": "CheckpointLoader", "widget_name": "ckpt"}]
+        import matcher as matcher_module
+        with patch.object(matcher_module, "BATCH_SCORING_MIN", 10 ** 9):
+            scalar = ModelMatcher(scanner_mock).match(items)
+        with patch.object(matcher_module, "BATCH_SCORING_MIN", 1):
+            batched = ModelMatcher(scanner_mock).match(items)
+        self.assertEqual(scalar, batched)
+        self.assertEqual(len(batched), 1)
+
+
+class TestClosestBasename(unittest.TestCase):
+    NAMES = ["dreamshaper_8", "dreamshaper_7", "dreamshaper_xl_turbo", "realisticvision_v51", "realistic_vision_v60b1",
+             "juggernautxl_v9", "juggernaut_reborn", "epicrealism_naturalsin", "revanimated_v122", "a", "ab"]
+
+    def setUp(self):
+        scanner_mock = MagicMock()
+        scanner_mock.get_all_models.return_value = [
+            {"filename": f"{name}.safetensors", "path": f"/m/{name}", "type": "checkpoints"} for name in self.NAMES
+        ]
+        self.matcher = ModelMatcher(scanner_mock)
+        self.matcher._build_index()
+
+    def test_same_result_as_difflib(self):
+        queries = ["dreamshaper8", "dreamshaper_9", "realisticvision_v5", "juggernautxl_v8", "revanimated_v12",
+                   "epicrealism", "b", "totally_different_name", ""]
+        for query in queries:
+            expected = difflib.get_close_matches(query, list(self.matcher.basename_map), n=1, cutoff=0.85)
+            self.assertEqual(self.matcher._closest_basename(query), expected[0] if expected else None, query)
+
+    def test_gram_index_matches_difflib_on_edited_names(self):
+        # 三元组过滤必须是无损的: 对随机编辑后的名称，结果与 difflib 全量比较一致
+        rnd = random.Random(7)
+        words = ["dream", "shaper", "real", "vision", "juggernaut", "xl", "turbo", "detail", "anime", "pony", "flux"]
+        names = {"_".join(rnd.choice(words) for _ in range(rnd.randint(1, 4))) + f"_v{rnd.randint(0, 30)}" for _ in range(400)}
+        scanner_mock = MagicMock()
+        scanner_mock.get_all_models.return_value = [
+            {"filename": f"{name}.safetensors", "path": f"/m/{name}", "type": "checkpoints"} for name in names
+        ]
+        matcher = ModelMatcher(scanner_mock)
+        matcher._build_index()
+        for _ in range(150):
+            query = list(rnd.choice(sorted(names)))
+            for _ in range(rnd.randint(0, 3)):
+                pos = rnd.randrange(len(query))
+                if rnd.random() < 0.5:
+                    del query[pos]
+                else:
+                    query.insert(pos, rnd.choice("abcxyz_0123"))
+            query = "".join(query)
+            expected = difflib.get_close_matches(query, list(matcher.basename_map), n=1, cutoff=0.85)
+            self.assertEqual(matcher._closest_basename(query), expected[0] if expected else None, query)
+
+    def test_removed_names_leave_buckets(self):
+        key = next(iter(self.matcher.basename_map["dreamshaper_8"]))
+        self.matcher._remove_model(key)
+        self.assertNotIn("dreamshaper_8", self.matcher.length_buckets[len("dreamshaper_8")])
+        self.assertNotIn("dreamshaper_8", self.matcher.gram_index["ams"])
+        self.assertEqual(self.matcher._closest_basename("dreamshaper_8"), "dreamshaper_7")
+
+
+class TestCandidateRetrieval(unittest.TestCase):
+    def _matcher(self, count, **kwargs):
+        scanner_mock = MagicMock()
+        models = [{"filename": f"sdxl_generic_{i}.safetensors", "path": f"/m/{i}", "type": "checkpoints"} for i in range(count)]
+        models.append({"filename": "sdxl_rare_portrait.safetensors", "path": "/m/rare", "type": "checkpoints"})
+        scanner_mock.get_all_models.return_value = models
+        matcher = ModelMatcher(scanner_mock, **kwargs)
+        matcher._build_index()
+        return matcher
+
+    def test_stop_tokens_skipped_on_large_library(self):
+        import matcher as matcher_module
+        matcher = self._matcher(matcher_module.STOP_TOKEN_MIN_MODELS)
+        candidates = matcher._retrieve_candidates(["xl", "rare", "portrait"])
+        self.assertEqual([matcher.models[k]["filename"] for k in candidates], ["sdxl_rare_portrait.safetensors"])
+
+    def test_top_k_prefers_rare_tokens(self):
+        matcher = self._matcher(50, candidate_limit=5)
+        candidates = matcher._retrieve_candidates(["xl", "generic", "portrait"])
+        self.assertEqual(len(candidates), 5)
+        self.assertIn("sdxl_rare_portrait.safetensors", [matcher.models[k]["filename"] for k in candidates])
+
+    def test_small_library_keeps_full_recall(self):
+        matcher = self._matcher(50)
+        self.assertEqual(len(matcher._retrieve_candidates(["xl"])), 51)
+
+
+class TestTypePartitions(unittest.TestCase):
+    def _matcher(self, **kwargs):
+        scanner_mock = MagicMock()
+        scanner_mock.get_all_models.return_value = [
+            {"filename": "detail_tweaker.safetensors", "path": "/ckpt/detail_tweaker", "type": "checkpoints"},
+            {"filename": "detail_tweaker_v2.safetensors", "path": "/lora/detail_tweaker_v2", "type": "loras"},
+            {"filename": "anime_style.safetensors", "path": "/ckpt/anime_style", "type": "checkpoints"},
+            {"filename": "4x_NMKD_Siax_v2.ckpt", "path": "/ckpt/4x_NMKD_Siax_v2", "type": "checkpoints"},
+            {"filename": "4x_NMKD-Siax_200k.pth", "path": "/upscale/4x_NMKD-Siax_200k", "type": "upscale_models"},
+            {"filename": "clip_vision_g_v2.safetensors", "path": "/clip/clip_vision_g_v2", "type": "clip"},
+            {"filename": "clip_vision_g.safetensors", "path": "/clip_vision/clip_vision_g", "type": "clip_vision"},
+        ]
+        return ModelMatcher(scanner_mock, **kwargs)
+
+    def _item(self, current, model_type=None):
+        item = {"id": 1, "current": current, "node_type": "LoraLoader", "widget_name": "lora_name"}
+        if model_type:
+            item["type"] = model_type
+        return item
+
+    def test_typed_item_prefers_own_partition(self):
+        matcher = self._matcher()
+        result = matcher.match([self._item("detail_tweaker_v3.pt", "loras")])
+        self.assertEqual(result[0]["path"], "/lora/detail_tweaker_v2")
+        # 未指定类型时仍在全部模型中查找 (原有行为)
+        result = matcher.match([self._item("detail_tweaker_v3.pt")])
+        self.assertEqual(result[0]["path"], "/ckpt/detail_tweaker")
+
+    def test_exact_match_beats_typed_fuzzy_match(self):
+        """前端推断的类型可能是错的: 其他类型中的精确同名文件优先于本类型内的模糊匹配"""
+        for fallback in (True, False):
+            matcher = self._matcher(cross_type_fallback=fallback)
+            result = matcher.match([self._item("sub/4x_NMKD-Siax_200k.pth", "checkpoints")])
+            self.assertEqual(result[0]["path"], "/upscale/4x_NMKD-Siax_200k")
+            result = matcher.match([self._item("sub/clip_vision_g.safetensors", "clip")])
+            self.assertEqual(result[0]["path"], "/clip_vision/clip_vision_g")
+
+    def test_cross_type_fallback(self):
+        item = self._item("anime_style_v2.pt", "loras")
+        self.assertEqual(self._matcher().match([item])[0]["matched_value"], "anime_style.safetensors")
+        self.assertEqual(self._matcher(cross_type_fallback=False).match([item]), [])
+
+    def test_partitions_follow_removals(self):
+        matcher = self._matcher()
+        matcher._build_index()
+        key = next(k for k, info in matcher.models.items() if info["type"] == "loras")
+        matcher._remove_model(key)
+        self.assertNotIn("loras", matcher.type_index)
+        self.assertNotIn("loras", matcher.type_counts)
+        self.assertEqual(matcher.type_counts["checkpoints"], 3)
+
+    def test_duplicate_values_resolved_once(self):
+        matcher = self._matcher()
+        items = [dict(self._item("anime_style.pt", "checkpoints"), id=i) for i in range(5)]
+        items.append(dict(self._item("anime_style.pt", "loras"), id=5))
+        with patch.object(matcher, "_match_value", wraps=matcher._match_value) as match_value:
+            result = matcher.match(items)
+        self.assertEqual(match_value.call_count, 2)
+        self.assertEqual([m["id"] for m in result], list(range(6)))
+        self.assertTrue(all(m["matched_value"] == "anime_style.safetensors" for m in result))
+
+
+class TestProcessPoolMatching(unittest.TestCase):
+    def setUp(self):
+        scanner_mock = MagicMock()
+        scanner_mock.get_all_models.return_value = [
+            {"filename": f"style_{i}_v1.safetensors", "path": f"/m/style_{i}", "type": "loras"} for i in range(30)
+        ]
+        self.scanner = scanner_mock
+        self.items = [
+            {"id": i, "current": f"style_{i % 12}_v2.safetensors", "type": "loras", "node_type": "LoraLoader", "widget_name": "lora_name"}
+            for i in range(24)
+        ]
+
+    def _process_matcher(self, **kwargs):
+        matcher = ModelMatcher(self.scanner, process_workers=2, process_batch_min=4, **kwargs)
+        self.addCleanup(matcher.close)
+        return matcher
+
+    def test_sharded_results_match_in_process(self):
+        expected = ModelMatcher(self.scanner).match(self.items)
+        matcher = self._process_matcher()
+        self.assertEqual(matcher.match(self.items), expected)
+        self.assertIsNotNone(matcher._pool)
+
+    def test_pool_is_reused_across_requests(self):
+        matcher = self._process_matcher(cache_size=0)
+        matcher.match(self.items)
+        pool = matcher._pool
+        self.assertIsNotNone(pool)
+        matcher.match(self.items)
+        self.assertIs(matcher._pool, pool)
+
+    def test_broken_pool_falls_back_to_in_process(self):
+        from concurrent.futures.process import BrokenProcessPool
+        expected = ModelMatcher(self.scanner).match(self.items)
+        matcher = self._process_matcher()
+        broken = MagicMock()
+        broken.map.side_effect = BrokenProcessPool("worker died")
+        with patch.object(matcher, "_get_pool", return_value=broken):
+            self.assertEqual(matcher.match(self.items), expected)
+        self.assertIsNone(matcher._pool)
+
+    def test_small_batch_stays_in_process(self):
+        matcher = ModelMatcher(self.scanner, process_workers=2, process_batch_min=100)
+        with patch.object(matcher, "_match_in_processes") as sharded:
+            matcher.match(self.items)
+            sharded.assert_not_called()
+
+
+TIE_SCRIPT = (
+    "import sys\n"
+    "from unittest.mock import MagicMock\n"
+    "sys.modules['folder_paths'] = MagicMock()\n"
+    "sys.path.insert(0, sys.argv[1])\n"
+    "from matcher import ModelMatcher\n"
+    "scanner = MagicMock()\n"
+    "scanner.get_all_models.return_value = [\n"
+    "    {'hash': 'h%d' % i, 'filename': 'realvis_v%d.safetensors' % i, 'path': '/m/%d' % i, 'type': 'checkpoints'}\n"
+    "    for i in range(1, 5)\n"
+    "] + [{'hash': 'g%d' % i, 'filename': 'generic_%d.safetensors' % i, 'path': '/g/%d' % i, 'type': 'loras'} for i in range(50)]\n"
+    "matcher = ModelMatcher(scanner, candidate_limit=5)\n"
+    "item = {'id': 1, 'current': 'realvis_v9.safetensors', 'node_type': 'n', 'widget_name': 'w'}\n"
+    "print(matcher.match([item])[0]['matched_value'])\n"
+    "print(','.join(matcher._retrieve_candidates(['generic'])))\n"
+)
+
+
+class TestDeterministicTies(unittest.TestCase):
+    def test_ties_independent_of_hash_seed(self):
+        """候选 key 为 hash 字符串时，同分结果不能随 PYTHONHASHSEED 变化"""
+        core_dir = os.path.dirname(os.path.abspath(scanner.__file__))
+        outputs = set()
+        for seed in range(6):
+            env = dict(os.environ, PYTHONHASHSEED=str(seed))
+            result = subprocess.run([sys.executable, "-c", TIE_SCRIPT, core_dir], env=env,
+                                    capture_output=True, text=True, check=True)
+            outputs.add(result.stdout)
+        self.assertEqual(outputs, {"realvis_v1.safetensors\ng0,g1,g2,g3,g4\n"})
+
+
 if __name__ == '__main__':
     unittest.main()
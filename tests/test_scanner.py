@@ -0,0 +1,317 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+import json
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock folder_paths BEFORE importing scanner
+if 'folder_paths' not in sys.modules:
+    sys.modules['folder_paths'] = MagicMock()
+
+import scanner
+from scanner import ModelIndex
+from hashing import FastHasher, LEGACY_HASH_SCHEME
+
+
+class TestScanner(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.model_dir = os.path.join(self.tmp_dir, "checkpoints")
+        os.makedirs(os.path.join(self.model_dir, "sub"))
+        self.files = {
+            "a.safetensors": b"a" * 4096,
+            "b.ckpt": b"b" * (3 * 1024 * 1024),
+            os.path.join("sub", "c.gguf"): b"c" * 1024,
+            "preview.png": b"not a model",
+        }
+        for rel, content in self.files.items():
+            with open(os.path.join(self.model_dir, rel), "wb") as f:
+                f.write(content)
+
+        # 模拟 ComfyUI 的 folder_paths
+        self.folder_paths = MagicMock()
+        model_dir = self.model_dir
+
+        self.folder_paths.get_folder_paths.side_effect = lambda key: [model_dir] if key == "checkpoints" else []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _make_index(self, name="model_index.db", **kwargs):
+        return ModelIndex(index_file=os.path.join(self.tmp_dir, name), **kwargs)
+
+    def _scan(self, index):
+        with patch.object(scanner, "folder_paths", self.folder_paths):
+            return index.scan_incremental()
+
+    def test_parallel_hash_matches_serial(self):
+        """线程池哈希结果必须与串行结果一致"""
+        paths = [os.path.join(self.model_dir, rel) for rel in self.files]
+        serial = self._make_index(hash_workers=1)._hash_files(paths)
+        parallel = self._make_index(hash_workers=8)._hash_files(paths)
+        self.assertEqual(serial, parallel)
+        self.assertTrue(all(parallel.values()))
+
+    def test_hash_workers_shared_across_devices(self):
+        allocation = ModelIndex._split_workers(8, {1: 16, 2: 16, 3: 2})
+        self.assertEqual(sum(allocation.values()), 8)
+        self.assertEqual(allocation[3], 2)
+        self.assertEqual(ModelIndex._split_workers(32, {1: 4, 2: 2}), {1: 4, 2: 2})
+        # 设备数多于线程上限时每个设备仍有 1 个线程
+        self.assertEqual(ModelIndex._split_workers(2, {1: 16, 2: 16, 3: 16}), {1: 1, 2: 1, 3: 1})
+
+    def test_parallel_scan_matches_serial(self):
+        serial = self._make_index("serial.db", hash_workers=1)
+        self._scan(serial)
+
+        parallel = self._make_index("parallel.db", hash_workers=8)
+        count = self._scan(parallel)
+
+        self.assertEqual(count, 3)  # preview.png 被过滤
+        self.assertEqual(serial.data["models"], parallel.data["models"])
+        self.assertEqual(list(serial.data["models"]), list(parallel.data["models"]))
+
+    def test_walker_filters_and_uses_relative_names(self):
+        index = self._make_index()
+        self._scan(index)
+        filenames = sorted(info["filename"] for info in index.data["models"].values())
+        self.assertEqual(filenames, sorted(["a.safetensors", "b.ckpt", os.path.join("sub", "c.gguf")]))
+        for info in index.data["models"].values():
+            self.assertEqual(info["path"], os.path.join(self.model_dir, info["filename"]))
+            self.assertEqual(info["size"], len(self.files[info["filename"]]))
+        # 单次遍历，不再调用 get_filename_list / get_full_path
+        self.folder_paths.get_filename_list.assert_not_called()
+        self.folder_paths.get_full_path.assert_not_called()
+
+    def test_incremental_rescan_keeps_entries(self):
+        index = self._make_index(hash_workers=4)
+        self._scan(index)
+        before = dict(index.data["models"])
+        self._scan(index)
+        self.assertEqual(before, index.data["models"])
+
+    def test_moved_file_is_not_rehashed(self):
+        index = self._make_index(hash_workers=1)
+        self._scan(index)
+        old_path = os.path.join(self.model_dir, "b.ckpt")
+        new_path = os.path.join(self.model_dir, "sub", "b_renamed.ckpt")
+        old_hash = index.store.find_by_path(old_path)["hash"]
+        os.rename(old_path, new_path)
+
+        with patch.object(index, "calculate_fast_hash") as hash_mock:
+            self._scan(index)
+            hash_mock.assert_not_called()
+
+        entry = index.data["models"][old_hash]
+        self.assertEqual(entry["path"], new_path)
+        self.assertEqual(entry["filename"], os.path.join("sub", "b_renamed.ckpt"))
+        self.assertEqual(entry["ino"], os.stat(new_path).st_ino)
+        self.assertEqual(len(index.data["models"]), 3)
+
+    def test_modified_file_is_rehashed(self):
+        index = self._make_index(hash_workers=1)
+        self._scan(index)
+        path = os.path.join(self.model_dir, "a.safetensors")
+        with open(path, "ab") as f:
+            f.write(b"more")
+        with patch.object(index, "calculate_fast_hash", wraps=index.calculate_fast_hash) as hash_mock:
+            self._scan(index)
+            hash_mock.assert_called_once_with(path)
+
+    def test_snapshot_is_stable_across_commits(self):
+        index = self._make_index(hash_workers=1)
+        self._scan(index)
+        pinned = index.snapshot()
+        entries = dict(pinned.models)
+        with self.assertRaises(TypeError):
+            pinned.models["x"] = {}
+
+        os.remove(os.path.join(self.model_dir, "a.safetensors"))
+        self._scan(index)
+        # 已取得的快照不受之后提交的影响，新快照的条目与代数一致
+        self.assertEqual(dict(pinned.models), entries)
+        current = index.snapshot()
+        self.assertEqual(current.generation, pinned.generation + 1)
+        self.assertEqual(len(current.models), len(entries) - 1)
+        self.assertEqual(list(index.get_all_models()), list(current.models.values()))
+
+    def _age_dirs(self):
+        """把目录 mtime 调到过去，模拟长时间未变化的目录"""
+        old = os.stat(self.model_dir).st_mtime - 3600
+        for dir_path in (self.model_dir, os.path.join(self.model_dir, "sub")):
+            os.utime(dir_path, (old, old))
+
+    def test_unchanged_dirs_are_not_listed(self):
+        index = self._make_index(hash_workers=1)
+        self._age_dirs()
+        self._scan(index)
+        self.assertEqual(len(index.dir_state), 2)
+
+        with patch.object(scanner.os, "scandir", wraps=os.scandir) as scandir_mock:
+            self.assertEqual(self._scan(index), 3)
+            scandir_mock.assert_not_called()
+
+        # 新增文件会改变所在目录的 mtime，只重新列举该目录
+        new_path = os.path.join(self.model_dir, "sub", "d.safetensors")
+        with open(new_path, "wb") as f:
+            f.write(b"d" * 2048)
+        with patch.object(scanner.os, "scandir", wraps=os.scandir) as scandir_mock:
+            self.assertEqual(self._scan(index), 4)
+            scandir_mock.assert_called_once_with(os.path.join(self.model_dir, "sub"))
+
+        # 目录状态持久化到 SQLite
+        reloaded = self._make_index()
+        self.assertEqual(reloaded.dir_state[self.model_dir], index.dir_state[self.model_dir])
+
+    def test_deep_verify_finds_in_place_modification(self):
+        index = self._make_index(hash_workers=1)
+        self._age_dirs()
+        self._scan(index)
+
+        # 原地修改不改变目录 mtime: 快速扫描看不到，深度校验才能发现
+        path = os.path.join(self.model_dir, "a.safetensors")
+        with open(path, "ab") as f:
+            f.write(b"more")
+        old_hashes = set(index.data["models"])
+        with patch.object(scanner, "folder_paths", self.folder_paths):
+            index.scan_incremental(deep_verify=False)
+        self.assertEqual(set(index.data["models"]), old_hashes)
+
+        with patch.object(scanner, "folder_paths", self.folder_paths):
+            index.scan_incremental(deep_verify=True)
+        self.assertNotEqual(set(index.data["models"]), old_hashes)
+        entry = next(info for info in index.data["models"].values() if info["path"] == path)
+        self.assertEqual(entry["size"], 4096 + 4)
+
+    def test_deep_verify_interval(self):
+        index = self._make_index(deep_verify_interval=3600)
+        self._scan(index)
+        first_deep = index.data["last_deep_scan"]
+        self.assertGreater(first_deep, 0)
+        self._scan(index)
+        self.assertEqual(index.data["last_deep_scan"], first_deep)
+
+    def test_legacy_scheme_matches_v1_hash(self):
+        """旧版方案必须与 v1 的 MD5(size-mtime + 头尾 1MB) 完全一致"""
+        import hashlib
+        path = os.path.join(self.model_dir, "b.ckpt")
+        stat = os.stat(path)
+        md5 = hashlib.md5(f"{stat.st_size}-{stat.st_mtime}".encode("utf-8"))
+        with open(path, "rb") as f:
+            md5.update(f.read(1024 * 1024))
+            f.seek(-1024 * 1024, 2)
+            md5.update(f.read(1024 * 1024))
+        self.assertEqual(FastHasher.from_scheme(LEGACY_HASH_SCHEME).hash_file(path), md5.hexdigest())
+
+    def test_hash_ignores_mtime_by_default(self):
+        path = os.path.join(self.model_dir, "a.safetensors")
+        hasher = FastHasher("blake2b", sampling="strided")
+        before = hasher.hash_file(path)
+        os.utime(path, (1, 1))
+        self.assertEqual(hasher.hash_file(path), before)
+        self.assertEqual(FastHasher.from_scheme(hasher.scheme).scheme, "blake2b/strided8")
+
+    def test_copies_of_one_model_are_both_indexed(self):
+        copy_path = os.path.join(self.model_dir, "sub", "b_copy.ckpt")
+        with open(copy_path, "wb") as f:
+            f.write(self.files["b.ckpt"])
+        os.utime(copy_path, (1, 1))
+        index = self._make_index(hash_workers=1)
+        self.assertEqual(self._scan(index), 4)
+        paths = {info["path"] for info in index.data["models"].values()}
+        self.assertIn(copy_path, paths)
+        self.assertIn(os.path.join(self.model_dir, "b.ckpt"), paths)
+        # 未变化时重新扫描不再哈希
+        with patch.object(index, "calculate_fast_hash") as hash_mock:
+            self._scan(index)
+            hash_mock.assert_not_called()
+
+    def test_default_scheme_matches_legacy_index(self):
+        """默认方案与旧版相同: 升级后已有索引不触发迁移"""
+        legacy = self._make_index(hash_workers=1, hash_algorithm="md5", hash_include_mtime=True)
+        self._scan(legacy)
+        index = self._make_index(hash_workers=1)
+        self.assertEqual(index.hasher.scheme, LEGACY_HASH_SCHEME)
+        self.assertEqual(index.data["hash_scheme"], LEGACY_HASH_SCHEME)
+        with patch.object(index, "calculate_fast_hash") as hash_mock:
+            self._scan(index)
+            hash_mock.assert_not_called()
+
+    def test_hash_scheme_change_migrates_in_place(self):
+        legacy = self._make_index(hash_workers=1, hash_algorithm="md5", hash_include_mtime=True)
+        self._scan(legacy)
+        self.assertEqual(legacy.data["hash_scheme"], LEGACY_HASH_SCHEME)
+        # 模拟其他阶段写入的附加字段，迁移后必须保留
+        for info in legacy.data["models"].values():
+            info["arch"] = "sdxl"
+        legacy.save_index()
+        old_hashes = set(legacy.data["models"])
+
+        index = self._make_index(hash_workers=1, hash_algorithm="blake2b", hash_include_mtime=False)
+        self.assertEqual(len(index.data["models"]), 3)  # 加载时不丢弃旧索引
+        self._scan(index)
+
+        self.assertEqual(index.data["hash_scheme"], "blake2b/headtail")
+        self.assertEqual(len(index.data["models"]), 3)
+        self.assertFalse(old_hashes & set(index.data["models"]))
+        self.assertTrue(all(info["arch"] == "sdxl" for info in index.data["models"].values()))
+
+        reloaded = self._make_index(hash_workers=1, hash_algorithm="blake2b", hash_include_mtime=False)
+        self.assertEqual(reloaded.data["models"], index.data["models"])
+        self.assertEqual(reloaded.store.get_meta("hash_scheme"), "blake2b/headtail")
+
+    def test_sqlite_persistence_roundtrip(self):
+        index = self._make_index()
+        self._scan(index)
+
+        os.remove(os.path.join(self.model_dir, "a.safetensors"))
+        self._scan(index)
+
+        reloaded = self._make_index()
+        self.assertEqual(reloaded.data["models"], index.data["models"])
+        self.assertEqual(len(reloaded.data["models"]), 2)
+
+        store = reloaded.store
+        gguf_path = os.path.join(self.model_dir, "sub", "c.gguf")
+        entry = store.find_by_path(gguf_path)
+        self.assertIsNotNone(entry)
+        self.assertEqual(store.find_by_hash(entry["hash"])["path"], gguf_path)
+        self.assertEqual([m["path"] for m in store.find_by_basename("C.gguf")], [gguf_path])
+        self.assertEqual(len(store.find_by_type("checkpoints")), 2)
+
+    def test_background_load(self):
+        index = self._make_index()
+        self._scan(index)
+
+        reloaded = self._make_index(load_async=True)
+        reloaded.ready.result(timeout=10)
+        self.assertEqual(list(reloaded.get_all_models()), list(index.get_all_models()))
+
+    def test_legacy_json_migration(self):
+        legacy = {
+            "version": scanner.HASH_VERSION,
+            "last_scan": 123,
+            "models": {
+                "abc": {"path": "/m/x.safetensors", "filename": "x.safetensors", "type": "loras",
+                        "size": 1, "mtime": 2.0, "hash": "abc"}
+            }
+        }
+        with open(os.path.join(self.tmp_dir, "model_index.json"), "w", encoding="utf-8") as f:
+            json.dump(legacy, f)
+
+        index = self._make_index()
+        self.assertEqual(index.data["models"], legacy["models"])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, "model_index.json")))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, "model_index.json.bak")))
+
+        reloaded = self._make_index()
+        self.assertEqual(reloaded.data["models"], legacy["models"])
+        self.assertEqual(reloaded.data["last_scan"], 123)
+
+
+if __name__ == '__main__':
+    unittest.main()
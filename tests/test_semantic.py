@@ -4,7 +4,7 @@ import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils import AdvancedTokenizer
+from utils import AdvancedTokenizer, PreparedName
 
 class TestModelSemantics(unittest.TestCase):
     
@@ -43,3 +43,55 @@ class TestModelSemantics(unittest.TestCase):
         # NO, user said "Don't be lazy". Inpainting is hard incompatible. LCM is architecture change.
         # But LCM LoRA can be applied to Base. LCM Checkpoint is standalone.
         # Let's assume Inpainting is Hard Incompatible.
+
+
+class TestTokenizerCache(unittest.TestCase):
+    def setUp(self):
+        AdvancedTokenizer.cache_clear()
+
+    def test_cached_results_are_independent_copies(self):
+        tokens = AdvancedTokenizer.tokenize("flux1-dev-Q4_K_M.gguf")
+        core = AdvancedTokenizer.get_core_tokens("flux1-dev-Q4_K_M.gguf")
+        expected_tokens, expected_core = list(tokens), set(core)
+        tokens.append("mutated")
+        core.add("mutated")
+        self.assertEqual(AdvancedTokenizer.tokenize("flux1-dev-Q4_K_M.gguf"), expected_tokens)
+        self.assertEqual(AdvancedTokenizer.get_core_tokens("flux1-dev-Q4_K_M.gguf"), expected_core)
+
+    def test_cache_stats_count_hits(self):
+        for _ in range(3):
+            AdvancedTokenizer.detect_base_model("Juggernaut_XL_v9.safetensors")
+        stats = AdvancedTokenizer.cache_stats()["detect_base_model"]
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 3)
+
+
+class TestPreparedName(unittest.TestCase):
+    # (名称 A, 名称 B, 预期分数): 分数取自引入 PreparedName 之前的 calculate_similarity 实现
+    REFERENCE_SCORES = [
+        ("flux1-dev-Q4_K_M.gguf", "flux1-dev-Q4_K_M.gguf", 1.0),
+        ("flux1-dev-Q4_K_M.gguf", "flux1-schnell-Q4_K_M.gguf", 0.0),
+        ("flux1-dev-Q8_0.gguf", "flux1-dev-Q4_K_M.gguf", 0.0),
+        ("city96/FLUX.1-dev-gguf", "flux1-dev-Q4_K_M.gguf", 0.9333333333333333),
+        ("sd_xl_base_1.0.safetensors", "sd_xl_refiner_1.0.safetensors", 0.0),
+        ("sd_xl_base_1.0.safetensors", "Juggernaut_XL_v9.safetensors", 0.21),
+        ("model_bf16.safetensors", "model_fp16.safetensors", 0.0),
+        ("vae_ft_mse.safetensors", "sd_xl_base_1.0.safetensors", 0.0),
+        ("F.1 奶油风.safetensors", "AsianFace F.1", 0.19701754385964912),
+        ("unsloth/Qwen-Image-Edit-2511-GGUF", "qwen_image_edit_2511_q4_k_m.gguf", 1.0),
+        ("Juggernaut_XL_v9.safetensors", "juggernautXL_v8Rundiffusion.safetensors", 0.23283582089552238),
+        ("realisticVisionV51_v51VAE.safetensors", "realisticVisionV60B1_v51VAE.safetensors", 0.7892105263157895),
+        ("dreamshaper_8.safetensors", "DreamShaper_8_pruned.safetensors", 1.0),
+        ("4x-UltraSharp.pth", "4x_NMKD-Siax_200k.pth", 0.15652173913043477),
+    ]
+
+    def test_scores_match_reference(self):
+        for name_a, name_b, expected in self.REFERENCE_SCORES:
+            prepared = AdvancedTokenizer.calculate_similarity_prepared(PreparedName(name_a), PreparedName(name_b))
+            self.assertAlmostEqual(prepared, expected, places=9, msg=(name_a, name_b))
+            self.assertAlmostEqual(AdvancedTokenizer.calculate_similarity(name_a, name_b), expected, places=9,
+                                   msg=(name_a, name_b))
+
+    def test_prepared_name_uses_slots(self):
+        self.assertFalse(hasattr(PreparedName("a.safetensors"), "__dict__"))
+
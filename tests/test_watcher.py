@@ -0,0 +1,140 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock folder_paths BEFORE importing scanner
+if 'folder_paths' not in sys.modules:
+    sys.modules['folder_paths'] = MagicMock()
+
+import scanner
+from scanner import ModelIndex
+from watcher import IndexWatcher, _InotifyBackend
+
+
+class TestIndexWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.lora_dir = os.path.join(self.tmp_dir, "loras")
+        os.makedirs(os.path.join(self.lora_dir, "old"))
+        self._write(os.path.join("old", "style.safetensors"), b"s" * 2048)
+
+        self.folder_paths = MagicMock()
+        lora_dir = self.lora_dir
+        self.folder_paths.get_folder_paths.side_effect = lambda key: [lora_dir] if key == "loras" else []
+        self.patcher = patch.object(scanner, "folder_paths", self.folder_paths)
+        self.patcher.start()
+
+        self.index = ModelIndex(index_file=os.path.join(self.tmp_dir, "model_index.db"), hash_workers=1)
+        self.index.scan_incremental()
+        self.watcher = IndexWatcher(self.index, debounce=0, use_inotify=False)
+        self.watcher.backend = MagicMock()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write(self, rel, content):
+        with open(os.path.join(self.lora_dir, rel), "wb") as f:
+            f.write(content)
+
+    def _flush_until_idle(self):
+        # debounce=0 时第一次 flush 记录文件大小，第二次确认稳定
+        for _ in range(3):
+            self.watcher._flush()
+
+    def _paths(self):
+        return sorted(info["filename"] for info in self.index.get_all_models())
+
+    def test_restart_leaves_one_thread(self):
+        import threading
+        watcher = IndexWatcher(self.index, poll_interval=0.1, use_inotify=False)
+        watcher.start()
+        old_thread = watcher._thread
+        watcher.stop()
+        watcher.start()
+        old_thread.join(timeout=2)
+        try:
+            self.assertFalse(old_thread.is_alive())
+            self.assertEqual(sum(t.name == "AutoMatchWatcher" and t.is_alive() for t in threading.enumerate()), 1)
+        finally:
+            watcher.stop(wait=True)
+
+    def test_added_file_is_indexed_after_size_settles(self):
+        self._write("new.safetensors", b"n" * 1024)
+        self.watcher._handle_events([("rescan", self.lora_dir)])
+        self.watcher._flush()
+        self.assertEqual(self._paths(), [os.path.join("old", "style.safetensors")])
+        self._flush_until_idle()
+        self.assertEqual(self._paths(), ["new.safetensors", os.path.join("old", "style.safetensors")])
+
+    def test_move_keeps_hash(self):
+        old_path = os.path.join(self.lora_dir, "old", "style.safetensors")
+        new_path = os.path.join(self.lora_dir, "style_v2.safetensors")
+        (old_hash,) = [info["hash"] for info in self.index.get_all_models()]
+        os.rename(old_path, new_path)
+
+        with patch.object(self.index, "calculate_fast_hash") as hash_mock:
+            self.watcher._handle_events([("moved", old_path, new_path)])
+            self._flush_until_idle()
+            hash_mock.assert_not_called()
+
+        entry = self.index.data["models"][old_hash]
+        self.assertEqual(entry["path"], new_path)
+        self.assertEqual(entry["filename"], "style_v2.safetensors")
+
+    def test_move_onto_indexed_path_replaces_entry(self):
+        src = os.path.join(self.lora_dir, "old", "style.safetensors")
+        dst = os.path.join(self.lora_dir, "detail.safetensors")
+        self._write("detail.safetensors", b"d" * 4096)
+        self.index.scan_incremental()
+        src_hash = self.index.store.find_by_path(src)["hash"]
+        os.replace(src, dst)
+
+        self.assertTrue(self.index.apply_changes(moved=[(src, dst)]))
+        self.assertEqual(self._paths(), ["detail.safetensors"])
+        self.assertEqual(self.index.data["models"][src_hash]["path"], dst)
+        self.assertEqual(self.index.store.find_by_path(dst)["hash"], src_hash)
+
+    def test_delete_plus_create_of_same_inode_is_a_move(self):
+        old_path = os.path.join(self.lora_dir, "old", "style.safetensors")
+        new_path = os.path.join(self.lora_dir, "style.safetensors")
+        (old_hash,) = [info["hash"] for info in self.index.get_all_models()]
+        os.rename(old_path, new_path)
+
+        with patch.object(self.index, "calculate_fast_hash") as hash_mock:
+            self.watcher._handle_events([("deleted", old_path), ("changed", new_path)])
+            self._flush_until_idle()
+            hash_mock.assert_not_called()
+        self.assertEqual(self.index.data["models"][old_hash]["path"], new_path)
+
+    def test_deleted_dir_removes_entries(self):
+        shutil.rmtree(os.path.join(self.lora_dir, "old"))
+        self.watcher._handle_events([("dir_deleted", os.path.join(self.lora_dir, "old"))])
+        self._flush_until_idle()
+        self.assertEqual(self._paths(), [])
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_inotify_backend_reports_moves(self):
+        backend = _InotifyBackend()
+        try:
+            backend.add_tree(self.lora_dir)
+            old_path = os.path.join(self.lora_dir, "old", "style.safetensors")
+            new_path = os.path.join(self.lora_dir, "old", "renamed.safetensors")
+            os.rename(old_path, new_path)
+            events = []
+            deadline = time.time() + 2
+            while time.time() < deadline and not events:
+                events = backend.read(0.2)
+            self.assertIn(("moved", old_path, new_path), events)
+        finally:
+            backend.close()
+
+
+if __name__ == '__main__':
+    unittest.main()